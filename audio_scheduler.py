@@ -0,0 +1,283 @@
+import heapq
+import itertools
+import threading
+import time
+
+import pygame
+
+# Lower number wins: safety instructions pre-empt alarms, alarms pre-empt engine sounds
+SOS, ALARM, ENGINE = 0, 1, 2
+PRIORITY_NAMES = {SOS: "SOS", ALARM: "Alarm", ENGINE: "Engine"}
+# Fixed mixer channel per priority, reserved so pygame.mixer.find_channel() never hands them out
+CHANNELS = {ENGINE: 0, ALARM: 1, SOS: 2}
+# A loop round is never re-armed sooner than this, whatever the clip length
+MIN_LOOP_INTERVAL = 0.5
+# Retry delay after a loop sound failed to start (not loaded, mixer error), doubled per failure
+FAILURE_BACKOFF = 1.0
+FAILURE_BACKOFF_MAX = 30.0
+
+
+class _Loop:
+    def __init__(self, key, priority, choose, gap, min_interval, requested_at):
+        self.key = key
+        self.priority = priority
+        self.choose = choose  # Returns the sound to play next, or None to skip a round
+        self.gap = gap  # Seconds of silence between two plays
+        self.min_interval = min_interval  # Seconds from one start to the next, at least
+        self.failures = 0  # Sounds in a row that could not be played
+        self.generation = 0  # Invalidates wakeups scheduled before a stop or restart
+        self.requested_at = requested_at
+        self.started = False
+        self.suspended = False  # Held back by a higher priority
+
+
+class AudioScheduler:
+    """
+    Plays all alert audio from one thread. Sounds have a priority (SOS > ALARM > ENGINE) and
+    a fixed mixer channel; while a higher priority is active, lower ones are silenced (the
+    engine music is paused) and resume when it ends. Repeating sounds (alarms, safety
+    instructions) are loops that pick their next sound when the previous one ends.
+
+    The thread sleeps until the next command or the end of the current sound, which is known
+    from the clip length; nothing polls the mixer. Channel end events would need the SDL event
+    queue, which has to be pumped from the display thread, so the clip length is used instead.
+    Every method only queues a command, so callers on the GUI or worker threads never touch the
+    mixer themselves.
+    """
+
+    def __init__(self, assets, log=print):
+        self.assets = assets  # SoundAssets
+        self.log = log
+        self.max_start_latency_ms = 0.0  # Longest time from a loop request to its first sound
+        self._channels = {}
+        self._loops = {}  # Key -> _Loop, only touched by the scheduler thread
+        # Key -> priority of the loops requested so far, updated by the callers before the thread
+        # applies the command and replaced as a whole for readers on other threads
+        self._loop_priorities = {}
+        self._one_shot_until = {}  # Priority -> end time of the one-shot sound playing on its channel
+        self._current = {}  # Priority -> sound name on its channel
+        self._music = None  # (name, loops) of the engine music, if any
+        self._music_paused = False
+        self._wakeups = []  # Heap of (time, seq, key, generation)
+        self._commands = []
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="audio-scheduler", daemon=True)
+
+    def start(self):
+        pygame.mixer.set_reserved(len(CHANNELS))
+        self._channels = {priority: pygame.mixer.Channel(index) for priority, index in CHANNELS.items()}
+        self._thread.start()
+        return self
+
+    def _submit(self, command, *args):
+        with self._condition:
+            self._commands.append((command, args))
+            self._condition.notify()
+
+    # --- Public API, safe from any thread ---
+
+    def play(self, name, priority):
+        """Plays one sound on the channel of its priority."""
+        self._submit(self._play_once, name, priority)
+
+    def play_music(self, name, loops=-1):
+        """Streams a file through pygame.mixer.music as the engine background; paused under alerts."""
+        self._submit(self._play_music, name, loops)
+
+    def start_loop(self, key, priority, choose, gap=0.0, min_interval=0.0):
+        """
+        Repeats choose()'s sound until stop_loop(key), `gap` seconds after each play ends and at
+        least `min_interval` seconds after it started. Restarting an active loop only updates choose.
+        """
+        with self._condition:
+            self._loop_priorities = {key: priority, **self._loop_priorities}
+            self._submit(self._start_loop, key, priority, choose, gap, min_interval, time.perf_counter())
+
+    def stop_loop(self, key):
+        with self._condition:
+            self._loop_priorities = {k: p for k, p in self._loop_priorities.items() if k != key}
+            self._submit(self._stop_loop, key)
+
+    def stop(self, priorities=None):
+        """Stops loops and sounds of the given priorities (all by default), including the engine music."""
+        priorities = tuple(priorities) if priorities is not None else tuple(CHANNELS)
+        with self._condition:
+            self._loop_priorities = {k: p for k, p in self._loop_priorities.items() if p not in priorities}
+            self._submit(self._stop, priorities)
+
+    def loop_active(self, key):
+        """Whether the loop was started and not stopped, even if the thread has not got to it yet."""
+        return key in self._loop_priorities
+
+    def busy(self, priority):
+        """Whether a sound of this priority is playing or a loop of it is running."""
+        if priority in self._loop_priorities.values():
+            return True
+        return self._one_shot_until.get(priority, 0) > time.perf_counter()
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join(1.0)
+
+    # --- Scheduler thread ---
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._commands:
+                    timeout = self._wakeups[0][0] - time.perf_counter() if self._wakeups else None
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+                commands, self._commands = self._commands, []
+            for command, args in commands:
+                try:
+                    command(*args)
+                except pygame.error as e:
+                    print(f"ERROR in audio scheduler: {e}")
+            self._run_due_wakeups()
+
+    def _schedule(self, at, key, generation):
+        heapq.heappush(self._wakeups, (at, next(self._seq), key, generation))
+
+    def _run_due_wakeups(self):
+        now = time.perf_counter()
+        due = False
+        while self._wakeups and self._wakeups[0][0] <= now:
+            _, _, key, generation = heapq.heappop(self._wakeups)
+            due = True
+            loop = self._loops.get(key)
+            if loop is not None and loop.generation == generation:
+                self._play_loop_round(loop)
+        if due:
+            # A one-shot may have ended: let lower priorities resume
+            self._apply_priorities()
+
+    def _top_priority(self):
+        now = time.perf_counter()
+        active = [loop.priority for loop in self._loops.values()]
+        active += [priority for priority, until in self._one_shot_until.items() if until > now]
+        return min(active) if active else None
+
+    def _apply_priorities(self):
+        top = self._top_priority()
+        for priority in self._channels:
+            if top is not None and priority > top and self._current.get(priority):
+                self._silence(priority)
+        if self._music is not None:
+            if top is not None and top < ENGINE and not self._music_paused:
+                pygame.mixer.music.pause()
+                self._music_paused = True
+            elif (top is None or top >= ENGINE) and self._music_paused:
+                pygame.mixer.music.unpause()
+                self._music_paused = False
+        for loop in self._loops.values():
+            if top is not None and loop.priority > top:
+                loop.suspended = True
+            elif loop.suspended:
+                # Held back by a higher priority that has ended: start again right away
+                loop.suspended = False
+                loop.generation += 1
+                self._schedule(time.perf_counter(), loop.key, loop.generation)
+
+    def _silence(self, priority):
+        name = self._current.pop(priority, None)
+        if name is not None and self.assets.is_streamed(name):
+            self.assets.stop_stream(name)
+        self._channels[priority].stop()
+        self._one_shot_until.pop(priority, None)
+
+    def _start_sound(self, name, priority, loops=0):
+        # Returns the clip length, or None when it could not be played
+        channel = self.assets.play(name, channel=self._channels[priority], loops=loops)
+        if channel is None:
+            return None
+        self._current[priority] = name
+        return self.assets.length(name)
+
+    def _play_once(self, name, priority):
+        top = self._top_priority()
+        if top is not None and top < priority:
+            return  # Drowned out by a higher priority anyway
+        length = self._start_sound(name, priority) or 0.0
+        until = time.perf_counter() + length
+        self._one_shot_until[priority] = until
+        self._schedule(until, None, 0)
+        self._apply_priorities()
+
+    def _play_music(self, name, loops):
+        if self._music is not None and self._music[0] == name and pygame.mixer.music.get_busy():
+            return
+        path = self.assets.path(name)
+        if not path:
+            print(f"ERROR: Sound '{name}' not loaded.")
+            return
+        # pygame streams music from the file, it is never decoded as a whole
+        pygame.mixer.music.load(path)
+        pygame.mixer.music.play(loops=loops)
+        self._music = (name, loops)
+        self._music_paused = False
+        self._apply_priorities()
+
+    def _start_loop(self, key, priority, choose, gap, min_interval, requested_at):
+        loop = self._loops.get(key)
+        if loop is not None:
+            loop.choose = choose
+            return
+        loop = self._loops[key] = _Loop(key, priority, choose, gap, min_interval, requested_at)
+        self._schedule(time.perf_counter(), key, loop.generation)
+        self._apply_priorities()
+
+    def _play_loop_round(self, loop):
+        top = self._top_priority()
+        if top is not None and top < loop.priority:
+            loop.suspended = True
+            return  # Resumed by _apply_priorities once the higher priority ends
+        started = time.perf_counter()
+        name = loop.choose()
+        length = self._start_sound(name, loop.priority) if name else 0.0
+        if length is None:
+            # Not loaded or the mixer failed: retry later instead of re-arming at once
+            loop.failures += 1
+            if loop.failures == 1:
+                self.log(f"{PRIORITY_NAMES[loop.priority]} sound '{name}' could not be played, retrying with backoff.")
+            delay = min(FAILURE_BACKOFF_MAX, FAILURE_BACKOFF * 2 ** (loop.failures - 1))
+            self._schedule(started + delay, loop.key, loop.generation)
+            return
+        loop.failures = 0
+        if name and not loop.started:
+            loop.started = True
+            latency_ms = (time.perf_counter() - loop.requested_at) * 1000
+            self.max_start_latency_ms = max(self.max_start_latency_ms, latency_ms)
+            self.log(f"{PRIORITY_NAMES[loop.priority]} sound '{name}' started "
+                     f"{latency_ms:.1f} ms after the request.")
+        interval = max(length + loop.gap, loop.min_interval, MIN_LOOP_INTERVAL)
+        self._schedule(started + interval, loop.key, loop.generation)
+
+    def _stop_loop(self, key):
+        loop = self._loops.pop(key, None)
+        if loop is None:
+            return
+        loop.generation += 1
+        if not any(other.priority == loop.priority for other in self._loops.values()):
+            self._silence(loop.priority)
+        self._apply_priorities()
+
+    def _stop(self, priorities):
+        for key, loop in list(self._loops.items()):
+            if loop.priority in priorities:
+                loop.generation += 1
+                del self._loops[key]
+        for priority in priorities:
+            self._silence(priority)
+        if ENGINE in priorities and self._music is not None:
+            pygame.mixer.music.stop()
+            self._music = None
+            self._music_paused = False
+        self._apply_priorities()
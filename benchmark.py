@@ -0,0 +1,468 @@
+"""
+Benchmarks for the detection pipeline.
+
+Usage:
+    python benchmark.py replay recording.mp4 [more recordings or image dirs] [--realtime] [--output report.json]
+    python benchmark.py batching --model models/yolo11n_320.onnx --cameras 4 [--recording path]
+    python benchmark.py startup recording.mp4 [--backend onnxruntime]
+    python benchmark.py quant recording.mp4 [--model models/yolo11n_320.onnx]
+    python benchmark.py sounds
+    python benchmark.py headless recording.mp4 [--backend onnxruntime] [--repeats 3]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROCESS_STARTED = time.perf_counter()
+
+import numpy as np
+
+from detection import PersonDetector, create_backend, parse_tile_grid, variant_model_path
+from metrics import LatencyRecorder
+from seats import load_seat_layouts
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB."""
+    try:
+        import resource
+        # ru_maxrss is in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024.0 * 1024.0)
+
+
+def load_frames(recording, count):
+    """Returns `count` frames from a recording (video file or image directory), or synthetic frames."""
+    if recording:
+        from capture import iter_recorded_frames
+        frames = []
+        for frame in iter_recorded_frames(recording):
+            frames.append(frame)
+            if len(frames) == count:
+                break
+        if frames:
+            recorded = len(frames)
+            while len(frames) < count:
+                frames.append(frames[len(frames) % recorded].copy())
+            return frames
+        print(f"Warning: no frames read from {recording}, using synthetic frames.")
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def bench_replay(model_path, backend, sources, realtime=False, overlays=False, motion_gating=False,
+                 inference_process=False, person_only=False, seats=None, tiles=None):
+    """
+    Feeds recordings through PersonDetector.process_video (the same detect, NMS, track,
+    smooth and annotate path as the GUI) and reports per-stage latency, throughput and peak RSS.
+    """
+    seat_layouts = load_seat_layouts(seats, len(sources)) if seats else None
+    detector = PersonDetector(model_path, backend=backend, sources=sources, replay=True, realtime=realtime,
+                              inference_process=inference_process, person_only=person_only,
+                              seat_layouts=seat_layouts)
+    recorder = LatencyRecorder()
+    detector.metrics = recorder
+    detector.show_fps = detector.show_bbox = detector.show_class = detector.show_score = overlays
+    detector.motion_gating = motion_gating
+    detector.tile_grid = parse_tile_grid(tiles)
+    # Measure the full cost of tiling instead of falling back when it is slow
+    detector.tiling_min_fps = 0.0
+    if not detector.prepare_detector():
+        raise SystemExit("Error: could not open the recordings or load the model.")
+    detector.detection_active = True
+
+    frames = 0
+
+    def on_frame(count, frame):
+        nonlocal frames
+        frames += 1
+
+    start = time.perf_counter()
+    detector.process_video(on_frame, stop_event=threading.Event())
+    elapsed = time.perf_counter() - start
+    detector.close()
+    return {
+        "benchmark": "replay",
+        "backend": backend,
+        "model": model_path,
+        "sources": [str(source) for source in sources],
+        "realtime": realtime,
+        "overlays": overlays,
+        "motion_gating": motion_gating,
+        "inference_process": inference_process,
+        "person_only": person_only,
+        "seats": seats,
+        "tiles": tiles,
+        "frames": frames,
+        "elapsed_s": elapsed,
+        "throughput_fps": frames / elapsed if elapsed > 0 else 0.0,
+        "stages": recorder.summary(),
+        "counters": recorder.counters,
+        "occupancy": detector.occupancy.snapshot(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_batching(model_path, backend, cameras, iterations, recording=None):
+    """Compares one batched call for N cameras against N independent per-camera loops."""
+    frames = load_frames(recording, cameras)
+
+    # One model, one batched inference call per iteration
+    model = create_backend(backend, model_path)
+    model.predict_batch(frames)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        model.predict_batch(frames)
+    batched_time = time.perf_counter() - start
+
+    # N independent loops, one thread and one model per camera
+    models = [create_backend(backend, model_path) for _ in range(cameras)]
+    for m, frame in zip(models, frames):
+        m.predict(frame)
+
+    def camera_loop(m, frame):
+        for _ in range(iterations):
+            m.predict(frame)
+
+    threads = [threading.Thread(target=camera_loop, args=(m, f)) for m, f in zip(models, frames)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    independent_time = time.perf_counter() - start
+
+    total_frames = iterations * cameras
+    return {
+        "benchmark": "batching",
+        "backend": backend,
+        "cameras": cameras,
+        "iterations": iterations,
+        "batched_fps": total_frames / batched_time,
+        "independent_fps": total_frames / independent_time,
+        "speedup": independent_time / batched_time,
+    }
+
+
+def probe_startup(model_path, backend, source):
+    """Measures process start to detector ready, in this (fresh) process."""
+    detector = PersonDetector(model_path, backend=backend, sources=[source], replay=True)
+    if not detector.prepare_detector():
+        raise SystemExit("Error: could not prepare the detector.")
+    report = dict(detector.startup_times)
+    report["process_to_ready_s"] = time.perf_counter() - PROCESS_STARTED
+    detector.close()
+    return report
+
+
+def bench_startup(model_path, backend, source):
+    """Starts fresh processes to compare a cold start (no optimized-session cache) with a warm one."""
+    cache_dir = os.path.join(os.path.dirname(model_path) or ".", ".ort_cache")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    runs = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label in ("cold", "warm"):
+            report_path = os.path.join(tmp, f"{label}.json")
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "startup-probe", source,
+                 "--model", model_path, "--backend", backend, "--output", report_path],
+                check=True, stdout=subprocess.DEVNULL,
+            )
+            with open(report_path, encoding="utf-8") as f:
+                runs[label] = json.load(f)
+    return {"benchmark": "startup", "backend": backend, "model": model_path, **runs}
+
+
+def _person_agreement(reference, candidate, iou_threshold=0.5):
+    """Greedy IoU matching of person boxes. Returns (matched, reference count, candidate count)."""
+    import supervision as sv
+
+    reference = reference[reference.class_id == 0]
+    candidate = candidate[candidate.class_id == 0]
+    if len(reference) == 0 or len(candidate) == 0:
+        return 0, len(reference), len(candidate)
+    iou = sv.box_iou_batch(reference.xyxy, candidate.xyxy)
+    matched = 0
+    while iou.size and iou.max() >= iou_threshold:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        matched += 1
+        iou[i, :] = -1
+        iou[:, j] = -1
+    return matched, len(reference), len(candidate)
+
+
+def bench_quantized(model_path, recording, variant="int8", max_frames=500):
+    """
+    Runs the FP32 model and a quantized variant on the same recorded frames. Reports FPS and
+    latency percentiles of each, and how well the variant's person detections agree with FP32.
+    """
+    from capture import iter_recorded_frames
+
+    frames = []
+    for frame in iter_recorded_frames(recording):
+        frames.append(frame)
+        if len(frames) >= max_frames:
+            break
+    if not frames:
+        raise SystemExit(f"Error: no frames read from {recording}")
+
+    variant_path = variant_model_path(model_path, variant)
+    results = {}
+    report = {"benchmark": "quant", "frames": len(frames), "models": {}}
+    for label, path in (("fp32", model_path), (variant, variant_path)):
+        model = create_backend("onnxruntime", path)
+        model.predict(frames[0])
+        recorder = LatencyRecorder()
+        detections = []
+        start = time.perf_counter()
+        for frame in frames:
+            t0 = time.perf_counter()
+            detections.append(model.predict(frame))
+            recorder.record("predict", time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+        results[label] = detections
+        report["models"][label] = {
+            "path": path,
+            "fps": len(frames) / elapsed,
+            "latency": recorder.summary()["predict"],
+        }
+
+    matched = reference_total = candidate_total = equal_counts = 0
+    for reference, candidate in zip(results["fp32"], results[variant]):
+        m, r, c = _person_agreement(reference, candidate)
+        matched += m
+        reference_total += r
+        candidate_total += c
+        equal_counts += int(r == c)
+    report["person_agreement"] = {
+        "recall_vs_fp32": matched / reference_total if reference_total else 1.0,
+        "precision_vs_fp32": matched / candidate_total if candidate_total else 1.0,
+        "frames_with_same_count": equal_counts / len(frames),
+    }
+    report["speedup"] = report["models"][variant]["fps"] / report["models"]["fp32"]["fps"]
+    return report
+
+
+def bench_sounds(cache_dir=None):
+    """Decoding every sound at startup (the old Notifier) vs the PCM cache: startup time, memory held, first-play latency."""
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    from notifier import SOUND_FILES
+    from sound_assets import SoundAssets
+
+    pygame.mixer.init(frequency=44100, size=-16, channels=4, buffer=2048)
+    started = time.perf_counter()
+    decoded = {name: pygame.mixer.Sound(path) for name, path in SOUND_FILES.items() if os.path.exists(path)}
+    eager = {"startup_s": time.perf_counter() - started,
+             "held_mb": sum(len(sound.get_raw()) for sound in decoded.values()) / (1024.0 * 1024.0)}
+    del decoded
+
+    report = {"benchmark": "sounds", "eager_decode": eager}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label in ("cold_cache", "warm_cache"):
+            assets = SoundAssets(SOUND_FILES, cache_dir or tmp, log=lambda message: None)
+            started = time.perf_counter()
+            assets.prepare()
+            assets.preload(["alert", "check_again"])
+            startup_s = time.perf_counter() - started
+            for name in SOUND_FILES:
+                assets.play(name)
+            assets.stop_streams()
+            pygame.mixer.stop()
+            report[label] = {
+                "startup_s": startup_s,
+                "held_mb": assets.cached_bytes() / (1024.0 * 1024.0),
+                "first_play_ms": {name: round(ms, 2) for name, (ms, _) in assets.first_play_latency.items()},
+            }
+    pygame.mixer.quit()
+    return report
+
+
+# Drives the service through a post-lock check with --simulate timings: stopped at 3 s, door
+# opened at 6 s and closed at 9 s, check from 10 s, locked (every frame inferred) from 11 s
+HEADLESS_SIGNALS = [(0.5, "move"), (1.0, "stop"), (4.0, "open_door"), (7.0, "close_door"), (11.0, "lock")]
+
+
+class _InlineTk:
+    """Stands in for Tk's root in DisplayPipeline: runs the delivery right away."""
+
+    def after(self, delay, callback, *args):
+        callback(*args)
+
+
+def probe_headless(backend, source, mode):
+    """
+    Runs a recording through noc_daemon.NOCDaemon in this (fresh) process. mode "gui" adds
+    what the GUI does on top: the customtkinter import, the FPS overlay and the 12 fps preview
+    conversion of DisplayPipeline. Tk widgets are not created, so "gui" is a lower bound.
+    """
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.environ["NOC_BACKEND"] = backend
+    ui_import_s = None
+    if mode == "gui":
+        started = time.perf_counter()
+        try:
+            import customtkinter
+            ui_import_s = time.perf_counter() - started
+        except ImportError:
+            print("Warning: customtkinter is not installed, its import time is not included.")
+    from noc_daemon import NOCDaemon
+
+    daemon = NOCDaemon(sources=[source], replay=True, realtime=True, simulate=True)
+    preview = None
+    if mode == "gui":
+        from display import DisplayPipeline
+        from PIL import Image
+        preview = DisplayPipeline(_InlineTk(), lambda rgb: Image.frombuffer(
+            "RGB", (rgb.shape[1], rgb.shape[0]), rgb, "raw", "RGB", 0, 1), max_rate=None)
+        preview.set_size(640, 480)
+        daemon.detector.display_enabled = True
+        daemon.detector.show_fps = True  # The GUI's default overlay
+        daemon.detector.subscribe("frame", lambda frame: frame is not None and preview.submit(frame), max_rate=12.0)
+
+    ready = {}
+
+    def on_ready(transition):
+        ready["s"] = time.perf_counter() - PROCESS_STARTED
+        daemon.load_signal_script(HEADLESS_SIGNALS)
+
+    daemon.state.subscribe(on_ready, events=["engine_ready"])
+    daemon.handle("engine_start")
+    daemon.run(until=lambda: daemon.state.vehicle == "off" or (
+        daemon.detection_thread is not None and not daemon.detection_thread.is_alive()))
+    if "s" not in ready:
+        raise SystemExit("Error: could not open the recording or load the model.")
+    report = daemon.report()
+    report.update({
+        "mode": mode,
+        "process_to_ready_s": ready["s"],
+        "ui_import_s": ui_import_s,
+        "preview_frames": preview.frames_shown if preview else 0,
+        "stages": daemon.detector.metrics.snapshot()["stages"],
+    })
+    return report
+
+
+def bench_headless(backend, source, repeats=3):
+    """
+    Starts fresh processes, alternating the headless service and GUI mode, to compare their
+    CPU, peak memory and process start to engine ready. Reports the median of each figure.
+    """
+    runs = {"daemon": [], "gui": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, NOC_OUTBOX=os.path.join(tmp, "outbox.sqlite3"))
+        env.setdefault("SDL_AUDIODRIVER", "dummy")
+        for _ in range(repeats):
+            for mode in runs:
+                report_path = os.path.join(tmp, f"{mode}.json")
+                subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "headless-probe", source,
+                     "--backend", backend, "--mode", mode, "--output", report_path],
+                    check=True, stdout=subprocess.DEVNULL, env=env,
+                )
+                with open(report_path, encoding="utf-8") as f:
+                    runs[mode].append(json.load(f))
+    report = {"benchmark": "headless", "backend": backend, "source": source, "repeats": repeats}
+    for mode, reports in runs.items():
+        report[mode] = {key: float(np.median([r[key] for r in reports]))
+                        for key in ("process_to_ready_s", "cpu_s", "cpu_percent", "peak_rss_mb")}
+        report[mode]["frames"] = reports[-1]["frames"]
+        report[mode]["preview_frames"] = reports[-1]["preview_frames"]
+        report[mode]["stages"] = reports[-1]["stages"]
+    report["gui"]["ui_import_s"] = runs["gui"][-1]["ui_import_s"]
+    for key in ("process_to_ready_s", "cpu_percent", "peak_rss_mb"):
+        report[f"{key}_saved"] = report["gui"][key] - report["daemon"][key]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NOC detection benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    replay = subparsers.add_parser("replay", help="Run recordings through the full detection loop without a GUI")
+    replay.add_argument("sources", nargs="+", help="Video files or image directories (one per camera)")
+    replay.add_argument("--model", default="models/yolo11n_320.onnx")
+    replay.add_argument("--backend", default="ultralytics", choices=["ultralytics", "onnxruntime"])
+    replay.add_argument("--realtime", action="store_true", help="Pace frames at the recording frame rate")
+    replay.add_argument("--overlays", action="store_true", help="Draw FPS, boxes, classes and scores")
+    replay.add_argument("--motion-gating", action="store_true", help="Enable the motion-gated scheduler")
+    replay.add_argument("--inference-process", action="store_true", help="Run inference in a worker process")
+    replay.add_argument("--person-only", action="store_true", help="Decode only the person class")
+    replay.add_argument("--seats", default=None, help="Seat polygon JSON: infer on the seat region only")
+    replay.add_argument("--tiles", default=None, help="Tiled inference grid, e.g. 2x2 (full view plus overlapping tiles)")
+
+    batching = subparsers.add_parser("batching", help="Batched multi-camera inference vs independent loops")
+    batching.add_argument("--model", default="models/yolo11n_320.onnx")
+    batching.add_argument("--backend", default="onnxruntime", choices=["ultralytics", "onnxruntime"])
+    batching.add_argument("--cameras", type=int, default=4)
+    batching.add_argument("--iterations", type=int, default=100)
+    batching.add_argument("--recording", default=None, help="Video file or image directory (synthetic frames if omitted)")
+
+    startup = subparsers.add_parser("startup", help="Cold vs warm start time of the detector")
+    probe = subparsers.add_parser("startup-probe", help=argparse.SUPPRESS)
+    for subparser in (startup, probe):
+        subparser.add_argument("source", help="Video file or image directory used as the camera")
+        subparser.add_argument("--model", default="models/yolo11n_320.onnx")
+        subparser.add_argument("--backend", default="onnxruntime", choices=["ultralytics", "onnxruntime"])
+
+    quant = subparsers.add_parser("quant", help="FP32 vs quantized model: speed and person detection agreement")
+    quant.add_argument("recording", help="Recorded cabin video or image directory")
+    quant.add_argument("--model", default="models/yolo11n_320.onnx")
+    quant.add_argument("--variant", default="int8")
+    quant.add_argument("--max-frames", type=int, default=500)
+
+    sounds = subparsers.add_parser("sounds", help="Eager sound decoding vs the PCM sound cache")
+    sounds.add_argument("--cache-dir", default=None, help="Defaults to a temporary directory")
+
+    headless = subparsers.add_parser("headless", help="Headless service (noc_daemon.py) vs GUI mode: CPU, memory, startup")
+    headless.add_argument("--repeats", type=int, default=3, help="Runs per mode, alternating")
+    headless_probe = subparsers.add_parser("headless-probe", help=argparse.SUPPRESS)
+    headless_probe.add_argument("--mode", choices=["daemon", "gui"], default="daemon")
+    for subparser in (headless, headless_probe):
+        subparser.add_argument("source", help="Video file or image directory used as the camera")
+        subparser.add_argument("--backend", default="onnxruntime", choices=["ultralytics", "onnxruntime"])
+
+    for subparser in (replay, batching, startup, probe, quant, sounds, headless, headless_probe):
+        subparser.add_argument("--output", default=None, help="Also write the JSON report to this file")
+
+    args = parser.parse_args()
+    if args.command == "replay":
+        report = bench_replay(args.model, args.backend, args.sources, args.realtime, args.overlays,
+                              args.motion_gating, args.inference_process, args.person_only, args.seats,
+                              args.tiles)
+    elif args.command == "batching":
+        report = bench_batching(args.model, args.backend, args.cameras, args.iterations, args.recording)
+    elif args.command == "startup":
+        report = bench_startup(args.model, args.backend, args.source)
+    elif args.command == "quant":
+        report = bench_quantized(args.model, args.recording, args.variant, args.max_frames)
+    elif args.command == "sounds":
+        report = bench_sounds(args.cache_dir)
+    elif args.command == "headless":
+        report = bench_headless(args.backend, args.source, args.repeats)
+    elif args.command == "headless-probe":
+        report = probe_headless(args.backend, args.source, args.mode)
+    elif args.command == "startup-probe":
+        report = probe_startup(args.model, args.backend, args.source)
+    else:
+        parser.print_help()
+        sys.exit(2)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
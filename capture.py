@@ -0,0 +1,345 @@
+import os
+import threading
+import time
+
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class LatestFrameReader:
+    """
+    Reads frames from a VideoCapture on a dedicated thread and keeps only the newest one.
+    The consumer always gets the most recent frame, so camera I/O never blocks inference
+    and stale frames never queue up in the driver buffer.
+    """
+
+    def __init__(self, cap, name="camera"):
+        self.cap = cap
+        self.name = name
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0            # Sequence number of the frame in the slot
+        self._last_taken = 0     # Sequence number of the last frame handed out
+        self._running = False
+        self._thread = None
+        self._exited = True  # The capture thread has returned from its last cap.read()
+        self._release_on_exit = False
+
+        # A live camera never runs out of frames
+        self.exhausted = False
+
+        # Counters
+        self.frames_captured = 0
+        self.frames_dropped = 0  # Frames overwritten before the consumer took them
+        self.read_failures = 0
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._exited = False
+        self._thread = threading.Thread(target=self._capture_loop, name=f"capture-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def close(self):
+        """Stops reading and releases the capture once no thread is inside cap.read() any more."""
+        self.stop()
+        with self._cond:
+            if self._exited:
+                self.cap.release()
+            else:
+                # Still blocked in cap.read() (slow RTSP/USB): the capture thread releases it on exit
+                self._release_on_exit = True
+
+    def _capture_loop(self):
+        try:
+            while self._running:
+                ret, frame = self.cap.read()
+                if not ret:
+                    self.read_failures += 1
+                    time.sleep(0.01)
+                    continue
+                with self._cond:
+                    # The previous frame was never consumed: count it as dropped
+                    if self._seq > self._last_taken:
+                        self.frames_dropped += 1
+                    self._frame = frame
+                    self._seq += 1
+                    self.frames_captured += 1
+                    self._cond.notify()
+        finally:
+            with self._cond:
+                self._exited = True
+                if self._release_on_exit:
+                    self.cap.release()
+
+    def read(self, timeout=1.0):
+        """Waits for a frame newer than the last one returned. Returns (ret, frame) like VideoCapture.read()."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > self._last_taken or not self._running, timeout):
+                return False, None
+            if self._seq <= self._last_taken:
+                return False, None
+            self._last_taken = self._seq
+            frame = self._frame
+            self._frame = None
+            return True, frame
+
+    @property
+    def pending(self):
+        # 1 when a frame is waiting in the slot, 0 otherwise
+        return 1 if self._seq > self._last_taken else 0
+
+    def stats(self):
+        return {
+            "captured": self.frames_captured,
+            "dropped": self.frames_dropped,
+            "read_failures": self.read_failures,
+        }
+
+
+class ImageFolderCapture:
+    """Minimal cv2.VideoCapture stand-in that reads the images of a directory in name order."""
+
+    def __init__(self, path, fps=30.0):
+        self.path = path
+        self.fps = fps
+        self.paths = [
+            os.path.join(path, name) for name in sorted(os.listdir(path))
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+        self._pos = 0
+        self._opened = bool(self.paths)
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        while self._opened and self._pos < len(self.paths):
+            frame = cv2.imread(self.paths[self._pos])
+            self._pos += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def grab(self):
+        if self._opened and self._pos < len(self.paths):
+            self._pos += 1
+            return True
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.paths))
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._pos)
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self._pos = int(value)
+            return True
+        return False
+
+    def release(self):
+        self._opened = False
+
+
+CAPTURE_BACKENDS = {
+    "any": cv2.CAP_ANY,
+    "v4l2": cv2.CAP_V4L2,
+    "gstreamer": cv2.CAP_GSTREAMER,
+}
+
+
+class CaptureOptions:
+    """
+    Settings requested from a camera when it is opened. Anything left as None keeps the
+    driver default. With gstreamer_pipeline set, decoding and downscaling happen in
+    GStreamer and the other settings are ignored; "{device}" in the pipeline is replaced
+    by the camera index.
+    """
+
+    def __init__(self, backend=None, fourcc=None, width=None, height=None, fps=None,
+                 buffer_size=None, gstreamer_pipeline=None):
+        self.backend = backend  # "any", "v4l2" or "gstreamer"
+        self.fourcc = fourcc  # e.g. "MJPG" to move compressed frames over USB instead of raw YUYV
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.buffer_size = buffer_size
+        self.gstreamer_pipeline = gstreamer_pipeline
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """Reads NOC_CAPTURE_* variables, e.g. NOC_CAPTURE_FOURCC=MJPG NOC_CAPTURE_SIZE=640x480."""
+        environ = os.environ if environ is None else environ
+        width = height = None
+        if environ.get("NOC_CAPTURE_SIZE"):
+            width, height = (int(v) for v in environ["NOC_CAPTURE_SIZE"].lower().split("x"))
+        return cls(
+            backend=environ.get("NOC_CAPTURE_BACKEND") or None,
+            fourcc=environ.get("NOC_CAPTURE_FOURCC") or None,
+            width=width,
+            height=height,
+            fps=float(environ["NOC_CAPTURE_FPS"]) if environ.get("NOC_CAPTURE_FPS") else None,
+            buffer_size=int(environ["NOC_CAPTURE_BUFFER"]) if environ.get("NOC_CAPTURE_BUFFER") else None,
+            gstreamer_pipeline=environ.get("NOC_GST_PIPELINE") or None,
+        )
+
+
+def gstreamer_pipeline(device="/dev/video0", width=640, height=480, fps=30, out_width=320, out_height=240,
+                       decoder="jpegdec"):
+    """
+    Builds a pipeline that reads MJPEG from a V4L2 camera, decodes it and scales it down
+    before the frame reaches Python. On the Orange Pi 5 use decoder="mppjpegdec" for the
+    hardware JPEG decoder.
+    """
+    return (
+        f"v4l2src device={device} ! image/jpeg,width={width},height={height},framerate={fps}/1 ! "
+        f"{decoder} ! videoconvert ! videoscale ! video/x-raw,format=BGR,width={out_width},height={out_height} ! "
+        "appsink drop=true max-buffers=1 sync=false"
+    )
+
+
+def _fourcc_to_str(value):
+    value = int(value)
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00") or "?"
+
+
+def _configure_device(cap, options):
+    # FOURCC must be set before the resolution for V4L2 to negotiate a compressed mode
+    if options.fourcc:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*options.fourcc))
+    if options.width:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, options.width)
+    if options.height:
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, options.height)
+    if options.fps:
+        cap.set(cv2.CAP_PROP_FPS, options.fps)
+    if options.buffer_size is not None:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, options.buffer_size)
+
+
+def describe_capture(cap):
+    """Returns the settings the driver actually negotiated."""
+    try:
+        backend = cap.getBackendName()
+    except cv2.error:
+        backend = "?"
+    return {
+        "backend": backend,
+        "fourcc": _fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "buffer_size": int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+    }
+
+
+def open_capture(source, options=None):
+    """Opens a camera index, a video file or an image directory, applying capture options to cameras."""
+    if isinstance(source, str) and os.path.isdir(source):
+        return ImageFolderCapture(source)
+    if options is None:
+        return cv2.VideoCapture(source)
+
+    if options.gstreamer_pipeline:
+        pipeline = options.gstreamer_pipeline.replace("{device}", str(source))
+        cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+    else:
+        cap = cv2.VideoCapture(source, CAPTURE_BACKENDS.get(options.backend or "any", cv2.CAP_ANY))
+        if cap.isOpened() and isinstance(source, int):
+            _configure_device(cap, options)
+    if cap.isOpened():
+        print(f"Camera {source} negotiated: {describe_capture(cap)}")
+    return cap
+
+
+def iter_recorded_frames(path):
+    """Yields every frame of a video file or image directory."""
+    cap = open_capture(path)
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame
+    cap.release()
+
+
+class ReplayReader:
+    """
+    Reads a recorded source in order on the caller's thread. By default every frame is
+    delivered as fast as the pipeline can take it. With realtime=True frames are released
+    at the source frame rate and frames the pipeline is too slow for are skipped, like a
+    live camera behind a LatestFrameReader.
+    """
+
+    def __init__(self, cap, name="replay", realtime=False):
+        self.cap = cap
+        self.name = name
+        self.realtime = realtime
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.frame_period = 1.0 / fps if fps and fps > 0 else 1.0 / 30.0
+        self._next_due = None
+        self.exhausted = False
+        self.pending = 0  # Frames are read on demand, nothing ever waits
+
+        # Counters
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.read_failures = 0
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+    def close(self):
+        # Frames are read on the caller's thread, so nothing else can be inside cap.read()
+        self.cap.release()
+
+    def read(self, timeout=1.0):
+        if self.exhausted:
+            return False, None
+        if self.realtime:
+            now = time.perf_counter()
+            if self._next_due is None:
+                self._next_due = now
+            elif now < self._next_due:
+                time.sleep(self._next_due - now)
+            else:
+                # Skip the frames a live camera would have produced while we were busy
+                while now - self._next_due >= self.frame_period:
+                    if not self.cap.grab():
+                        self.exhausted = True
+                        return False, None
+                    self.frames_dropped += 1
+                    self._next_due += self.frame_period
+            self._next_due += self.frame_period
+        ret, frame = self.cap.read()
+        if not ret:
+            self.exhausted = True
+            return False, None
+        self.frames_captured += 1
+        return True, frame
+
+    def stats(self):
+        return {
+            "captured": self.frames_captured,
+            "dropped": self.frames_dropped,
+            "read_failures": self.read_failures,
+        }
@@ -1,20 +1,345 @@
 import cv2
+import numpy as np
+import os
 import supervision as sv
-from ultralytics import YOLO
+import threading
 import time
+from capture import LatestFrameReader, ReplayReader, open_capture
+from metrics import LoopMetrics
+from events import DetectionEvents
+from occupancy import OccupancyEstimator
 
-class PersonDetector:
-    def __init__(self, model_path):
-        # Path to the YOLO model file
-        self.model_path = model_path
-        self.model = None
-        
-        # Initialize tracking and annotation utilities from supervision
+
+class UltralyticsBackend:
+    """Runs the model through ultralytics.YOLO and its built-in pre/postprocessing."""
+
+    def __init__(self, model_path, conf=0.35, classes=None):
+        # Imported here so the ONNX Runtime backend never pulls in torch
+        started = time.perf_counter()
+        from ultralytics import YOLO
+        self.import_seconds = time.perf_counter() - started
+        self.model = YOLO(model_path, task="detect")
+        self.conf = conf
+        # Class ids to keep, e.g. (0,) for person only; filtered before NMS inside Ultralytics
+        self.classes = list(classes) if classes is not None else None
+        # Set to 1 once the model rejected a batch (static batch-1 ONNX export)
+        self.batch_size = None
+
+    @property
+    def names(self):
+        return self.model.names
+
+    def predict(self, frame):
+        result = self.model.predict(frame, conf=self.conf, classes=self.classes, verbose=False)[0]
+        return sv.Detections.from_ultralytics(result)
+
+    def predict_batch(self, frames):
+        """Runs several frames in one call. Falls back to one call per frame for fixed batch-1 exports."""
+        frames = list(frames)
+        if len(frames) > 1 and self.batch_size != 1:
+            try:
+                results = self.model.predict(frames, conf=self.conf, classes=self.classes, verbose=False)
+                return [sv.Detections.from_ultralytics(result) for result in results]
+            except Exception as e:
+                # Ultralytics does not expose the batch axis of an ONNX export; a static one fails here
+                print(f"Warning: batched inference failed ({e}), running one frame per call.")
+                self.batch_size = 1
+        return [self.predict(frame) for frame in frames]
+
+
+def variant_model_path(model_path, variant):
+    """Path of a model variant: "fp32" is the shipped file, "int8" the output of quantize.py."""
+    if variant in (None, "", "fp32"):
+        return model_path
+    root, ext = os.path.splitext(model_path)
+    return f"{root}_{variant}{ext}"
+
+
+def create_backend(name, model_path, **options):
+    """Creates an inference backend by name: 'ultralytics' or 'onnxruntime'."""
+    if name == "ultralytics":
+        return UltralyticsBackend(model_path, **options)
+    if name == "onnxruntime":
+        from onnx_backend import OnnxRuntimeBackend
+        return OnnxRuntimeBackend(model_path, **options)
+    raise ValueError(f"Unknown inference backend: {name}")
+
+
+class MotionGate:
+    """
+    Decides per frame whether inference is needed, using a cheap frame-difference score
+    on a small grayscale copy. Inference runs when the scene changed since the last
+    inferred frame or when max_interval frames have passed without inference.
+    """
+
+    def __init__(self, threshold=4.0, max_interval=10, size=(80, 60)):
+        self.threshold = threshold  # Mean absolute gray-level difference that counts as motion
+        self.max_interval = max_interval
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        self._reference = None
+        self._frames_since_inference = 0
+        self._last_trigger = None
+        self._started = time.time()
+        self.last_score = 0.0
+        # Counters
+        self.frames_seen = 0
+        self.inferences = 0
+        self.motion_triggers = 0
+        self.interval_triggers = 0
+        self.hits = 0           # Inferences that changed the person count
+        self.interval_hits = 0  # Changes only caught by the max-interval fallback (missed by motion)
+
+    def should_infer(self, frame):
+        self.frames_seen += 1
+        small = cv2.cvtColor(cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        if self._reference is None:
+            self._accept(small, "motion")
+            return True
+        self.last_score = cv2.mean(cv2.absdiff(small, self._reference))[0]
+        self._frames_since_inference += 1
+        if self.last_score >= self.threshold:
+            self._accept(small, "motion")
+            return True
+        if self._frames_since_inference >= self.max_interval:
+            self._accept(small, "interval")
+            return True
+        return False
+
+    def _accept(self, small, trigger):
+        # The reference is the last inferred frame, so slow changes still add up to motion
+        self._reference = small
+        self._frames_since_inference = 0
+        self._last_trigger = trigger
+        self.inferences += 1
+        if trigger == "motion":
+            self.motion_triggers += 1
+        else:
+            self.interval_triggers += 1
+
+    def record_result(self, count_changed):
+        if count_changed:
+            self.hits += 1
+            if self._last_trigger == "interval":
+                self.interval_hits += 1
+
+    def stats(self):
+        elapsed = max(time.time() - self._started, 1e-6)
+        return {
+            "frames": self.frames_seen,
+            "inferences": self.inferences,
+            "inference_rate": self.inferences / elapsed,
+            "duty_cycle": self.inferences / self.frames_seen if self.frames_seen else 0.0,
+            "motion_triggers": self.motion_triggers,
+            "interval_triggers": self.interval_triggers,
+            "hit_rate": self.hits / self.inferences if self.inferences else 0.0,
+            "interval_hits": self.interval_hits,
+            "last_motion_score": self.last_score,
+        }
+
+
+class CameraStream:
+    """Capture device and per-camera tracking state for one cabin camera."""
+
+    def __init__(self, source, index=0, replay=False, realtime=False, capture_options=None, seats=None):
+        self.source = source  # Device index, video file path or image directory
+        self.index = index
+        # Optional SeatLayout: inference runs on the crop around the seats and people are counted per seat
+        self.seats = seats
+        self._regions = []  # Frame regions of the last inference inputs
+        self.capture_options = capture_options  # Backend/FOURCC/resolution requested from the camera
+        # Recorded sources are read in order on the inference thread instead of a capture thread
+        self.replay = replay
+        self.realtime = realtime
+        self.cap = None  # OpenCV VideoCapture object
+        self.reader = None  # Capture thread holding only the newest frame
+        # Each camera keeps its own tracker, smoother and motion gate
         self.tracker = sv.ByteTrack(frame_rate=30)
         self.smoother = sv.DetectionsSmoother()
+        self.motion_gate = MotionGate()
+        self.detections = sv.Detections.empty()
+        self.count = 0
+        self.frame = None
+
+    def open(self):
+        self.cap = open_capture(self.source, self.capture_options)
+        if not self.cap.isOpened():
+            print(f"Error: Cannot open camera {self.source}")
+            self.cap = None
+            return False
+        return True
+
+    def frame_size(self):
+        """(height, width) the capture negotiated, or None when it does not report one (image folders)."""
+        height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        return (height, width) if height and width else None
+
+    def start_reader(self):
+        if self.reader is None and self.replay:
+            self.reader = ReplayReader(self.cap, name=str(self.source), realtime=self.realtime)
+        elif self.reader is None:
+            self.reader = LatestFrameReader(self.cap, name=str(self.source)).start()
+
+    def close(self):
+        if self.reader is not None:
+            # The reader releases the capture, only after its thread has left cap.read()
+            self.reader.close()
+            stats = self.reader.stats()
+            print(f"Capture stats [{self.source}]: {stats['captured']} frames captured, "
+                  f"{stats['dropped']} stale frames dropped, {stats['read_failures']} read failures.")
+            self.reader = None
+        elif self.cap is not None:
+            self.cap.release()
+        if self.motion_gate.inferences:
+            print(f"Motion gate stats [{self.source}]: {self.motion_gate.stats()}")
+        self.cap = None
+
+    def inference_inputs(self, tile_grid=None, tile_overlap=0.2):
+        """
+        Images to run the model on: the seat region (or the whole frame) and, with tile_grid,
+        overlapping tiles of it at full resolution so small people cover more model input pixels.
+        """
+        if self.seats is None:
+            view, (x, y) = self.frame, (0, 0)
+        else:
+            view, (x, y) = self.seats.crop(self.frame)
+        h, w = view.shape[:2]
+        self._regions = [(x, y, x + w, y + h)]
+        images = [view]
+        if tile_grid:
+            for x1, y1, x2, y2 in tile_regions(w, h, tile_grid, tile_overlap):
+                self._regions.append((x + x1, y + y1, x + x2, y + y2))
+                images.append(view[y1:y2, x1:x2])
+        return images
+
+    def merge_results(self, results):
+        """
+        Shifts the detections of each input back to frame coordinates and merges them.
+        Overlapping duplicates are removed by the NMS in update.
+        """
+        view_x1, view_y1, view_x2, view_y2 = self._regions[0]
+        merged = []
+        for i, (detections, (x1, y1, x2, y2)) in enumerate(zip(results, self._regions)):
+            if len(detections) == 0:
+                continue
+            xyxy = detections.xyxy + np.array([x1, y1, x1, y1], dtype=detections.xyxy.dtype)
+            if i:
+                # A box cut by a tile edge inside the view is a partial person; the full view or the
+                # neighbouring tile has them whole
+                cut = (((xyxy[:, 0] <= x1 + 2) & (x1 > view_x1)) | ((xyxy[:, 1] <= y1 + 2) & (y1 > view_y1)) |
+                       ((xyxy[:, 2] >= x2 - 2) & (x2 < view_x2)) | ((xyxy[:, 3] >= y2 - 2) & (y2 < view_y2)))
+                detections = detections[~cut]
+                xyxy = xyxy[~cut]
+            detections.xyxy = xyxy
+            merged.append(detections)
+        if not merged:
+            return sv.Detections.empty()
+        return merged[0] if len(merged) == 1 else sv.Detections.merge(merged)
+
+    def update(self, detections, metrics):
+        """Runs NMS, tracking and smoothing on new detections and updates the person count."""
+        t0 = time.perf_counter()
+        detections = detections.with_nms(threshold=0.3, class_agnostic=False)
+        t1 = time.perf_counter()
+        detections = self.tracker.update_with_detections(detections)
+        t2 = time.perf_counter()
+        detections = self.smoother.update_with_detections(detections)
+        t3 = time.perf_counter()
+        metrics.record("nms", t1 - t0)
+        metrics.record("track", t2 - t1)
+        metrics.record("smooth", t3 - t2)
+        self.detections = detections
+        # Count only class_id == 0 (usually 'person' in COCO)
+        previous_count = self.count
+        self.count = len(detections[detections.class_id == 0])
+        if self.seats is not None:
+            self.seats.update(detections)
+        return self.count != previous_count
+
+    def reset(self):
+        self.detections = sv.Detections.empty()
+        self.count = 0
+        if self.seats is not None:
+            self.seats.reset()
+
+
+def parse_sources(text):
+    """Parses a comma-separated source list like "0,1" or "cam_front.mp4,2" into device indices and paths."""
+    return [int(item) if item.strip().isdigit() else item.strip() for item in text.split(",") if item.strip()]
+
+
+def parse_tile_grid(text):
+    """Parses a tile grid like "2x2" (rows x cols) into a tuple, or returns None for an empty string."""
+    if not text:
+        return None
+    rows, cols = (int(v) for v in text.lower().split("x"))
+    return rows, cols
+
+
+def tile_regions(width, height, grid=(2, 2), overlap=0.2):
+    """Overlapping (x1, y1, x2, y2) tiles covering a width x height image in a (rows, cols) grid."""
+    rows, cols = grid
+    tile_w = min(width, int(np.ceil(width / (cols - (cols - 1) * overlap))))
+    tile_h = min(height, int(np.ceil(height / (rows - (rows - 1) * overlap))))
+    step_x = (width - tile_w) / (cols - 1) if cols > 1 else 0
+    step_y = (height - tile_h) / (rows - 1) if rows > 1 else 0
+    regions = []
+    for r in range(rows):
+        for c in range(cols):
+            x1, y1 = int(round(c * step_x)), int(round(r * step_y))
+            regions.append((x1, y1, x1 + tile_w, y1 + tile_h))
+    return regions
+
+
+def tile_frames(frames):
+    """Arranges camera frames in a grid (side by side for 2, 2x2 for 3-4) at the size of the first frame."""
+    if len(frames) == 1:
+        return frames[0]
+    h, w = frames[0].shape[:2]
+    tiles = [f if f.shape[:2] == (h, w) else cv2.resize(f, (w, h)) for f in frames]
+    cols = 2 if len(tiles) > 1 else 1
+    while len(tiles) % cols:
+        tiles.append(np.zeros_like(tiles[0]))
+    rows = [np.hstack(tiles[r:r + cols]) for r in range(0, len(tiles), cols)]
+    return np.vstack(rows)
+
+
+class PersonDetector:
+    def __init__(self, model_path, backend="ultralytics", backend_options=None, sources=(0,), count_fusion="sum",
+                 replay=False, realtime=False, capture_options=None, inference_process=False, model_variant="fp32",
+                 person_only=False, seat_layouts=None, max_tile_grid=None):
+        # Path to the YOLO model file; model_variant="int8" selects the quantized model next to it
+        self.model_variant = model_variant
+        self.model_path = variant_model_path(model_path, model_variant)
+        self.model = None
+        # Inference backend name and its options (thread counts, execution providers, ...)
+        self.backend = backend
+        self.backend_options = dict(backend_options or {})
+        # Only the person class is decoded and put through NMS; the other COCO classes are never scored
+        self.person_only = person_only
+        if person_only:
+            self.backend_options.setdefault("classes", (0,))
+        # Run the backend in a worker process fed through shared memory (see inference_worker.py)
+        self.inference_process = inference_process
+
+        # One stream per cabin camera; all cameras share one batched inference call
+        # replay=True reads recorded sources frame by frame (realtime=True paces them at their frame rate)
+        # seat_layouts holds one SeatLayout or None per camera (see seats.load_seat_layouts)
+        seat_layouts = seat_layouts or [None] * len(sources)
+        self.cameras = [
+            CameraStream(source, i, replay, realtime, capture_options, seat_layouts[i])
+            for i, source in enumerate(sources)
+        ]
+        # How per-camera counts are fused: "sum" for cameras covering separate rows, "max" for overlapping views
+        self.count_fusion = count_fusion
+        self.camera_counts = [0] * len(self.cameras)
+
+        # Initialize annotation utilities from supervision
         self.bbox_annotator = sv.BoxAnnotator(thickness=2)
         self.label_annotator = sv.LabelAnnotator()
-        self.cap = None  # OpenCV VideoCapture object
         
         # Detection and display state flags
         self.detection_active = False
@@ -23,130 +348,373 @@ class PersonDetector:
         self.show_bbox = False
         self.show_class = False
         self.show_score = False
+        # False when no one is looking at the video (window hidden, headless): skips all drawing
+        self.display_enabled = True
+        self.dropped_frames = 0  # Stale frames skipped by the capture threads
+        self._class_labels = {}
+        self._fps_overlay = None
 
-    def prepare_detector(self):
-        """Loads the model, initializes the webcam, and runs a warm-up prediction."""
-        print("Preparing detector...")
-        if self.model is None:
+        # Motion-gated scheduling: only infer when the cabin changes, coast on the last tracks otherwise
+        self.motion_gating = False
+
+        # Tiled inference for small children far from the camera: (rows, cols) of overlapping tiles
+        # inferred together with the full view, or None. Turned off again when the loop drops below
+        # tiling_min_fps.
+        self.tile_grid = None
+        self.tile_overlap = 0.2
+        self.tiling_min_fps = 15.0
+        # Largest grid tile_grid will be set to (e.g. the post-lock grid), so the inference worker
+        # is sized for it up front instead of growing in the middle of a check
+        self.max_tile_grid = max_tile_grid
+
+        # Rolling occupancy over many frames and track lifetimes; poll this instead of single counts
+        self.occupancy = OccupancyEstimator()
+        # Count/occupancy change events and rate-limited frame streams, see events.py
+        self.events = DetectionEvents()
+
+        # Always-on per-stage histograms and loop counters, see metrics.py
+        self.metrics = LoopMetrics()
+
+        # The model can be loaded ahead of prepare_detector (see load_model)
+        self._model_lock = threading.Lock()
+        self._capture_options = capture_options
+        self.startup_times = {}
+
+    @property
+    def cap(self):
+        # Capture of the first camera, kept for single-camera callers
+        return self.cameras[0].cap
+
+    def _warmup_frame_size(self):
+        options = self._capture_options
+        if options is not None and options.width and options.height:
+            return options.height, options.width
+        return 480, 640
+
+    def max_batch_size(self):
+        """Most images one predict_batch call can get: every camera with the largest tile grid."""
+        tiles = 0
+        for grid in (self.tile_grid, self.max_tile_grid):
+            if grid:
+                tiles = max(tiles, grid[0] * grid[1])
+        return len(self.cameras) * (1 + tiles)
+
+    def load_model(self):
+        """
+        Loads the model and warms it up on a synthetic frame at the real batch size.
+        Safe to call early from a background thread; later calls return immediately.
+        """
+        with self._model_lock:
+            if self.model is not None:
+                return self.model
+            t0 = time.perf_counter()
             # Load YOLO model for detection
-            self.model = YOLO(self.model_path, task="detect")
-        
-        if self.cap is None:
-            # Open webcam (device 0)
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
-                print("Error: Cannot open webcam")
-                self.cap = None
-                return False
-            
-        print("Warming up the model...")
-        ret, frame = self.cap.read()
-        if ret:
-            # Run a dummy prediction to warm up the model
-            self.model.predict(frame)
+            if self.inference_process:
+                from inference_worker import ProcessInferenceBackend
+                model = ProcessInferenceBackend(self.backend, self.model_path, self.backend_options,
+                                                slots=max(8, self.max_batch_size()),
+                                                frame_shape=self._warmup_frame_size() + (3,))
+            else:
+                model = create_backend(self.backend, self.model_path, **self.backend_options)
+            t1 = time.perf_counter()
+            # Run a dummy prediction to warm up the model; no camera frame is needed
+            height, width = self._warmup_frame_size()
+            frame = np.full((height, width, 3), 114, dtype=np.uint8)
+            model.predict_batch([frame] * len(self.cameras))
+            t2 = time.perf_counter()
+            self.startup_times.update({
+                "import_s": getattr(model, "import_seconds", 0.0),
+                "model_load_s": t1 - t0,
+                "warmup_s": t2 - t1,
+                "session_cache_hit": getattr(model, "session_cache_hit", False),
+            })
+            self.model = model
             print("Model warm-up complete.")
-        else:
-            print("Warning: Could not grab a frame for warm-up.")
-        print("Detector prepared.")
+            return model
+
+    def _load_model_in_background(self, errors):
+        try:
+            self.load_model()
+        except Exception as e:
+            errors.append(e)
+
+    def prepare_detector(self):
+        """Loads the model, initializes the cameras, and runs a warm-up prediction."""
+        print("Preparing detector...")
+        started = time.perf_counter()
+        if self.model is not None:
+            self.startup_times["model_preloaded"] = True
+
+        # Load and warm up the model while the cameras open
+        errors = []
+        loader = threading.Thread(target=self._load_model_in_background, args=(errors,), daemon=True)
+        loader.start()
+
+        t0 = time.perf_counter()
+        cameras_ok = all(camera.cap is not None or camera.open() for camera in self.cameras)
+        self.startup_times["camera_open_s"] = time.perf_counter() - t0
+
+        loader.join()
+        if errors:
+            print(f"Error: Cannot load model: {errors[0]}")
+        if errors or not cameras_ok:
+            self.release_detector()
+            return False
+
+        # Frames are as large as the cameras negotiated, which can differ from what was requested
+        if hasattr(self.model, "reserve"):
+            sizes = [camera.frame_size() for camera in self.cameras]
+            sizes = [size for size in sizes if size is not None] or [self._warmup_frame_size()]
+            self.model.reserve(self.max_batch_size(), (max(h for h, _ in sizes), max(w for _, w in sizes)))
+
+        for camera in self.cameras:
+            # Start the capture thread after warm-up so it does not compete for the device
+            camera.start_reader()
+        self.startup_times["total_s"] = time.perf_counter() - started
+        print(f"Detector prepared. Startup times: {self.startup_times}")
         return True
 
     def release_detector(self):
-        """Releases the webcam and model resources."""
+        """Releases the cameras. The model stays loaded for the next start."""
         self.video_running = False
-        if self.cap is not None:
-            self.cap.release()
-            self.cap = None
+        for camera in self.cameras:
+            camera.close()
         print("Detector released.")
         time.sleep(0.1)
 
-    def process_video(self, callback_update_count, *, stop_event=None):
+    def close(self):
+        """Releases the cameras and the model, including an inference worker and its shared memory."""
+        if any(camera.cap is not None for camera in self.cameras):
+            self.release_detector()
+        with self._model_lock:
+            if self.model is not None and hasattr(self.model, "close"):
+                self.model.close()
+            self.model = None
+
+    def fused_count(self):
+        """Cabin occupancy from the per-camera counts."""
+        if self.count_fusion == "max":
+            return max(self.camera_counts)
+        return sum(self.camera_counts)
+
+    def seat_counts(self):
+        """People per seat, keyed "<camera index>:<seat name>", for cameras with a seat layout."""
+        counts = {}
+        for camera in self.cameras:
+            if camera.seats is not None:
+                for name, count in camera.seats.counts.items():
+                    counts[f"{camera.index}:{name}"] = count
+        return counts
+
+    def _detection_overlays_enabled(self):
+        return self.detection_active and (self.show_bbox or self.show_class or self.show_score)
+
+    def _label_for(self, class_id, confidence):
+        # Class names are formatted once per class; only the score changes per detection
+        name = self._class_labels.get(class_id)
+        if name is None:
+            name = self._class_labels[class_id] = str(self.model.names[class_id])
+        if self.show_score:
+            return f"{name} {confidence:0.2f}"
+        return name
+
+    def _annotate(self, camera, fresh):
+        """
+        Draws the enabled overlays directly onto the camera frame. Frames come fresh from
+        the capture reader and are not used again, so no copy is needed. A frame kept from
+        an earlier iteration was already drawn on and is returned as is.
+        """
+        frame = camera.frame
+        if not fresh or not self._detection_overlays_enabled():
+            return frame
+        if camera.seats is not None:
+            camera.seats.draw(frame)
+        if len(camera.detections) == 0:
+            return frame
+        detections = camera.detections
+        
+        # Draw bounding boxes if enabled
+        if self.show_bbox:
+            frame = self.bbox_annotator.annotate(frame, detections)
+        
+        # Draw class/score labels if enabled
+        if self.show_class or self.show_score:
+            labels = [
+                self._label_for(class_id, confidence)
+                for class_id, confidence in zip(detections.class_id, detections.confidence)
+            ]
+            frame = self.label_annotator.annotate(frame, detections, labels)
+        return frame
+
+    def _draw_fps(self, frame, display_fps):
+        if self._fps_overlay is None:
+            # The box is sized once for the widest text so it neither jitters nor needs getTextSize per frame
+            font_face = cv2.FONT_HERSHEY_SIMPLEX
+            font_scale = 0.8
+            font_thickness = 2
+            margin = 70
+            padding = 10
+            (text_w, text_h), baseline = cv2.getTextSize("FPS: 888.8", font_face, font_scale, font_thickness)
+            text_x = margin
+            text_y = text_h + 60
+            rect = ((text_x - padding, text_y - text_h - baseline - padding), (text_x + text_w + padding, text_y + padding))
+            self._fps_overlay = (font_face, font_scale, font_thickness, (text_x, text_y), rect)
+
+        font_face, font_scale, font_thickness, origin, (top_left, bottom_right) = self._fps_overlay
+        text_color = (255, 255, 255)
+        bg_color = (0, 0, 0)
+        cv2.rectangle(frame, top_left, bottom_right, bg_color, -1)
+        cv2.putText(frame, f"FPS: {display_fps:.1f}", origin,
+                    font_face, font_scale, text_color, font_thickness, cv2.LINE_AA)
+
+    def subscribe(self, channel, callback, max_rate=None):
+        """
+        Subscribes to detection events: "count" (fused count, per-camera counts) and "occupancy"
+        (occupancy snapshot) fire on changes only, "frame" (annotated frame) at most max_rate times
+        per second. Returns a Subscription with unsubscribe().
+        """
+        return self.events.subscribe(channel, callback, max_rate)
+
+    def process_video(self, callback_update_count=None, *, stop_event=None):
         """
-        Processes the video feed, runs detection, and calls the callback with the count and frame.
+        Processes the video feeds, runs batched detection and publishes count, occupancy and
+        frame events. The optional callback is still called for every frame with the fused
+        count and the (tiled) frame. Per-camera counts are kept in camera_counts.
         Assumes prepare_detector has been called.
         """
-        if self.cap is None or not self.cap.isOpened():
+        if any(camera.cap is None or not camera.cap.isOpened() or camera.reader is None for camera in self.cameras):
             print("Error: Webcam not prepared. Call prepare_detector() first.")
-            callback_update_count(0, None)
+            if callback_update_count is not None:
+                callback_update_count(0, None)
             return
 
         self.video_running = True
         detected_count = 0
+        was_active = False
         fps_start_time = time.time()
         fps_frame_count = 0
         display_fps = 0.0
+        slow_tiled_windows = 0
+        last_count = 0
+        last_occupancy = (False, 0)
 
         if stop_event is None:
             print("Error: stop_event is required for process_video.")
             self.release_detector()
             return
             
+        metrics = self.metrics
         while self.video_running and not stop_event.is_set():
-            ret, frame = self.cap.read()
-            if not ret:
+            # Take the newest frame of each camera; older ones were dropped by the capture threads
+            t0 = time.perf_counter()
+            fresh = []
+            for camera in self.cameras:
+                ret, frame = camera.reader.read(timeout=1.0)
+                if ret:
+                    camera.frame = frame
+                    fresh.append(camera)
+            metrics.record("capture", time.perf_counter() - t0)
+            metrics.set_gauge("queue_depth", sum(camera.reader.pending for camera in self.cameras))
+            if not fresh:
+                if all(camera.reader.exhausted for camera in self.cameras):
+                    print("End of recorded sources.")
+                    break
                 print("Warning: Failed to grab frame")
-                time.sleep(0.1) 
                 continue
 
             if self.detection_active:
-                # Run detection and tracking
-                result = self.model.predict(frame, conf=0.35)[0]
-                detections = sv.Detections.from_ultralytics(result).with_nms(threshold=0.3, class_agnostic=False)
-                detections = self.tracker.update_with_detections(detections)
-                detections = self.smoother.update_with_detections(detections)
-                # Count only class_id == 0 (usually 'person' in COCO)
-                detected_count = len(detections[detections.class_id == 0])
+                if not was_active:
+                    # New detection cycle: the first frame of every camera runs inference
+                    for camera in self.cameras:
+                        camera.motion_gate.reset()
+                    self.occupancy.reset()
+                    was_active = True
+                # Static cameras keep their last tracked detections instead of running the model
+                to_infer = [c for c in fresh if not self.motion_gating or c.motion_gate.should_infer(c.frame)]
+                if to_infer:
+                    # Run detection for all cameras (and their tiles) that need it in one batched call
+                    inputs = [camera.inference_inputs(self.tile_grid, self.tile_overlap) for camera in to_infer]
+                    t0 = time.perf_counter()
+                    batch = self.model.predict_batch([image for images in inputs for image in images])
+                    metrics.record("predict", time.perf_counter() - t0)
+                    metrics.increment("inferences", len(to_infer))
+                    if self.tile_grid:
+                        metrics.increment("tiled_inferences", len(to_infer))
+                    start = 0
+                    for camera, images in zip(to_infer, inputs):
+                        detections = camera.merge_results(batch[start:start + len(images)])
+                        start += len(images)
+                        changed = camera.update(detections, metrics)
+                        if self.motion_gating:
+                            camera.motion_gate.record_result(changed)
+                self.camera_counts = [camera.count for camera in self.cameras]
+                detected_count = self.fused_count()
+                # Frames without inference repeat the last tracks, so the estimator ticks every frame
+                self.occupancy.update([camera.detections for camera in self.cameras])
             else:
+                if was_active:
+                    self.occupancy.reset()
+                was_active = False
+                for camera in self.cameras:
+                    camera.reset()
+                self.camera_counts = [0] * len(self.cameras)
                 detected_count = 0
-                detections = sv.Detections.empty()
 
-            annotated_frame = frame.copy()
-            
-            # Draw bounding boxes if enabled
-            if self.show_bbox and self.detection_active:
-                annotated_frame = self.bbox_annotator.annotate(annotated_frame, detections)
-            
-            # Draw class/score labels if enabled
-            if (self.show_class or self.show_score) and self.detection_active:
-                labels = [
-                    f"{self.model.names[class_id]}{' ' + f'{confidence:0.2f}' if self.show_score else ''}"
-                    for class_id, confidence in zip(detections.class_id, detections.confidence)
-                ]
-                annotated_frame = self.label_annotator.annotate(annotated_frame, detections, labels)
-            
             # FPS calculation
             fps_frame_count += 1
             elapsed_time = time.time() - fps_start_time
             if elapsed_time > 1.0:
                 display_fps = fps_frame_count / elapsed_time
+                self.dropped_frames = sum(camera.reader.frames_dropped for camera in self.cameras)
+                metrics.set_counter("dropped_frames", self.dropped_frames)
+                metrics.set_gauge("fps", display_fps)
+                # Two slow windows in a row, so the first (re)shaped batch call alone does not switch tiling off
+                if self.tile_grid and self.detection_active and display_fps < self.tiling_min_fps:
+                    slow_tiled_windows += 1
+                else:
+                    slow_tiled_windows = 0
+                if slow_tiled_windows >= 2:
+                    slow_tiled_windows = 0
+                    print(f"Warning: tiled inference dropped the loop to {display_fps:.1f} FPS "
+                          f"(budget {self.tiling_min_fps:.0f} FPS), falling back to full-frame inference.")
+                    self.tile_grid = None
+                    metrics.increment("tiling_fallbacks")
                 fps_frame_count = 0
                 fps_start_time = time.time()
 
-            # Draw FPS on frame if enabled
-            if self.show_fps:
-                fps_text = f"FPS: {display_fps:.1f}"
-                font_face = cv2.FONT_HERSHEY_SIMPLEX
-                font_scale = 0.8
-                font_thickness = 2
-                text_color = (255, 255, 255)  
-                bg_color = (0, 0, 0)          
-                margin = 70
-                padding = 10
-
-                (text_w, text_h), baseline = cv2.getTextSize(fps_text, font_face, font_scale, font_thickness)
-
-                text_x = margin
-                text_y = text_h + 60 
-
-                rect_x1 = text_x - padding
-                rect_y1 = text_y - text_h - baseline - padding
-                rect_x2 = text_x + text_w + padding
-                rect_y2 = text_y + padding
-
-                cv2.rectangle(annotated_frame, (rect_x1, rect_y1), (rect_x2, rect_y2), bg_color, -1)
-                cv2.putText(annotated_frame, fps_text, (text_x, text_y), 
-                            font_face, font_scale, text_color, font_thickness, cv2.LINE_AA)
-
-            # Call the callback with the current count and frame
-            callback_update_count(detected_count, annotated_frame)
+            # Count and occupancy subscribers hear about transitions only
+            t0 = time.perf_counter()
+            if detected_count != last_count:
+                last_count = detected_count
+                self.events.publish("count", detected_count, list(self.camera_counts))
+            occupancy_state = (self.occupancy.occupied, self.occupancy.count)
+            if occupancy_state != last_occupancy:
+                last_occupancy = occupancy_state
+                self.events.publish("occupancy", self.occupancy.snapshot())
+            events_time = time.perf_counter() - t0
+
+            # Annotate only when someone is looking and a frame is wanted; the callback gets None otherwise
+            t0 = time.perf_counter()
+            frame_subscribers = self.events.frame_subscribers_due(t0) if self.display_enabled else []
+            if self.display_enabled and (frame_subscribers or callback_update_count is not None):
+                annotated_frame = tile_frames([
+                    self._annotate(camera, camera in fresh)
+                    for camera in self.cameras if camera.frame is not None
+                ])
+                # Draw FPS on frame if enabled
+                if self.show_fps:
+                    self._draw_fps(annotated_frame, display_fps)
+            else:
+                annotated_frame = None
+            metrics.record("annotate", time.perf_counter() - t0)
+
+            # Deliver the frame to due subscribers and the per-frame callback
+            t0 = time.perf_counter()
+            if frame_subscribers:
+                self.events.publish_frame(frame_subscribers, annotated_frame, t0)
+            if callback_update_count is not None:
+                callback_update_count(detected_count, annotated_frame)
+            metrics.record("callback", events_time + time.perf_counter() - t0)
+            metrics.increment("frames")
         
         self.release_detector()
\ No newline at end of file
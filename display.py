@@ -0,0 +1,156 @@
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+
+class DisplayPipeline:
+    """
+    Prepares preview frames for the GUI on the detection thread and hands them to Tk.
+    The preview rate is capped independently of the inference FPS, frames that arrive
+    while Tk is still busy are dropped, and at most one UI update is pending at a time.
+    Pass max_rate=None when the frames are already rate limited upstream (e.g. by the
+    detector's "frame" channel), so only the single-pending guard drops frames.
+    """
+
+    def __init__(self, root, on_frame, max_rate=12.0):
+        self.root = root
+        self.on_frame = on_frame  # Called on the Tk thread with an RGB frame of the target size
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self._size = None  # (width, height) of the video widget
+        self._buffer = None  # Preallocated resize/convert buffer
+        self._pending = False
+        self._last_submit = 0.0
+        self._lock = threading.Lock()
+
+        # Counters
+        self.frames_shown = 0
+        self.frames_dropped = 0
+
+    def set_size(self, width, height):
+        """Sets the preview size. Call from the Tk thread (e.g. on <Configure>)."""
+        if width > 1 and height > 1:
+            self._size = (width, height)
+
+    def submit(self, frame):
+        """Called from the detection thread. Returns False when the frame was dropped."""
+        now = time.perf_counter()
+        with self._lock:
+            if self._size is None or self._pending or now - self._last_submit < self.min_interval:
+                self.frames_dropped += 1
+                return False
+            self._pending = True
+            self._last_submit = now
+
+        width, height = self._size
+        if self._buffer is None or self._buffer.shape[:2] != (height, width):
+            self._buffer = np.empty((height, width, 3), dtype=np.uint8)
+        # Resize first so the BGR->RGB conversion runs on the smaller image, both into the same buffer
+        cv2.resize(frame, (width, height), dst=self._buffer, interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(self._buffer, cv2.COLOR_BGR2RGB, dst=self._buffer)
+        try:
+            self.root.after(0, self._deliver)
+        except RuntimeError:
+            # Tk main loop is gone (application closing)
+            self._pending = False
+            return False
+        return True
+
+    def _deliver(self):
+        try:
+            self.on_frame(self._buffer)
+            self.frames_shown += 1
+        finally:
+            # Only now may the detection thread write the buffer again
+            self._pending = False
+
+    def reset(self):
+        with self._lock:
+            self._pending = False
+            self._last_submit = 0.0
+
+
+class VideoSurface:
+    """
+    A single PhotoImage shown in the video label and updated in place for every frame.
+    Only a resize of the label allocates a new PhotoImage, so memory stays flat.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.photo = None
+        self._size = None
+
+    def show(self, rgb_frame):
+        """Pastes an RGB frame into the surface. Call from the Tk thread."""
+        height, width = rgb_frame.shape[:2]
+        if self.photo is None or self._size != (width, height):
+            self.photo = ImageTk.PhotoImage("RGB", (width, height))
+            self._size = (width, height)
+            self.label.configure(image=self.photo, text="")
+        # frombuffer wraps the array without copying; paste copies the pixels straight into Tk
+        self.photo.paste(Image.frombuffer("RGB", (width, height), rgb_frame, "raw", "RGB", 0, 1))
+
+    def reset(self):
+        # The label was given another image; the next frame re-attaches the surface
+        self.photo = None
+        self._size = None
+
+
+def soak(seconds=600, rate=15.0, sample_every=10.0, max_growth_mb=8.0):
+    """
+    Feeds synthetic frames through DisplayPipeline and VideoSurface in a real Tk window
+    and checks that RSS stays flat. Returns True when growth after warm-up is within budget.
+    """
+    import tkinter
+    import psutil
+
+    process = psutil.Process()
+    root = tkinter.Tk()
+    root.geometry("660x500")
+    label = tkinter.Label(root)
+    label.pack(fill="both", expand=True)
+    surface = VideoSurface(label)
+    pipeline = DisplayPipeline(root, surface.show, max_rate=rate)
+    pipeline.set_size(640, 480)
+
+    stop = threading.Event()
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(8)]
+
+    def produce():
+        i = 0
+        while not stop.is_set():
+            pipeline.submit(frames[i % len(frames)])
+            i += 1
+            time.sleep(1.0 / 30.0)
+
+    samples = []
+    started = time.time()
+
+    def sample():
+        samples.append(process.memory_info().rss / (1024.0 * 1024.0))
+        print(f"[soak] t={time.time() - started:6.0f}s rss={samples[-1]:.1f} MiB shown={pipeline.frames_shown}")
+        if time.time() - started >= seconds:
+            stop.set()
+            root.destroy()
+        else:
+            root.after(int(sample_every * 1000), sample)
+
+    threading.Thread(target=produce, daemon=True).start()
+    root.after(int(sample_every * 1000), sample)
+    root.mainloop()
+
+    # Ignore the first samples while caches and the allocator warm up
+    steady = samples[2:] if len(samples) > 3 else samples
+    growth = max(steady) - steady[0] if steady else 0.0
+    print(f"[soak] RSS growth after warm-up: {growth:.1f} MiB (budget {max_growth_mb} MiB)")
+    return growth <= max_growth_mb
+
+
+if __name__ == "__main__":
+    # Usage: python display.py [seconds]
+    sys.exit(0 if soak(float(sys.argv[1]) if len(sys.argv) > 1 else 600) else 1)
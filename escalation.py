@@ -0,0 +1,254 @@
+import datetime
+import threading
+
+# Texts of everything the escalation reports, by key. The GUI shows these; other front ends
+# (e.g. noc_daemon.py) can pass their own table with the same keys.
+MESSAGES = {
+    "check_started": "Bắt đầu chu trình nhận diện người trên xe.",
+    "alert_countdown": "Phát âm thanh sau {remaining}s",
+    "people_detected": "Phát hiện còn {count} người trên xe.",
+    "alert_occupied": "Kích hoạt cảnh báo âm thanh (có người trên xe).",
+    "alert_check": "Kích hoạt cảnh báo âm thanh (yêu cầu kiểm tra xe).",
+    "invalid_auto_open_attempts": "Lỗi: giá trị số lần thử không hợp lệ.",
+    "invalid_sos_minutes": "Lỗi: giá trị phút SOS không hợp lệ.",
+    "invalid_cqcn_minutes": "Lỗi: giá trị phút CQCN không hợp lệ.",
+    "auto_open_countdown": "Mở cửa tự động lần {attempt} sau {remaining}s...",
+    "auto_open_succeeded": "Mở cửa tự động thành công.",
+    "auto_open_attempt_failed": "Mở cửa lần {attempt} thất bại (cửa bị khoá).",
+    "auto_open_failed": "Tất cả các lần thử mở cửa đều thất bại.",
+    "auto_open_cancelled": "Hủy mở cửa tự động do người dùng can thiệp.",
+    "sos_countdown": "Gửi SOS sau {minutes:02d}:{seconds:02d}...",
+    "sos_sending": "Đang gửi tin nhắn SOS...",
+    "sos_sent": "Đã gửi tin nhắn SOS.",
+    "sos_recipient_failed": "SOS tới {recipient} thất bại ({error}).",
+    "sos_delivered": "Gửi SOS thành công ({delivered}/{total} người nhận).",
+    "sos_failed": "Gửi SOS thất bại.",
+    "cqcn_countdown": "Gửi tín hiệu đến CQCN sau {minutes:02d}:{seconds:02d}...",
+    "authorities_notified": "Hệ thống đã gửi tín hiệu đến Cơ Quan Chức Năng.",
+}
+
+ALERT_COUNTDOWN = 5  # Seconds from the start of the check to the alert decision
+AUTO_OPEN_DELAY = 10  # Seconds before each auto-open attempt
+AUTO_OPEN_RETRY_GAP = 2.0
+
+
+class EscalationController:
+    """
+    The post-lock check and its escalation: alert countdown, alert sounds, auto-open attempts,
+    SOS, safety instructions and the notification to the authorities. Every stage is a timer
+    on the given TimerWheel and all methods run on the thread that advances it.
+
+    Front ends only wire callbacks:
+    - settings(name) returns "auto_open_attempts", "sos_minutes" or "cqcn_minutes" as a number
+      or raises ValueError
+    - report(message, level) logs and shows a message, level "info", "success" or "error"
+    - countdown(stage, message) shows a countdown that updates every second
+    - on_count(count) shows the number of people on board
+    - on_auto_opened() is called after the door was opened automatically
+    - call_soon(callback, *args) runs a callback on the wheel's thread (default: call_soon_threadsafe)
+    """
+
+    def __init__(self, state, detector, notifier, timers, settings, report, countdown=None, on_count=None,
+                 on_auto_opened=None, call_soon=None, messages=None, post_lock_tile_grid=None):
+        self.state = state
+        self.detector = detector
+        self.notifier = notifier
+        self.timers = timers
+        self.settings = settings
+        self.report = report
+        self.countdown = countdown or (lambda stage, message: None)
+        self.on_count = on_count or (lambda count: None)
+        self.on_auto_opened = on_auto_opened or (lambda: None)
+        self.call_soon = call_soon or timers.call_soon_threadsafe
+        self.messages = messages or MESSAGES
+        self.post_lock_tile_grid = post_lock_tile_grid
+        self.stage_timers = {}  # Stage name -> pending Timer: "alert_countdown", "auto_open", "sos", "cqcn"
+        self.generation = 0  # Bumped when the alert is cancelled, so late SOS reports are ignored
+        self.incident_id = None
+        self.escalated = False  # The auto-open -> SOS -> authorities escalation ran for this incident
+
+    def _say(self, key, level="info", **fields):
+        self.report(self.messages[key].format(**fields), level)
+
+    def _setting(self, name):
+        try:
+            return float(self.settings(name))
+        except ValueError:
+            self._say(f"invalid_{name}", "error")
+            return None
+
+    # --- Stages ---
+
+    def _schedule_stage(self, stage, delay, callback, *args):
+        # A stage has at most one pending timer; scheduling it again replaces that timer
+        self.timers.cancel(self.stage_timers.get(stage))
+        self.stage_timers[stage] = self.timers.call_later(delay, callback, *args)
+
+    def stage_active(self, stage):
+        timer = self.stage_timers.get(stage)
+        return timer is not None and not timer.cancelled
+
+    def _cancel_stages(self, *stages):
+        for stage in stages:
+            self.timers.cancel(self.stage_timers.pop(stage, None))
+
+    def cancel(self):
+        """Cancels every pending stage and ends the incident (turn off alarm, engine stop)."""
+        self._cancel_stages(*list(self.stage_timers))
+        self.generation += 1
+        self.escalated = False
+
+    def _countdown(self, stage, remaining, message, on_done):
+        # Shows message(remaining) every second, then calls on_done
+        if remaining > 0:
+            self.countdown(stage, message(remaining))
+            self._schedule_stage(stage, 1.0, self._countdown, stage, remaining - 1, message, on_done)
+        else:
+            on_done()
+
+    def _minutes_countdown(self, key):
+        return lambda remaining: self.messages[key].format(minutes=remaining // 60, seconds=remaining % 60)
+
+    # --- Check and alert ---
+
+    def start_check(self):
+        """Starts the post-lock check. Returns the transition, or None if the state does not allow it."""
+        transition = self.state.fire("start_check")
+        if not transition:
+            return None
+        # Identifies this check in queued alerts so a re-sent alert is never delivered twice
+        self.incident_id = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.escalated = False
+        # Small children in footwells are easy to miss at 320 px: use tiled inference during the post-lock check only
+        self.detector.tile_grid = self.post_lock_tile_grid
+        self._say("check_started")
+        self.on_occupancy_changed(self.detector.occupancy.snapshot())
+        self._countdown("alert_countdown", ALERT_COUNTDOWN,
+                        lambda remaining: self.messages["alert_countdown"].format(remaining=remaining),
+                        self._on_alert_countdown_done)
+        return transition
+
+    def _on_alert_countdown_done(self):
+        if not self.state.detection_active: return
+        self.state.fire("alert")
+        count = self.detector.occupancy.count
+        self._say("people_detected", count=count)
+        self.on_count(count)
+        self.initiate_alert_sound()
+
+    def initiate_alert_sound(self):
+        # Start alert sounds and escalation if needed
+        if not self.state.detection_active: return
+        # The post-lock check is over; keep tracking at full-frame cost
+        self.detector.tile_grid = None
+        # Decide on the occupancy of the last seconds, not the last frame
+        if self.detector.occupancy.occupied:
+            # Once per incident: finished stages must not start the escalation again
+            if not self.escalated:
+                self.escalated = True
+                self._say("alert_occupied")
+                self._start_auto_open_sequence()
+        else:
+            self._say("alert_check")
+        self.notifier.start_alert_sounds(self.next_alert_sound)
+
+    def next_alert_sound(self):
+        # Audio scheduler thread, before each alert sound: alarm if someone is on board, else ask to check
+        return "alert" if self.detector.occupancy.occupied else "check_again"
+
+    def on_occupancy_changed(self, occupancy):
+        """
+        Updates the count, and escalates at once if someone is found after an alert that asked
+        the driver to check the car. Later changes (1 -> 2 people, flicker) only update the count.
+        """
+        if not self.state.detection_active:
+            return
+        if not self.stage_active("alert_countdown"):
+            self.on_count(occupancy["count"])
+        if occupancy["occupied"] and not self.escalated and self.notifier.alert_sounds_active():
+            self.initiate_alert_sound()
+
+    # --- Auto-open ---
+
+    def _start_auto_open_sequence(self):
+        attempts = self._setting("auto_open_attempts")
+        if attempts is None:
+            return
+        if attempts <= 0:
+            self._on_auto_open_failed()
+            return
+        self._auto_open_countdown(1, int(attempts), AUTO_OPEN_DELAY)
+
+    def _auto_open_countdown(self, attempt, attempts, remaining):
+        if remaining > 0:
+            self.countdown("auto_open", self.messages["auto_open_countdown"].format(attempt=attempt, remaining=remaining))
+            self._schedule_stage("auto_open", 1.0, self._auto_open_countdown, attempt, attempts, remaining - 1)
+            return
+        if not self.state.locked:
+            self._say("auto_open_succeeded", "success")
+            if self.state.detection_active and self.state.fire("auto_open"):
+                self.on_auto_opened()
+            return
+        self._say("auto_open_attempt_failed", "error", attempt=attempt)
+        if attempt < attempts:
+            self._schedule_stage("auto_open", AUTO_OPEN_RETRY_GAP, self._auto_open_countdown, attempt + 1, attempts,
+                                 AUTO_OPEN_DELAY)
+        else:
+            self._schedule_stage("auto_open", AUTO_OPEN_RETRY_GAP, self._on_auto_open_failed)
+
+    def cancel_auto_open(self):
+        """The door was opened by hand: drop a pending auto-open attempt."""
+        if self.stage_active("auto_open"):
+            self._say("auto_open_cancelled")
+            self._cancel_stages("auto_open")
+
+    def _on_auto_open_failed(self):
+        self._say("auto_open_failed", "error")
+        self._start_sos_sequence()
+
+    # --- SOS and authorities ---
+
+    def _start_sos_sequence(self):
+        minutes = self._setting("sos_minutes")
+        if minutes is None:
+            return
+        self._countdown("sos", int(minutes * 60), self._minutes_countdown("sos_countdown"), self._send_sos)
+
+    def _send_sos(self):
+        self._say("sos_sending")
+        # Waiting for the delivery report blocks, so it runs on a worker and reports back through the wheel
+        threading.Thread(target=self._send_sos_worker, args=(self.generation,), daemon=True).start()
+
+    def _send_sos_worker(self, generation):
+        report = self.notifier.send_sos_message(self.incident_id)
+        self.call_soon(self._on_sos_report, report, generation)
+
+    def _on_sos_report(self, report, generation):
+        if generation != self.generation: return
+        self._say("sos_sent")
+        delivered = [result for result in report if result.delivered]
+        for result in report:
+            if not result.delivered:
+                self._say("sos_recipient_failed", "error", recipient=result.recipient, error=result.error)
+        if delivered:
+            self._say("sos_delivered", "success", delivered=len(delivered), total=len(report))
+        else:
+            self._say("sos_failed", "error")
+        self._schedule_stage("sos", 1.0, self._start_instructions_and_cqcn)
+
+    def _start_instructions_and_cqcn(self):
+        self._start_cqcn_sequence()
+        # Safety instructions pre-empt the alarm in the audio scheduler
+        self.notifier.stop_alert_sounds()
+        self.notifier.start_safety_instructions()
+
+    def _start_cqcn_sequence(self):
+        minutes = self._setting("cqcn_minutes")
+        if minutes is None:
+            return
+        self._countdown("cqcn", int(minutes * 60), self._minutes_countdown("cqcn_countdown"), self._notify_authorities)
+
+    def _notify_authorities(self):
+        # Only queues the message, so it is fine on the wheel's thread
+        self.notifier.send_emergency(self.incident_id)
+        self._say("authorities_notified", "error")
@@ -0,0 +1,71 @@
+import threading
+import time
+
+# Channels published by the detection loop
+CHANNELS = ("count", "occupancy", "frame")
+
+
+class Subscription:
+    def __init__(self, events, channel, callback, max_rate=None):
+        self.events = events
+        self.channel = channel
+        self.callback = callback
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.last_delivery = 0.0
+
+    def unsubscribe(self):
+        self.events.unsubscribe(self)
+
+
+class DetectionEvents:
+    """
+    Subscriber lists for the detection loop. "count" and "occupancy" fire only when the
+    value changes; "frame" delivers annotated frames, each subscriber at its own maximum
+    rate. Callbacks run on the detection thread and must hand work to their own thread
+    (e.g. root.after for Tk) instead of blocking.
+    """
+
+    def __init__(self):
+        self._subscribers = {channel: () for channel in CHANNELS}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel, callback, max_rate=None):
+        """Registers a callback and returns its Subscription. max_rate (Hz) only applies to "frame"."""
+        if channel not in self._subscribers:
+            raise ValueError(f"Unknown detection event channel: {channel}")
+        subscription = Subscription(self, channel, callback, max_rate)
+        with self._lock:
+            # Lists are replaced, not mutated, so the loop can iterate without the lock
+            self._subscribers[channel] = self._subscribers[channel] + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers[subscription.channel] = tuple(
+                s for s in self._subscribers[subscription.channel] if s is not subscription
+            )
+
+    def has_subscribers(self, channel):
+        return bool(self._subscribers[channel])
+
+    def frame_subscribers_due(self, now=None):
+        """Frame subscribers whose rate limit allows a delivery now. Empty means no frame needs drawing."""
+        now = time.perf_counter() if now is None else now
+        return [s for s in self._subscribers["frame"] if now - s.last_delivery >= s.min_interval]
+
+    def publish(self, channel, *args):
+        for subscription in self._subscribers[channel]:
+            self._deliver(subscription, args)
+
+    def publish_frame(self, subscribers, frame, now=None):
+        now = time.perf_counter() if now is None else now
+        for subscription in subscribers:
+            subscription.last_delivery = now
+            self._deliver(subscription, (frame,))
+
+    def _deliver(self, subscription, args):
+        try:
+            subscription.callback(*args)
+        except Exception as e:
+            # A failing subscriber must not stop detection
+            print(f"Error in {subscription.channel} subscriber {subscription.callback}: {e}")
@@ -1,9 +1,16 @@
 import customtkinter as ctk
+import tkinter
 from PIL import Image
 from state_manager import StateManager
-from detection import PersonDetector
+from detection import PersonDetector, parse_sources, parse_tile_grid
+from capture import CaptureOptions
 from notifier import Notifier
-import cv2
+from metrics import MetricsServer
+from display import DisplayPipeline, VideoSurface
+from seats import load_seat_layouts
+from timer_wheel import TimerWheel
+from escalation import EscalationController
+import os
 import time
 import datetime
 import threading
@@ -13,6 +20,9 @@ import pygame
 ctk.set_appearance_mode("light")
 ctk.set_default_color_theme("blue")
 
+# All countdowns and escalation stages run on one timer wheel advanced from Tk at this interval
+TIMER_TICK_MS = 100
+
 class NOCGui:
     def __init__(self, root):
         # Main GUI initialization and state setup
@@ -23,33 +33,49 @@ class NOCGui:
         self.root.title("NOC")
 
         self.notifier = Notifier()
-        self.state = StateManager()
-        self.detector = PersonDetector(model_path="models/yolo11n_320.onnx")
+        sources = parse_sources(os.environ.get("NOC_CAMERAS", "0"))
+        # Tile grid for the post-lock check, e.g. NOC_TILES=2x2 (off when unset)
+        self.post_lock_tile_grid = parse_tile_grid(os.environ.get("NOC_TILES", ""))
+        self.detector = PersonDetector(
+            model_path="models/yolo11n_320.onnx",
+            backend=os.environ.get("NOC_BACKEND", "ultralytics"),
+            sources=sources,
+            capture_options=CaptureOptions.from_env(),
+            inference_process=os.environ.get("NOC_INFERENCE_PROCESS") == "1",
+            model_variant=os.environ.get("NOC_MODEL_VARIANT", "fp32"),
+            person_only=os.environ.get("NOC_PERSON_ONLY") == "1",
+            seat_layouts=load_seat_layouts(os.environ["NOC_SEATS"], len(sources)) if os.environ.get("NOC_SEATS") else None,
+            max_tile_grid=self.post_lock_tile_grid,
+        )
+        # Vehicle, door, lock and alert state; the detector follows it through a transition hook
+        self.state = StateManager(log=self.notifier.log_event, metrics=self.detector.metrics)
+        self.state.subscribe(self._on_state_transition)
+        # Load and warm up the model now so pressing "engine start" only has to open the camera
+        threading.Thread(target=self._preload_model, daemon=True).start()
+        # Optional local scrape endpoint for the detection loop metrics
+        self.metrics_server = None
+        if os.environ.get("NOC_METRICS_PORT"):
+            self.metrics_server = MetricsServer(self.detector.metrics, port=int(os.environ["NOC_METRICS_PORT"])).start()
         
         self.vertical_switch_state = False
         self.engine_running = False
         self.uptime_start = None
         
-        self.vehicle_stopped_completely = False
-        self.door_fully_open = False
-        self.door_fully_closed = True
-        self.detection_active = False
-        self.alarm_was_turned_off = False
-        self.current_image = None
-        self.last_detected_count = 0 
-
         self.detection_thread = None
-        self.alert_sound_thread = None
-        self.auto_open_thread = None 
-        self.sos_thread = None
-        self.safety_instruction_thread = None
-        self.cqcn_thread = None
         self.stop_event = threading.Event()
-        self.stop_alert_sound_event = threading.Event()
-        self.stop_auto_open_event = threading.Event()
-        self.stop_safety_instruction_event = threading.Event()
-        self.stop_cqcn_event = threading.Event()
-        self.countdown_timer_id = None
+        self.timers = TimerWheel(tick=TIMER_TICK_MS / 1000.0)
+        self.timers.advance(time.monotonic())
+        self.pending_countdown_message = None  # Shown once per tick, however many stages updated it
+        # Post-lock check, alert and escalation stages; the GUI only shows what it reports
+        self.escalation = EscalationController(
+            self.state, self.detector, self.notifier, self.timers,
+            settings=self._escalation_setting,
+            report=self._on_escalation_report,
+            countdown=lambda stage, message: self._display_countdown_message(message),
+            on_count=self._show_person_count,
+            on_auto_opened=self._on_door_auto_opened,
+            post_lock_tile_grid=self.post_lock_tile_grid,
+        )
 
         try:
             self.off_switch_img = self.load_image("ui/off_vertical_switch.png")
@@ -108,6 +134,7 @@ class NOCGui:
         self.uptime_label.grid(row=1, column=2, sticky="w", padx=(0,5),pady=(0,2))
 
         self.update_clock()
+        self.root.after(TIMER_TICK_MS, self._tick)
 
         self.video_label = ctk.CTkLabel(self.main_frame, text="", fg_color="#a0a0a0", corner_radius=8)
         self.video_label.grid(row=1, column=0, columnspan=2, padx=10, pady=10, sticky="nsew")
@@ -115,6 +142,16 @@ class NOCGui:
         self.initial_gray_image = self.create_gray_image(640, 480)
         self.video_label.configure(image=self.initial_gray_image)
 
+        # Preview frames are resized/converted on the detection thread and pasted into one
+        # persistent PhotoImage. The 12 Hz cap is the frame subscription's alone: a second clock
+        # in the pipeline would drop frames that were already annotated.
+        self.video_surface = VideoSurface(self.video_label)
+        self.display = DisplayPipeline(self.root, self._show_video_frame, max_rate=None)
+        # The detector pushes occupancy changes and preview frames; nothing runs per frame otherwise
+        self.detector.subscribe("occupancy", self._on_occupancy_event)
+        self.detector.subscribe("frame", self._on_frame_event, max_rate=12.0)
+        self.video_label.bind("<Configure>", self._on_video_label_resized, add="+")
+
         buttons_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
         buttons_frame.grid(row=1, column=2, padx=(0,10), pady=(5,0), sticky="n")
         
@@ -185,7 +222,16 @@ class NOCGui:
 
         self.person_count_label = ctk.CTkLabel(log_frame, text="", anchor="e", font=("Arial", 12, "bold"))
         self.person_count_label.grid(row=0, column=1, padx=10, pady=5, sticky="e")
+
+        # Skip all frame drawing while the window is minimized
+        self.root.bind("<Unmap>", self._on_window_visibility_changed, add="+")
+        self.root.bind("<Map>", self._on_window_visibility_changed, add="+")
     
+    def _on_window_visibility_changed(self, event):
+        # Map/Unmap also fire for child widgets; only the main window matters
+        if event.widget is self.root:
+            self.detector.display_enabled = event.type == tkinter.EventType.Map
+
     def _create_spinbox_row_simple(self, parent, label_text, unit_text, default_value="0"):
         # Create a labeled entry row for settings
         spin_frame = ctk.CTkFrame(parent, fg_color="transparent")
@@ -199,6 +245,27 @@ class NOCGui:
         entry.insert(0, default_value)
         return entry
 
+    @property
+    def detection_active(self):
+        return self.state.detection_active
+
+    def _on_state_transition(self, transition):
+        # The detection loop runs while the engine is on; inference follows the state's detector policy
+        if transition.entered("vehicle", "parked") and not (self.detection_thread and self.detection_thread.is_alive()):
+            self.stop_event.clear()
+            self.detection_thread = threading.Thread(
+                target=self.detector.process_video,
+                kwargs={"stop_event": self.stop_event},
+                daemon=True
+            )
+            self.detection_thread.start()
+        elif transition.entered("vehicle", "off"):
+            self.stop_event.set()
+        mode = self.state.detector_mode()
+        # Motion gating when someone could still open the door, every frame while locked and parked
+        self.detector.motion_gating = mode == "throttled"
+        self.detector.detection_active = mode != "off"
+
     def _set_status(self, text):
         # Update status entry text
         self.status_entry.delete(0, 'end')
@@ -207,11 +274,37 @@ class NOCGui:
     def _log_and_display(self, message, color="orange"):
         # Log event and update system log label
         self.notifier.log_event(message)
+        self.pending_countdown_message = None
         self.system_log_status_label.configure(text=f"| {message}", text_color=color)
 
     def _display_countdown_message(self, message):
-        # Show countdown message in system log label
-        self.system_log_status_label.configure(text=f"| {message}", text_color="orange")
+        # Show countdown message in system log label on the next tick
+        self.pending_countdown_message = message
+
+    def _tick(self):
+        # Tk thread: run the due timers, then draw the latest countdown message once
+        self.timers.advance(time.monotonic())
+        if self.pending_countdown_message is not None:
+            self.system_log_status_label.configure(text=f"| {self.pending_countdown_message}", text_color="orange")
+            self.pending_countdown_message = None
+        self.root.after(TIMER_TICK_MS, self._tick)
+
+    def _escalation_setting(self, name):
+        spinbox = {
+            "auto_open_attempts": self.auto_open_attempts_spinbox,
+            "sos_minutes": self.sos_spinbox,
+            "cqcn_minutes": self.cqcn_spinbox,
+        }[name]
+        try:
+            return float(spinbox.get())
+        except ctk.TclError as e:
+            raise ValueError(str(e))
+
+    def _on_escalation_report(self, message, level):
+        self._log_and_display(message, color={"success": "green", "error": "red"}.get(level, "orange"))
+
+    def _show_person_count(self, count):
+        self.person_count_label.configure(text=f"Số người còn trên xe: {count}")
 
     def _enable_detection_options(self):
         # Enable detection option checkboxes
@@ -225,6 +318,7 @@ class NOCGui:
 
     def start_engine(self):
         # Start engine and system, launch preparation thread
+        if not self.state.fire("engine_start"): return
         self._set_status("Đang khởi động hệ thống...")
         self.engine_button.configure(state="disabled") 
         self.notifier.setup_session_logger()
@@ -232,6 +326,13 @@ class NOCGui:
         prepare_thread = threading.Thread(target=self._prepare_and_finalize, daemon=True)
         prepare_thread.start()
 
+    def _preload_model(self):
+        # Failures are reported again by prepare_detector when the engine starts
+        try:
+            self.detector.load_model()
+        except Exception as e:
+            print(f"Model preload failed: {e}")
+
     def _prepare_and_finalize(self):
         # Prepare detector and finalize engine start
         success = self.detector.prepare_detector()
@@ -240,24 +341,20 @@ class NOCGui:
     def engine_prepared(self, success):
         # Callback after engine preparation
         if not success:
+            self.state.fire("engine_failed")
             self._set_status("Lỗi! Không thể khởi động hệ thống.")
             self._log_and_display("LỖI: Không thể khởi động camera hoặc model.", color="red")
             self.engine_button.configure(state="normal")
             return
         self.engine_running = True
         self.uptime_start = time.time()
-        self.stop_event.clear()
         self._set_status("Đã khởi động xe và hệ thống NOC")
         self._log_and_display("Hệ thống đã khởi động thành công.")
         self.enable_controls()
         self.update_display_options()
-        self.detection_thread = threading.Thread(
-            target=self.detector.process_video,
-            args=(self.update_detection_count,),
-            kwargs={"stop_event": self.stop_event},
-            daemon=True
-        )
-        self.detection_thread.start()
+        self.display.reset()
+        # Starts the detection loop (see _on_state_transition)
+        self.state.fire("engine_ready")
         threading.Thread(target=self._engine_start_sequence, daemon=True).start()
 
     def _engine_start_sequence(self):
@@ -271,34 +368,26 @@ class NOCGui:
         self._set_status("Đang tắt hệ thống...")
         self.engine_button.configure(state="disabled")
         self._log_and_display("Tắt máy. Kết thúc phiên làm việc.")
-        self.notifier.stop_all_sounds()
-        cleanup_thread = threading.Thread(target=self._join_threads_and_finalize_shutdown, args=(True,), daemon=True)
-        cleanup_thread.start()
+        self.state.fire("engine_stop")
+        self._shutdown(play_shutdown_sound=True)
 
-    def _join_threads_and_finalize_shutdown(self, play_shutdown_sound=True):
-        # Clean up threads and optionally play shutdown sound
+    def _shutdown(self, play_shutdown_sound=True):
+        # Cancel every pending stage and stop the detection loop; nothing is joined
         self.notifier.stop_all_sounds()
-        self.stop_alert_sound_event.set()
-        self.stop_auto_open_event.set()
-        self.stop_safety_instruction_event.set()
-        self.stop_cqcn_event.set()
+        self.escalation.cancel()
         self.stop_event.set()
-        if self.countdown_timer_id:
-            try: self.root.after_cancel(self.countdown_timer_id)
-            except ValueError: pass
-            self.countdown_timer_id = None
-        threads_to_join = [
-            self.alert_sound_thread, self.auto_open_thread, self.sos_thread,
-            self.safety_instruction_thread, self.cqcn_thread, self.detection_thread
-        ]
-        for t in threads_to_join:
-            if t and t.is_alive():
-                t.join()
         if play_shutdown_sound:
-            self.root.after(0, self._finalize_shutdown)
+            self._finalize_when_detection_stopped()
         else:
             self.root.after(500, self.root.destroy)
 
+    def _finalize_when_detection_stopped(self):
+        # The detection loop releases the camera on its own thread; check again next tick
+        if self.detection_thread and self.detection_thread.is_alive():
+            self.timers.call_later(TIMER_TICK_MS / 1000.0, self._finalize_when_detection_stopped)
+            return
+        self._finalize_shutdown()
+
     def _finalize_shutdown(self):
         # Finalize shutdown and reset UI
         self.notifier.stop_all_sounds() 
@@ -311,16 +400,11 @@ class NOCGui:
         self.uptime_start = None
         self._set_status("Hệ thống đã tắt")
         self.uptime_label.configure(text="00:00:00")
-        self.current_image = None
         width, height = self.video_label.winfo_width(), self.video_label.winfo_height()
         if width <= 1 or height <= 1: width, height = 640, 480
         gray_image = self.create_gray_image(width, height)
         self.video_label.configure(image=gray_image, text="", fg_color="#a0a0a0")
-        self.vehicle_stopped_completely = False
-        self.door_fully_open = False
-        self.door_fully_closed = True
-        self.detection_active = False
-        self.detector.detection_active = False
+        self.video_surface.reset()
         self.person_count_label.configure(text="")
         self.system_log_status_label.configure(text="")
         self.disable_controls()
@@ -328,7 +412,10 @@ class NOCGui:
         
     def start_moving(self):
         # Set state and UI for vehicle moving
-        self.state.start_vehicle()
+        if not self.state.fire("move"): return
+        # Driving off ends a running check (see the "move" rows in state_manager.py)
+        self.escalation.cancel()
+        self.notifier.stop_alert_sounds()
         self._set_status("Xe đang di chuyển")
         self._log_and_display("Xe đang di chuyển.")
         self.engine_button.configure(state="disabled")
@@ -338,31 +425,23 @@ class NOCGui:
         self.close_button.configure(state="disabled")
         self.vertical_switch_button.configure(state="disabled")
         self.door_lock_label.configure(text_color="gray")
-        self.vehicle_stopped_completely = False
-        self.door_fully_open = False
-        self.door_fully_closed = True
-        self.detection_active = False
-        self.detector.detection_active = False
-        self.alarm_was_turned_off = False 
         self.person_count_label.configure(text="")
         
     def stop_vehicle(self):
         # Set state and UI for vehicle stopping
-        self.state.stop_vehicle()
+        if not self.state.fire("stop"): return
         self._set_status("Xe đang dừng")
         self._log_and_display("Xe đang dừng lại.")
         self.engine_button.configure(state="normal")
         self.stop_button.configure(state="disabled")
         self.move_button.configure(state="normal")
-        self.detection_active = False
-        self.detector.detection_active = False
         self.person_count_label.configure(text="")
         self._disable_detection_options()
         self.root.after(2000, self.vehicle_stopped_completely_callback)
         
     def vehicle_stopped_completely_callback(self):
         # Callback after vehicle has fully stopped
-        self.vehicle_stopped_completely = True
+        if not self.state.fire("stopped"): return
         self._set_status("Xe đã dừng")
         self._log_and_display("Xe đã dừng hẳn.")
         self.stop_button.configure(state="disabled")
@@ -372,13 +451,14 @@ class NOCGui:
         
     def open_door(self):
         # Handle door opening logic
-        if not self.vehicle_stopped_completely:
-            self._set_status("Xe chưa dừng hẳn, không thể mở cửa")
+        if not self.state.fire("open_door"):
+            blocked = self.state.blocking_guards("open_door")
+            if "stopped" in blocked:
+                self._set_status("Xe chưa dừng hẳn, không thể mở cửa")
+            elif "unlocked" in blocked:
+                self._set_status("Cửa xe đang khoá, không thể mở cửa")
             return
-        if self.auto_open_thread and self.auto_open_thread.is_alive():
-            self._log_and_display("Hủy mở cửa tự động do người dùng can thiệp.")
-            self.stop_auto_open_event.set()
-        self.state.open_door()
+        self.escalation.cancel_auto_open()
         self._set_status("Cửa xe đang mở")
         self._log_and_display("Cửa xe đang mở...")
         self.open_button.configure(state="disabled")
@@ -390,8 +470,7 @@ class NOCGui:
         
     def door_opened_completely(self):
         # Callback after door fully opened
-        self.door_fully_open = True
-        self.door_fully_closed = False
+        if not self.state.fire("door_opened"): return
         self._set_status("Cửa xe đã mở")
         self._log_and_display("Cửa xe đã mở.")
         self.close_button.configure(state="normal")
@@ -400,7 +479,7 @@ class NOCGui:
 
     def close_door(self):
         # Handle door closing logic
-        self.state.close_door()
+        if not self.state.fire("close_door"): return
         self._set_status("Cửa xe đang đóng")
         self._log_and_display("Cửa xe đang đóng...")
         self.open_button.configure(state="disabled")
@@ -410,196 +489,53 @@ class NOCGui:
         
     def door_closed_completely(self):
         # Callback after door fully closed
-        self.door_fully_closed = True
-        self.door_fully_open = False
+        if not self.state.fire("door_closed"): return
         self._set_status("Đã đóng cửa")
         self._log_and_display("Cửa xe đã đóng.")
         self.open_button.configure(state="normal")
         self.vertical_switch_button.configure(state="normal")
         self.door_lock_label.configure(text_color="black")
         self.move_button.configure(state="normal")
-        if not self.alarm_was_turned_off and not self.detection_active:
+        # No new check once the driver has confirmed the car is empty ("cleared")
+        if self.state.alert == "inactive":
             self.root.after(1000, self.start_detection)
         
     def start_detection(self):
-        # Start person detection process
-        self.detection_active = True
-        self.detector.detection_active = True
+        # Start person detection process; the detector itself follows the state (see _on_state_transition)
+        if not self.escalation.start_check(): return
         self._set_status("Bắt đầu nhận diện...")
-        self._log_and_display("Bắt đầu chu trình nhận diện người trên xe.")
         self.open_button.configure(state="normal")
         self.turnoff_alarm_button.configure(state="disabled")
         self._enable_detection_options()
-        self._update_countdown(5)
 
-    def _update_countdown(self, remaining_time):
-        # Update countdown for alert or action
-        if not self.detection_active:
-            self.system_log_status_label.configure(text="")
-            return
-        if remaining_time > 0:
-            self._display_countdown_message(f"Phát âm thanh sau {remaining_time}s")
-            self.countdown_timer_id = self.root.after(1000, lambda: self._update_countdown(remaining_time - 1))
-        else:
-            self.countdown_timer_id = None
-            self._log_and_display(f"Phát hiện còn {self.last_detected_count} người trên xe.")
-            self.person_count_label.configure(text=f"Số người còn trên xe: {self.last_detected_count}")
-            self.initiate_alert_sound()
-
-    def initiate_alert_sound(self):
-        # Start alert sound thread if needed
-        if not self.detection_active: return
-        if self.last_detected_count >= 1:
-            if not self.auto_open_thread or not self.auto_open_thread.is_alive():
-                self._log_and_display("Kích hoạt cảnh báo âm thanh (có người trên xe).")
-                self.auto_open_thread = threading.Thread(target=self._auto_open_door_sequence, daemon=True)
-                self.auto_open_thread.start()
-        else:
-            self._log_and_display("Kích hoạt cảnh báo âm thanh (yêu cầu kiểm tra xe).")
-        if not self.alert_sound_thread or not self.alert_sound_thread.is_alive():
-            self.stop_alert_sound_event.clear()
-            self.alert_sound_thread = threading.Thread(target=self._alert_sound_loop, daemon=True)
-            self.alert_sound_thread.start()
-        
-    def _auto_open_door_sequence(self):
-        # Attempt to auto-open door with retries
-        self.stop_auto_open_event.clear()
-        try:
-            attempts = int(self.auto_open_attempts_spinbox.get())
-            for i in range(1, attempts + 1):
-                if self.stop_auto_open_event.is_set(): return
-                for countdown in range(10, 0, -1):
-                    if self.stop_auto_open_event.is_set(): return
-                    self.root.after(0, self._display_countdown_message, f"Mở cửa tự động lần {i} sau {countdown}s...")
-                    time.sleep(1)
-                if self.stop_auto_open_event.is_set(): return
-                is_door_locked = self.vertical_switch_state
-                if not is_door_locked:
-                    self.root.after(0, self._log_and_display, "Mở cửa tự động thành công.", "green")
-                    self.root.after(0, self._simulate_door_opened_successfully)
-                    return 
-                else:
-                    self.root.after(0, self._log_and_display, f"Mở cửa lần {i} thất bại (cửa bị khoá).", "red")
-                    time.sleep(2)
-            self._log_and_display("Tất cả các lần thử mở cửa đều thất bại.", "red")
-            self.sos_thread = threading.Thread(target=self._sos_and_instruction_sequence, daemon=True)
-            self.sos_thread.start()
-        except (ValueError, ctk.TclError):
-             self._log_and_display("Lỗi: giá trị số lần thử không hợp lệ.", "red")
-        finally:
-            print("Auto-open sequence finished.")
-
-    def _sos_and_instruction_sequence(self):
-        # Wait and send SOS, then start safety instructions
-        self.stop_safety_instruction_event.clear()
-        try:
-            wait_minutes = float(self.sos_spinbox.get())
-            wait_seconds = int(wait_minutes * 60)
-            for remaining in range(wait_seconds, 0, -1):
-                if self.stop_safety_instruction_event.is_set(): return
-                minutes, seconds = divmod(remaining, 60)
-                self.root.after(0, self._display_countdown_message, f"Gửi SOS sau {minutes:02d}:{seconds:02d}...")
-                time.sleep(1)
-            if self.stop_safety_instruction_event.is_set(): return
-            self.root.after(0, self._log_and_display, "Đang gửi tin nhắn SOS...")
-            success = self.notifier.send_sos_message()
-            if self.stop_safety_instruction_event.is_set(): return
-            self.root.after(0, self._log_and_display, "Đã gửi tin nhắn SOS.")
-            if success:
-                self.root.after(0, self._log_and_display, "Gửi SOS thành công.", "green")
-            else:
-                self.root.after(0, self._log_and_display, "Gửi SOS thất bại.", "red")
-            time.sleep(1)
-            self.stop_alert_sound_event.set()
-            if self.alert_sound_thread and self.alert_sound_thread.is_alive():
-                self.alert_sound_thread.join()
-            self.cqcn_thread = threading.Thread(target=self._cqcn_notification_sequence, daemon=True)
-            self.cqcn_thread.start()
-            self.safety_instruction_thread = threading.Thread(target=self._safety_instruction_loop, daemon=True)
-            self.safety_instruction_thread.start()
-        finally:
-            print("SOS sequence finished initiating other threads.")
-
-    def _safety_instruction_loop(self):
-        # Loop to play safety instructions repeatedly
-        while not self.stop_safety_instruction_event.is_set():
-            self.notifier.play_safety_instructions()
-            sound_length = self.notifier.get_sound_length("safety_instructions")
-            total_wait_time = sound_length + 2.0
-            for _ in range(int(total_wait_time * 10)):
-                if self.stop_safety_instruction_event.is_set():
-                    self.notifier.stop_alert_sounds()
-                    print("Safety instruction loop interrupted.")
-                    return
-                time.sleep(0.1)
-        print("Safety instruction loop stopped.")
-
-    def _cqcn_notification_sequence(self):
-        # Wait and notify authorities
-        self.stop_cqcn_event.clear()
-        try:
-            wait_minutes = float(self.cqcn_spinbox.get())
-            wait_seconds = int(wait_minutes * 60)
-            for remaining in range(wait_seconds, 0, -1):
-                if self.stop_cqcn_event.is_set(): return
-                minutes, seconds = divmod(remaining, 60)
-                self.root.after(0, self._display_countdown_message, f"Gửi tín hiệu đến CQCN sau {minutes:02d}:{seconds:02d}...")
-                time.sleep(1)
-            if self.stop_cqcn_event.is_set(): return
-            self.root.after(0, self._log_and_display, "Hệ thống đã gửi tín hiệu đến Cơ Quan Chức Năng.", "red")
-        except (ValueError, ctk.TclError):
-            self._log_and_display("Lỗi: giá trị phút CQCN không hợp lệ.", "red")
-        finally:
-            print("CQCN sequence finished.")
-
-    def _simulate_door_opened_successfully(self):
-        # Simulate successful auto door open
-        if not self.detection_active: return
-        self.state.open_door()
+    def _on_door_auto_opened(self):
+        # Called by the escalation after the door was opened automatically
         self._set_status("Cửa xe đã được mở tự động")
-        self.door_fully_open = True
-        self.door_fully_closed = False
         self.open_button.configure(state="disabled")
         self.close_button.configure(state="normal")
         self.turnoff_alarm_button.configure(state="normal")
         self.vertical_switch_button.configure(state="disabled")
         self.door_lock_label.configure(text_color="gray")
 
-    def _alert_sound_loop(self):
-        # Loop to play alert or speaker sound
-        while not self.stop_alert_sound_event.is_set():
-            if not self.notifier.is_alert_sound_playing():
-                if self.last_detected_count >= 1:
-                    self.notifier.play_alarm()
-                else:
-                    self.notifier.play_speaker()
-                time.sleep(2.0)
-            time.sleep(0.1)
-        print("Alert sound loop stopped.")
-        
-    def _update_person_count_label(self, count):
-        # Update label showing number of people detected
-        if self.detection_active and not self.countdown_timer_id:
-            self.person_count_label.configure(text=f"Số người còn trên xe: {count}")
+    def _on_occupancy_event(self, occupancy):
+        # Detection thread: hand the change to Tk
+        self.root.after(0, self.escalation.on_occupancy_changed, occupancy)
     
-    def update_detection_count(self, detected_count, annotated_frame):
-        # Callback to update detection count and video
-        if self.detection_active:
-            self.last_detected_count = detected_count
-            self.root.after(0, self._update_person_count_label, detected_count)
+    def _on_frame_event(self, annotated_frame):
+        # Detection thread, at most 12 times per second while the preview is visible
         if not self.stop_event.is_set() and annotated_frame is not None:
-            label_width, label_height = self.video_label.winfo_width(), self.video_label.winfo_height()
-            if label_width > 1 and label_height > 1:
-                annotated_frame = cv2.cvtColor(annotated_frame, cv2.COLOR_BGR2RGB)
-                resized_frame = cv2.resize(annotated_frame, (label_width, label_height))
-                img = Image.fromarray(resized_frame)
-                self.current_image = ctk.CTkImage(light_image=img, dark_image=img, size=(label_width, label_height))
-                self.root.after(0, self.update_video_label)
-
-    def update_video_label(self):
-        # Update video label with current image
-        if not self.stop_event.is_set() and self.current_image:
-            self.video_label.configure(image=self.current_image, text="")
+            # Dropped here if Tk is still busy with the previous frame or the preview rate is exceeded
+            self.display.submit(annotated_frame)
+
+    def _on_video_label_resized(self, event):
+        # Track the preview size on the Tk thread so the detection thread never queries widgets
+        self.display.set_size(self.video_label.winfo_width(), self.video_label.winfo_height())
+
+    def _show_video_frame(self, rgb_frame):
+        # Runs on the Tk thread with a frame already resized and converted to RGB
+        if self.stop_event.is_set():
+            return
+        self.video_surface.show(rgb_frame)
 
     def update_display_options(self):
         # Update detection display options (FPS, bbox, etc.)
@@ -611,22 +547,13 @@ class NOCGui:
 
     def turn_off_alarm(self):
         # Stop all alarms and reset detection state
-        self.stop_alert_sound_event.set()
-        self.stop_safety_instruction_event.set()
+        if not self.state.fire("turn_off_alarm"): return
+        self.escalation.cancel()
         self.notifier.stop_alert_sounds()
         self._log_and_display("Tài xế đã nhấn nút Tắt cảnh báo.")
         self.notifier.log_event("Kết thúc nhận diện. Tài xế đã xác nhận xe trống.")
         self._set_status("Cảnh báo đã tắt. Đã kiểm tra không còn người trên xe. Có thể tắt máy xe.")
         self._log_and_display("Cảnh báo đã được tắt.")
-        if self.countdown_timer_id:
-            try: self.root.after_cancel(self.countdown_timer_id)
-            except ValueError: pass
-            self.countdown_timer_id = None
-        self.stop_auto_open_event.set()
-        self.stop_cqcn_event.set()
-        self.detection_active = False
-        self.detector.detection_active = False
-        self.alarm_was_turned_off = True
         self.person_count_label.configure(text="")
         self.turnoff_alarm_button.configure(state="disabled")
         self._disable_detection_options()
@@ -667,6 +594,7 @@ class NOCGui:
     def toggle_vertical_switch(self):
         # Toggle door lock switch state
         if self.vertical_switch_button.cget("state") == "disabled": return
+        if not self.state.fire("unlock" if self.vertical_switch_state else "lock"): return
         self.vertical_switch_state = not self.vertical_switch_state
         if self.vertical_switch_state:
             if self.on_switch_img: self.vertical_switch_button.configure(image=self.on_switch_img)
@@ -674,7 +602,7 @@ class NOCGui:
             self.door_lock_label.configure(text="🔒")
         else:
             if self.off_switch_img: self.vertical_switch_button.configure(image=self.off_switch_img)
-            if self.vehicle_stopped_completely and self.door_fully_closed:
+            if self.state.vehicle == "stopped" and self.state.door == "closed":
                 self.open_button.configure(state="normal")
             self.door_lock_label.configure(text="🔓")
                 
@@ -718,7 +646,12 @@ if __name__ == "__main__":
         if app.engine_running:
             app._log_and_display("Ứng dụng bị đóng đột ngột. Tắt máy.")
         app.notifier.stop_all_sounds()
-        app._join_threads_and_finalize_shutdown(play_shutdown_sound=False)
+        app._shutdown(play_shutdown_sound=False)
+        if app.detection_thread:
+            app.detection_thread.join(2.0)
+        # Stops an inference worker and frees its shared memory
+        app.detector.close()
+        app.notifier.close()
         pygame.quit()
 
     root.protocol("WM_DELETE_WINDOW", on_closing)
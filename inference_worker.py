@@ -0,0 +1,199 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+import supervision as sv
+
+# Seconds to wait for the worker before treating it as hung
+RESPONSE_TIMEOUT = 5.0
+STARTUP_TIMEOUT = 120.0
+
+
+class SharedFrameRing:
+    """
+    Fixed number of frame slots in one shared memory block. Frames are copied into a slot
+    by the detector process and read in place by the worker, so they are never pickled.
+    """
+
+    def __init__(self, slots, frame_shape, name=None):
+        self.slots = slots
+        self.frame_shape = tuple(frame_shape)
+        size = slots * int(np.prod(self.frame_shape))
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.frames = np.ndarray((slots,) + self.frame_shape, dtype=np.uint8, buffer=self.shm.buf)
+        self._next = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def fits(self, frame):
+        return frame.shape[0] <= self.frame_shape[0] and frame.shape[1] <= self.frame_shape[1]
+
+    def put(self, frame):
+        """Copies a frame into the next slot and returns (slot, height, width)."""
+        slot = self._next
+        self._next = (self._next + 1) % self.slots
+        h, w = frame.shape[:2]
+        self.frames[slot, :h, :w] = frame
+        return slot, h, w
+
+    def view(self, slot, h, w):
+        return self.frames[slot, :h, :w]
+
+    def close(self):
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker_main(conn, backend, model_path, backend_options, ring_name, slots, frame_shape):
+    # Runs in the worker process: load the model once, then serve batches from the ring
+    from detection import create_backend
+
+    ring = SharedFrameRing(slots, frame_shape, name=ring_name)
+    model = create_backend(backend, model_path, **backend_options)
+    conn.send(("ready", dict(model.names)))
+    try:
+        while True:
+            message = conn.recv()
+            if message[0] == "stop":
+                break
+            if message[0] == "ring":
+                # Switch to a larger ring; the model stays loaded
+                _, ring_name, slots, frame_shape = message
+                ring.close()
+                ring = SharedFrameRing(slots, frame_shape, name=ring_name)
+                conn.send(("ring",))
+                continue
+            _, request_id, items = message
+            frames = [ring.view(slot, h, w) for slot, h, w in items]
+            results = model.predict_batch(frames)
+            conn.send(("ok", request_id, [
+                (d.xyxy, d.confidence, d.class_id) for d in results
+            ]))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        ring.close()
+
+
+class ProcessInferenceBackend:
+    """
+    Runs another backend in a separate process so inference does not compete with Tk,
+    audio and capture threads for the GIL. Frames go through a SharedFrameRing and only
+    the detection arrays come back over a pipe. If the worker dies or hangs it is
+    restarted and the affected batch returns no detections.
+    """
+
+    def __init__(self, backend, model_path, backend_options=None, slots=8, frame_shape=(480, 640, 3)):
+        self.backend = backend
+        self.model_path = model_path
+        self.backend_options = backend_options or {}
+        self.slots = slots
+        self.names = {}
+        self.restarts = 0
+        self._context = mp.get_context("spawn")
+        self._ring = None
+        self._process = None
+        self._conn = None
+        self._request_id = 0
+        # Start right away so the model loads now and class names are known before the first frame
+        self._start(frame_shape)
+
+    def _start(self, frame_shape):
+        self._stop_worker()
+        self._ring = SharedFrameRing(self.slots, frame_shape)
+        parent_conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.backend, self.model_path, self.backend_options,
+                  self._ring.name, self.slots, self._ring.frame_shape),
+            name="noc-inference",
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        if not self._conn.poll(STARTUP_TIMEOUT):
+            raise RuntimeError("Inference worker did not start in time")
+        _, self.names = self._conn.recv()
+        print(f"Inference worker started (pid {self._process.pid}).")
+
+    def _stop_worker(self):
+        if self._conn is not None:
+            try:
+                self._conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+            self._conn.close()
+            self._conn = None
+        if self._process is not None:
+            self._process.join(timeout=2.0)
+            if self._process.is_alive():
+                self._process.kill()
+            self._process = None
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+
+    def reserve(self, slots, frame_shape):
+        """
+        Grows the ring to at least slots frames of frame_shape (height, width). Only the shared
+        memory is replaced, the worker keeps its model. Call it before the first large batch.
+        """
+        slots = max(slots, self._ring.slots)
+        shape = (max(frame_shape[0], self._ring.frame_shape[0]), max(frame_shape[1], self._ring.frame_shape[1]), 3)
+        if slots == self._ring.slots and shape == self._ring.frame_shape:
+            return
+        ring = SharedFrameRing(slots, shape)
+        try:
+            self._conn.send(("ring", ring.name, slots, shape))
+            if not self._conn.poll(RESPONSE_TIMEOUT):
+                raise TimeoutError("inference worker did not answer")
+            self._conn.recv()
+        except (EOFError, BrokenPipeError, OSError, TimeoutError) as e:
+            ring.close()
+            print(f"Error: inference worker failed ({e}), restarting.")
+            self.restarts += 1
+            self.slots = slots
+            self._start(shape)
+            return
+        self._ring.close()
+        self._ring = ring
+        self.slots = slots
+        print(f"Inference ring resized to {slots} slots of {shape[1]}x{shape[0]}.")
+
+    def predict(self, frame):
+        return self.predict_batch([frame])[0]
+
+    def predict_batch(self, frames):
+        if len(frames) > self._ring.slots or not all(self._ring.fits(frame) for frame in frames):
+            # Not reserved up front: grow the ring to fit this batch
+            self.reserve(len(frames), (max(f.shape[0] for f in frames), max(f.shape[1] for f in frames)))
+
+        self._request_id += 1
+        items = [self._ring.put(frame) for frame in frames]
+        try:
+            self._conn.send(("predict", self._request_id, items))
+            if not self._conn.poll(RESPONSE_TIMEOUT):
+                raise TimeoutError("inference worker did not answer")
+            _, _, results = self._conn.recv()
+        except (EOFError, BrokenPipeError, OSError, TimeoutError) as e:
+            # Worker crashed or hung: restart it and report nothing for this batch
+            print(f"Error: inference worker failed ({e}), restarting.")
+            self.restarts += 1
+            shape = self._ring.frame_shape
+            self._start(shape)
+            return [sv.Detections.empty() for _ in frames]
+
+        return [
+            sv.Detections(xyxy=xyxy, confidence=confidence, class_id=class_id)
+            if len(xyxy) else sv.Detections.empty()
+            for xyxy, confidence, class_id in results
+        ]
+
+    def close(self):
+        self._stop_worker()
@@ -0,0 +1,213 @@
+import bisect
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stages of the detection loop, in pipeline order
+STAGES = ("capture", "predict", "nms", "track", "smooth", "annotate", "callback")
+
+
+class NullRecorder:
+    """Stage recorder that discards everything. Used when no metrics are collected."""
+
+    def record(self, stage, seconds):
+        pass
+
+    def increment(self, name, amount=1):
+        pass
+
+    def set_counter(self, name, value):
+        pass
+
+    def set_gauge(self, name, value):
+        pass
+
+
+class LatencyRecorder:
+    """Keeps every stage latency sample so exact percentiles can be reported after a run."""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    def record(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def increment(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_counter(self, name, value):
+        self.counters[name] = value
+
+    def set_gauge(self, name, value):
+        pass
+
+    def summary(self, percentiles=(50, 90, 95, 99)):
+        """Per-stage count, mean and latency percentiles in milliseconds."""
+        report = {}
+        for stage, values in self.samples.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            entry = {"count": len(ordered), "mean_ms": 1000.0 * sum(ordered) / len(ordered)}
+            for p in percentiles:
+                index = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+                entry[f"p{p}_ms"] = 1000.0 * ordered[index]
+            entry["max_ms"] = 1000.0 * ordered[-1]
+            report[stage] = entry
+        return report
+
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class RollingHistogram:
+    """
+    Latency histogram for one stage: cumulative bucket counts for scraping plus a
+    fixed-size ring of the most recent samples for rolling percentiles.
+    """
+
+    def __init__(self, window=512):
+        self.window = window
+        self._ring = [0.0] * window
+        self._index = 0
+        self._filled = 0
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self._ring[self._index] = seconds
+        self._index = (self._index + 1) % self.window
+        if self._filled < self.window:
+            self._filled += 1
+        self.bucket_counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def percentiles(self, percentiles=(50, 95, 99)):
+        """Percentiles in milliseconds over the rolling window."""
+        ordered = sorted(self._ring[:self._filled])
+        if not ordered:
+            return {f"p{p}_ms": 0.0 for p in percentiles}
+        return {
+            f"p{p}_ms": 1000.0 * ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+            for p in percentiles
+        }
+
+
+class LoopMetrics:
+    """
+    Always-on telemetry for the detection loop: a rolling histogram per stage plus
+    counters (frames, inferences, dropped frames) and gauges (queue depth, FPS).
+    Recording is a ring write and a bucket increment, cheap enough to leave on.
+    """
+
+    def __init__(self, window=512):
+        self.window = window
+        self.histograms = {stage: RollingHistogram(window) for stage in STAGES}
+        self.counters = {"frames": 0, "inferences": 0, "dropped_frames": 0}
+        self.gauges = {"queue_depth": 0, "fps": 0.0}
+        self.started = time.time()
+
+    def record(self, stage, seconds):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = RollingHistogram(self.window)
+        histogram.observe(seconds)
+
+    def increment(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_counter(self, name, value):
+        self.counters[name] = value
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def snapshot(self):
+        """Current metrics as a plain dict (rolling percentiles in milliseconds)."""
+        stages = {}
+        for stage, histogram in list(self.histograms.items()):
+            if histogram.count:
+                entry = {"count": histogram.count, "mean_ms": 1000.0 * histogram.sum / histogram.count}
+                entry.update(histogram.percentiles())
+                stages[stage] = entry
+        return {
+            "uptime_s": time.time() - self.started,
+            "stages": stages,
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+        }
+
+    def prometheus_text(self):
+        """Metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP noc_stage_seconds Latency of each detection loop stage.",
+            "# TYPE noc_stage_seconds histogram",
+        ]
+        for stage, histogram in list(self.histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, histogram.bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'noc_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'noc_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'noc_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'noc_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        for name, value in list(self.counters.items()):
+            lines.append(f"# TYPE noc_{name}_total counter")
+            lines.append(f"noc_{name}_total {value}")
+        for name, value in list(self.gauges.items()):
+            lines.append(f"# TYPE noc_{name} gauge")
+            lines.append(f"noc_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves LoopMetrics over HTTP: /metrics (Prometheus text) and /metrics.json."""
+
+    def __init__(self, metrics, host="127.0.0.1", port=9108):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.prometheus_text().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(metrics.snapshot()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes are frequent; keep them out of the console
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        print(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,156 @@
+"""
+Local stand-ins for the notification services, so every transport can be exercised
+without network access or real accounts (see test_api.py --mock).
+"""
+import json
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def serve_mock_http(port=0, rate_limited=1, server_errors=0, failing=()):
+    """
+    Stand-in for Slack chat.postMessage and for webhook receivers. Requests are counted per
+    key (the Slack channel, or the URL path for webhooks). Each key first gets
+    `rate_limited` 429 answers (Retry-After: 1), then `server_errors` 503 answers, then
+    success; keys in `failing` always get channel_not_found / HTTP 404.
+    The server has .slack_url, .webhook_url(name), .calls and .received.
+    """
+    calls = {}
+    received = []
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            slack = self.path.startswith("/api/")
+            key = body.get("channel") if slack else self.path
+            with lock:
+                n = calls[key] = calls.get(key, 0) + 1
+            if key in failing:
+                if slack:
+                    self._reply(200, {"ok": False, "error": "channel_not_found"})
+                else:
+                    self._reply(404, {})
+            elif n <= rate_limited:
+                self._reply(429, {"ok": False, "error": "ratelimited"}, {"Retry-After": "1"})
+            elif n <= rate_limited + server_errors:
+                self._reply(503, {"ok": False})
+            else:
+                with lock:
+                    received.append((key, body.get("text")))
+                self._reply(200, {"ok": True, "channel": key})
+
+        def _reply(self, status, data, headers=None):
+            payload = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    server.calls = calls
+    server.received = received
+    server.slack_url = f"{base}/api/chat.postMessage"
+    server.webhook_url = lambda name="hook": f"{base}/{name}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serve_mock_smtp(port=0):
+    """
+    Minimal SMTP server (no TLS, no auth) that accepts every message. Messages are
+    collected in server.messages as (recipients, data); .connections counts sessions.
+    """
+    messages = []
+    counters = {"connections": 0}
+
+    class Handler(socketserver.StreamRequestHandler):
+        def _reply(self, line):
+            self.wfile.write(line.encode("ascii") + b"\r\n")
+
+        def handle(self):
+            counters["connections"] += 1
+            recipients = []
+            self._reply("220 localhost mock SMTP")
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                command = line.decode("utf-8", "replace").strip()
+                verb = command[:4].upper()
+                if verb in ("HELO", "EHLO"):
+                    self._reply("250 localhost")
+                elif verb == "MAIL":
+                    recipients = []
+                    self._reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command.split(":", 1)[1].strip(" <>"))
+                    self._reply("250 OK")
+                elif verb == "DATA":
+                    self._reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = []
+                    while True:
+                        line = self.rfile.readline()
+                        if not line or line in (b".\r\n", b".\n"):
+                            break
+                        data.append(line.decode("utf-8", "replace"))
+                    messages.append((list(recipients), "".join(data)))
+                    self._reply("250 OK queued")
+                elif verb in ("RSET", "NOOP"):
+                    self._reply("250 OK")
+                elif verb == "QUIT":
+                    self._reply("221 Bye")
+                    return
+                else:
+                    self._reply("502 Command not implemented")
+
+    class Server(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    server = Server(("127.0.0.1", port), Handler)
+    server.messages = messages
+    server.counters = counters
+    server.port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FakeMqttClient:
+    """In-memory stand-in for a paho-mqtt client; every publish is acknowledged at once."""
+
+    published = []  # (topic, payload) of all fake clients, in publish order
+
+    class _Info:
+        def wait_for_publish(self, timeout=None):
+            pass
+
+        def is_published(self):
+            return True
+
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def connect(self, host, port=1883):
+        self.host, self.port = host, port
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def publish(self, topic, payload, qos=0):
+        FakeMqttClient.published.append((topic, payload))
+        return FakeMqttClient._Info()
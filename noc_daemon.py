@@ -0,0 +1,486 @@
+"""
+Headless NOC service: detection, the vehicle state machine and alerts without the GUI.
+
+Usage:
+    python noc_daemon.py                                   # vehicle signals on stdin
+    python noc_daemon.py --listen unix:/run/noc.sock       # or tcp:127.0.0.1:9200 (local only)
+    python noc_daemon.py --signals trip.txt --simulate     # timed signal script, a CAN-bus stand-in
+
+Signals are state machine events, one per line: engine_start, engine_stop, move, stop, stopped,
+open_door, door_opened, close_door, door_closed, lock, unlock, turn_off_alarm. "status" replies
+with the state, startup times, CPU and memory as JSON; "quit" stops the service. A signal script
+has one "<seconds> <signal>" line per signal, timed from the start of the service.
+The cameras, backend and alert recipients are configured from the same environment as gui.py.
+"""
+import argparse
+import ipaddress
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+
+PROCESS_STARTED = time.perf_counter()
+
+import pygame
+
+from capture import CaptureOptions
+from detection import PersonDetector, parse_sources, parse_tile_grid
+from escalation import EscalationController
+from metrics import MetricsServer
+from notifier import Notifier
+from seats import load_seat_layouts
+from state_manager import TRANSITIONS, StateManager
+from timer_wheel import TimerWheel
+
+# The service's main loop advances the timer wheel at this interval
+TIMER_TICK = 0.1
+
+# Escalation settings the GUI takes from its spinboxes
+AUTO_OPEN_ATTEMPTS = int(os.environ.get("NOC_AUTO_OPEN_ATTEMPTS", "3"))
+SOS_MINUTES = float(os.environ.get("NOC_SOS_MINUTES", "1"))
+CQCN_MINUTES = float(os.environ.get("NOC_CQCN_MINUTES", "2"))
+ESCALATION_SETTINGS = {
+    "auto_open_attempts": AUTO_OPEN_ATTEMPTS,
+    "sos_minutes": SOS_MINUTES,
+    "cqcn_minutes": CQCN_MINUTES,
+}
+
+# The escalation's messages (see escalation.MESSAGES) for the service log
+MESSAGES = {
+    "check_started": "Post-lock check started.",
+    "alert_countdown": "Alert sound in {remaining}s.",
+    "people_detected": "{count} people detected on board.",
+    "alert_occupied": "Alert sound started (person on board).",
+    "alert_check": "Alert sound started (asking the driver to check the car).",
+    "invalid_auto_open_attempts": "ERROR: invalid NOC_AUTO_OPEN_ATTEMPTS.",
+    "invalid_sos_minutes": "ERROR: invalid NOC_SOS_MINUTES.",
+    "invalid_cqcn_minutes": "ERROR: invalid NOC_CQCN_MINUTES.",
+    "auto_open_countdown": "Auto-open attempt {attempt} in {remaining}s.",
+    "auto_open_succeeded": "Door opened automatically.",
+    "auto_open_attempt_failed": "Auto-open attempt {attempt} failed (door locked).",
+    "auto_open_failed": "All auto-open attempts failed.",
+    "auto_open_cancelled": "Auto-open cancelled, the door was opened by hand.",
+    "sos_countdown": "Sending SOS in {minutes:02d}:{seconds:02d}.",
+    "sos_sending": "Sending SOS...",
+    "sos_sent": "SOS sent.",
+    "sos_recipient_failed": "SOS to {recipient} failed ({error}).",
+    "sos_delivered": "SOS delivered to {delivered}/{total} recipients.",
+    "sos_failed": "SOS could not be delivered.",
+    "cqcn_countdown": "Notifying the authorities in {minutes:02d}:{seconds:02d}.",
+    "authorities_notified": "Authorities notified.",
+}
+
+# Events the service fires itself; everything else in the state table is an external vehicle signal
+INTERNAL_EVENTS = {"engine_ready", "engine_failed", "start_check", "alert", "auto_open"}
+SIGNALS = sorted({event for event, *_ in TRANSITIONS} - INTERNAL_EVENTS)
+# A real vehicle reports these itself; with --simulate they follow after the GUI's delays
+SIMULATED_FOLLOW_UPS = {
+    "stop": ("stopped", 2.0),
+    "open_door": ("door_opened", 2.0),
+    "close_door": ("door_closed", 2.0),
+}
+
+
+def resource_usage():
+    """CPU seconds (user + system) and peak RSS in MiB of this process."""
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # ru_maxrss is in KiB on Linux
+        return usage.ru_utime + usage.ru_stime, usage.ru_maxrss / 1024.0
+    except ImportError:
+        import psutil
+        process = psutil.Process()
+        times, info = process.cpu_times(), process.memory_info()
+        return times.user + times.system, getattr(info, "peak_wset", info.rss) / (1024.0 * 1024.0)
+
+
+def parse_signal_script(text):
+    """Parses "<seconds> <signal>" lines (blank lines and # comments skipped) into (seconds, signal) pairs."""
+    script = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line:
+            at, name = line.split(None, 1)
+            script.append((float(at), name.strip()))
+    return script
+
+
+def parse_listen_address(address):
+    """
+    Parses "unix:/path" or "tcp:host:port" into ("unix", path) or ("tcp", (host, port)). Signals are
+    not authenticated, so TCP only binds to loopback addresses; anything else raises ValueError.
+    """
+    kind, _, target = address.partition(":")
+    if kind == "unix" and target:
+        return kind, target
+    if kind == "tcp":
+        host, _, port = target.rpartition(":")
+        # "localhost" is pinned to 127.0.0.1 rather than trusted to resolve to loopback
+        host = "127.0.0.1" if host in ("", "localhost") else host
+        try:
+            loopback = ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            loopback = False
+        if not loopback:
+            raise ValueError(f"Refusing to take unauthenticated signals on '{host}', "
+                             f"use a loopback address (tcp:127.0.0.1:port) or a unix socket")
+        return kind, (host, int(port))
+    raise ValueError(f"Unknown listen address '{address}', use unix:/path or tcp:127.0.0.1:port")
+
+
+class NOCDaemon:
+    """
+    Wires PersonDetector, StateManager, Notifier and the EscalationController together without
+    Tk. The detector never annotates or publishes frames (display_enabled=False, occupancy
+    events only), and the escalation stages run on a TimerWheel advanced by run(). Signals
+    from other threads go through submit().
+    """
+
+    def __init__(self, sources=None, replay=False, realtime=False, simulate=False):
+        self.notifier = Notifier()
+        sources = sources or parse_sources(os.environ.get("NOC_CAMERAS", "0"))
+        tile_grid = parse_tile_grid(os.environ.get("NOC_TILES", ""))
+        self.detector = PersonDetector(
+            model_path="models/yolo11n_320.onnx",
+            backend=os.environ.get("NOC_BACKEND", "ultralytics"),
+            sources=sources,
+            replay=replay,
+            realtime=realtime,
+            capture_options=CaptureOptions.from_env(),
+            inference_process=os.environ.get("NOC_INFERENCE_PROCESS") == "1",
+            model_variant=os.environ.get("NOC_MODEL_VARIANT", "fp32"),
+            person_only=os.environ.get("NOC_PERSON_ONLY") == "1",
+            seat_layouts=load_seat_layouts(os.environ["NOC_SEATS"], len(sources)) if os.environ.get("NOC_SEATS") else None,
+            max_tile_grid=tile_grid,
+        )
+        # Nobody looks at the video: no drawing, no preview conversion, no frame events
+        self.detector.display_enabled = False
+        self.detector.subscribe("occupancy", self._on_occupancy_event)
+        self.state = StateManager(log=self.notifier.log_event, metrics=self.detector.metrics)
+        self.state.subscribe(self._on_state_transition)
+        self.simulate = simulate
+
+        self.timers = TimerWheel(tick=TIMER_TICK)
+        self.timers.advance(time.monotonic())
+        self.escalation = EscalationController(
+            self.state, self.detector, self.notifier, self.timers,
+            settings=ESCALATION_SETTINGS.__getitem__,
+            report=self._on_report,
+            countdown=self._on_countdown,
+            on_count=self._on_count,
+            call_soon=self._call_soon,
+            messages=MESSAGES,
+            post_lock_tile_grid=tile_grid,
+        )
+        self.detection_thread = None
+        self.stop_event = threading.Event()
+        self.running = True
+        self.started_at = time.time()
+        self.model_loaded_s = None  # Process start to model loaded and warmed up
+        self.ready_s = None  # Process start to the first engine ready
+        self._last_count = None
+        self._countdown_stage = None
+        self._server = None
+        self._wake = threading.Event()  # Set when another thread queued work for the main loop
+
+        threading.Thread(target=self._preload_model, daemon=True).start()
+        self.metrics_server = None
+        if os.environ.get("NOC_METRICS_PORT"):
+            self.metrics_server = MetricsServer(self.detector.metrics, port=int(os.environ["NOC_METRICS_PORT"])).start()
+
+    def _call_soon(self, callback, *args):
+        # Runs callback on the main loop right away instead of at the next tick
+        self.timers.call_soon_threadsafe(callback, *args)
+        self._wake.set()
+
+    def log(self, message):
+        self.notifier.log_event(message)
+
+    def _preload_model(self):
+        # Failures are reported again by prepare_detector when the engine starts
+        try:
+            self.detector.load_model()
+            self.model_loaded_s = time.perf_counter() - PROCESS_STARTED
+        except Exception as e:
+            print(f"Model preload failed: {e}")
+
+    # --- Signals ---
+
+    def submit(self, line, timeout=5.0):
+        """Thread-safe: hands a signal line to the main loop and returns its reply."""
+        done = threading.Event()
+        reply = []
+
+        def run():
+            reply.append(self.handle(line))
+            done.set()
+
+        self._call_soon(run)
+        done.wait(timeout)
+        return reply[0] if reply else "busy"
+
+    def handle(self, line):
+        """Main loop thread: applies one signal. Returns "ok", "ignored" or an error or status reply."""
+        name = line.strip().lower()
+        if not name:
+            return ""
+        if name == "status":
+            return json.dumps(self.report())
+        if name == "quit":
+            self.running = False
+            return "ok"
+        if name not in SIGNALS:
+            return f"unknown signal '{name}', expected one of: {', '.join(SIGNALS + ['status', 'quit'])}"
+        handler = getattr(self, f"_on_{name}", None)
+        transition = handler() if handler else self.state.fire(name)
+        if not transition:
+            blocked = self.state.blocking_guards(name)
+            return f"ignored (needs: {', '.join(blocked)})" if blocked else "ignored"
+        if self.simulate and name in SIMULATED_FOLLOW_UPS:
+            follow_up, delay = SIMULATED_FOLLOW_UPS[name]
+            self.timers.call_later(delay, self.handle, follow_up)
+        return "ok"
+
+    def _on_engine_start(self):
+        transition = self.state.fire("engine_start")
+        if transition:
+            self.notifier.setup_session_logger()
+            self.log("System starting...")
+            threading.Thread(target=self._prepare, daemon=True).start()
+        return transition
+
+    def _prepare(self):
+        success = self.detector.prepare_detector()
+        self._call_soon(self._engine_prepared, success)
+
+    def _engine_prepared(self, success):
+        if not success:
+            self.state.fire("engine_failed")
+            self.log("ERROR: Could not open the cameras or load the model.")
+            return
+        # Starts the detection loop (see _on_state_transition)
+        self.state.fire("engine_ready")
+        if self.ready_s is None:
+            self.ready_s = time.perf_counter() - PROCESS_STARTED
+        self.log(f"System started, {self.ready_s:.2f}s after process start.")
+        threading.Thread(target=self._engine_start_sequence, daemon=True).start()
+
+    def _engine_start_sequence(self):
+        self.notifier.play_startup_sound()
+        if self.state.engine_on:
+            self.notifier.play_idle_sound()
+
+    def _on_engine_stop(self):
+        transition = self.state.fire("engine_stop")
+        if transition:
+            self.log("Engine off. Session ended.")
+            self._stop_detection()
+            self._finalize_when_detection_stopped()
+        return transition
+
+    def _stop_detection(self):
+        # Cancel every pending stage and stop the detection loop; nothing is joined
+        self.notifier.stop_all_sounds()
+        self.escalation.cancel()
+        self.stop_event.set()
+
+    def _finalize_when_detection_stopped(self):
+        if self.detection_thread and self.detection_thread.is_alive():
+            self.timers.call_later(TIMER_TICK, self._finalize_when_detection_stopped)
+            return
+        self.notifier.play_engine_off_sound()
+
+    def _on_move(self):
+        transition = self.state.fire("move")
+        if transition:
+            # Driving off ends a running check (see the "move" rows in state_manager.py)
+            self.escalation.cancel()
+            self.notifier.stop_alert_sounds()
+        return transition
+
+    def _on_open_door(self):
+        transition = self.state.fire("open_door")
+        if transition:
+            self.escalation.cancel_auto_open()
+        return transition
+
+    def _on_door_closed(self):
+        transition = self.state.fire("door_closed")
+        # No new check once the driver has confirmed the car is empty ("cleared")
+        if transition and self.state.alert == "inactive":
+            self.timers.call_later(1.0, self._start_check)
+        return transition
+
+    def _on_turn_off_alarm(self):
+        transition = self.state.fire("turn_off_alarm")
+        if transition:
+            self.escalation.cancel()
+            self.notifier.stop_alert_sounds()
+            self.log("Check finished. The driver confirmed the car is empty.")
+        return transition
+
+    # --- State and detection ---
+
+    def _on_state_transition(self, transition):
+        # Same policy as the GUI: the loop runs while the engine is on, inference follows the state
+        if transition.entered("vehicle", "parked") and not (self.detection_thread and self.detection_thread.is_alive()):
+            self.stop_event.clear()
+            self.detection_thread = threading.Thread(
+                target=self.detector.process_video,
+                kwargs={"stop_event": self.stop_event},
+                daemon=True
+            )
+            self.detection_thread.start()
+        elif transition.entered("vehicle", "off"):
+            self.stop_event.set()
+        mode = self.state.detector_mode()
+        self.detector.motion_gating = mode == "throttled"
+        self.detector.detection_active = mode != "off"
+
+    def _on_occupancy_event(self, occupancy):
+        # Detection thread: hand the change to the main loop
+        self._call_soon(self.escalation.on_occupancy_changed, occupancy)
+
+    def _start_check(self):
+        self._last_count = None
+        self.escalation.start_check()
+
+    def _on_count(self, count):
+        if count != self._last_count:
+            self._last_count = count
+            self.log(f"People on board: {count}")
+
+    def _on_report(self, message, level):
+        self._countdown_stage = None
+        self.log(message)
+
+    def _on_countdown(self, stage, message):
+        # Countdowns update every second; the log only gets the first message after each report
+        if stage != self._countdown_stage:
+            self._countdown_stage = stage
+            self.log(message)
+
+    # --- Service ---
+
+    def report(self):
+        """State, startup times, CPU and memory of the service as a plain dict."""
+        cpu_s, peak_rss_mb = resource_usage()
+        wall_s = time.time() - self.started_at
+        return {
+            "state": dict(self.state.states),
+            "occupancy": self.detector.occupancy.snapshot(),
+            "model_loaded_s": self.model_loaded_s,
+            "ready_s": self.ready_s,
+            "detector_startup": dict(self.detector.startup_times),
+            "uptime_s": wall_s,
+            "cpu_s": cpu_s,
+            "cpu_percent": 100.0 * cpu_s / wall_s if wall_s > 0 else 0.0,
+            "peak_rss_mb": peak_rss_mb,
+            "frames": self.detector.metrics.counters.get("frames", 0),
+        }
+
+    def load_signal_script(self, script):
+        """Schedules (seconds, signal) pairs on the wheel, relative to now."""
+        for at, name in script:
+            self.timers.call_later(at, self._scripted_signal, name)
+
+    def _scripted_signal(self, name):
+        print(f"{name}: {self.handle(name)}")
+
+    def read_stdin(self):
+        threading.Thread(target=self._read_lines, args=(sys.stdin, sys.stdout), name="signals-stdin", daemon=True).start()
+
+    def _read_lines(self, reader, writer):
+        for line in reader:
+            reply = self.submit(line)
+            if reply:
+                writer.write(reply + "\n")
+                writer.flush()
+        self.log("Signal input closed.")
+
+    def listen(self, address):
+        """Accepts signal lines on a local socket: "unix:/path" or "tcp:127.0.0.1:port"."""
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    reply = daemon.submit(line.decode("utf-8", "replace"))
+                    self.wfile.write((reply + "\n").encode("utf-8"))
+
+        kind, target = parse_listen_address(address)
+        if kind == "unix":
+            if os.path.exists(target):
+                os.remove(target)
+            self._server = socketserver.ThreadingUnixStreamServer(target, Handler)
+        else:
+            self._server = socketserver.ThreadingTCPServer(target, Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="signals-socket", daemon=True).start()
+        self.log(f"Listening for vehicle signals on {address}.")
+
+    def run(self, until=None):
+        """Advances the timer wheel until "quit", SIGTERM/Ctrl+C or until() is true, then closes."""
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, "running", False))
+        try:
+            while self.running and not (until and until()):
+                self._wake.clear()
+                self.timers.advance(time.monotonic())
+                self._wake.wait(TIMER_TICK)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        self._stop_detection()
+        if self.detection_thread:
+            # The detection loop releases the cameras on its own thread
+            self.detection_thread.join(2.0)
+        # Stops an inference worker and frees its shared memory
+        self.detector.close()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        self.notifier.close()
+        pygame.quit()
+        self.log(f"Service stopped: {json.dumps(self.report())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless NOC service")
+    parser.add_argument("--listen", default=None, help="Local signal socket: unix:/path or tcp:127.0.0.1:port (loopback only)")
+    parser.add_argument("--signals", default=None, help="Signal script with '<seconds> <signal>' lines")
+    parser.add_argument("--stdin", action="store_true", help="Also read signals from stdin (default without --listen/--signals)")
+    parser.add_argument("--simulate", action="store_true", help="Complete stop, open_door and close_door like the GUI's simulated car")
+    parser.add_argument("--replay", action="store_true", help="NOC_CAMERAS are recordings, read frame by frame at their frame rate")
+    parser.add_argument("--report", default=None, help="Write the final report (JSON) to this file")
+    args = parser.parse_args()
+    if args.listen:
+        try:
+            parse_listen_address(args.listen)
+        except ValueError as e:
+            parser.error(str(e))
+
+    daemon = NOCDaemon(replay=args.replay, realtime=args.replay, simulate=args.simulate)
+    if args.listen:
+        daemon.listen(args.listen)
+    if args.signals:
+        with open(args.signals, encoding="utf-8") as f:
+            daemon.load_signal_script(parse_signal_script(f.read()))
+    if args.stdin or not (args.listen or args.signals):
+        daemon.read_stdin()
+    daemon.run()
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(daemon.report(), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,46 @@ import logging
 import pygame
 import datetime
 import os
-import requests
 import threading
 import time
-
-# --- SLACK configuration ---
-SLACK_BOT_TOKEN = os.environ.get("SLACK_BOT_TOKEN", "")
-if not SLACK_BOT_TOKEN:
-    print("WARNING: SLACK_BOT_TOKEN is not set in .env. SOS feature will not work.")
-
-# List of SLACK user IDs to send messages to
-SLACK_USER_IDS_LIST = ["YOUR_USER_ID_HERE"]  # Replace with actual user IDs
+from audio_scheduler import ALARM, ENGINE, SOS, AudioScheduler
+from outbox import AlertOutbox
+from sound_assets import SoundAssets
+from sos_dispatcher import DeliveryResult, SosDispatcher
+from transports import build_transports, parse_recipients
+
+# --- Notification configuration ---
+# Recipients as "channel:recipient" lists, channels: slack (user/channel id), email (address),
+# webhook (URL) and mqtt (topic). Transports are configured from the environment, see transports.py.
+SOS_RECIPIENTS = parse_recipients(os.environ.get("NOC_SOS_RECIPIENTS", ""))
+AUTHORITY_RECIPIENTS = parse_recipients(os.environ.get("NOC_AUTHORITY_RECIPIENTS", ""))
+if not SOS_RECIPIENTS:
+    print("WARNING: NOC_SOS_RECIPIENTS is not set. SOS feature will not work.")
 MESSAGE_TEXT_TEMPLATE = "Emergency alert from NOC system! Someone is trapped inside. Please check immediately!"
-
-SPAM_COUNT = 5
-DELAY_SECONDS = 3
+AUTHORITY_MESSAGE_TEMPLATE = "NOC emergency: a person is trapped in a locked vehicle (incident {})."
+
+# Attempts per recipient and send round; retries back off exponentially and stop once delivery is confirmed
+SOS_MAX_ATTEMPTS = 3
+# How long send_sos_message waits for delivery before reporting the rest as queued
+SOS_REPORT_TIMEOUT = 30.0
+
+SOUND_FILES = {
+    "check_again": "sounds/check_again.mp3",
+    "alert": "sounds/alert.mp3",
+    "start_engine": "sounds/start_engine.wav",
+    "car_idle": "sounds/car_idle.wav",
+    "turnoff_engine": "sounds/turnoff_engine.wav",
+    "safety_instructions": "sounds/safety_instructions.mp3"
+}
+# Sounds are converted once to mixer-format PCM here; decoded clips are kept up to NOC_SOUND_CACHE_MB
+SOUND_CACHE_DIR = os.environ.get("NOC_SOUND_CACHE", ".sound_cache")
+SOUND_CACHE_MB = float(os.environ.get("NOC_SOUND_CACHE_MB", "8"))
+
+# Alert sounds start at most this often, like the original alarm thread (2 s sleep after each play)
+ALERT_REPEAT_INTERVAL = 2.0
+
+# Alerts are queued on disk first and sent from there, so nothing is lost while the car is offline
+OUTBOX_PATH = os.environ.get("NOC_OUTBOX", "noc_logs/outbox.sqlite3")
 
 class Notifier:
     def __init__(self):
@@ -38,119 +63,90 @@ class Notifier:
             print(f"ERROR: Could not initialize pygame mixer: {e}")
             pygame.mixer = None
 
-        # Load sounds in background thread
-        self.sounds = {}
-        self.sounds_loaded_event = threading.Event() 
-        self.safety_channel = pygame.mixer.Channel(1) if pygame.mixer else None
+        # Prepare the sound cache in background thread
+        self.sound_assets = SoundAssets(SOUND_FILES, SOUND_CACHE_DIR, max_bytes=int(SOUND_CACHE_MB * 1024 * 1024),
+                                        log=self.log_event)
+        # All playback goes through one priority scheduler with a fixed channel per priority
+        self.audio = AudioScheduler(self.sound_assets, log=self.log_event).start() if pygame.mixer else None
         self.loading_thread = threading.Thread(target=self._load_sounds_in_background, daemon=True)
         self.loading_thread.start()
 
+        # One fan-out engine for all channels; it keeps its connections between alerts
+        self.dispatcher = SosDispatcher(build_transports(), max_attempts=SOS_MAX_ATTEMPTS, log=self.log_event)
+        self.outbox = AlertOutbox(OUTBOX_PATH, self._send_outbox_batch, log=self.log_event).start()
+
     def _load_sounds_in_background(self):
-        """Load sounds in background to avoid blocking GUI."""
+        """Convert new sounds to the PCM cache in background to avoid blocking GUI."""
         print("Starting background sound loading...")
         if not pygame.mixer:
-            self.sounds_loaded_event.set()
+            self.sound_assets.ready.set()
             return
-
-        sound_files = {
-            "check_again": "sounds/check_again.mp3",
-            "alert": "sounds/alert.mp3",
-            "start_engine": "sounds/start_engine.wav",
-            "car_idle": "sounds/car_idle.wav",
-            "turnoff_engine": "sounds/turnoff_engine.wav",
-            "safety_instructions": "sounds/safety_instructions.mp3"
-        }
-        loaded_sounds = {}
-        for name, path in sound_files.items():
-            if os.path.exists(path):
-                try:
-                    loaded_sounds[name] = pygame.mixer.Sound(path)
-                except pygame.error as e:
-                    print(f"ERROR loading sound {path}: {e}")
-            else:
-                print(f"WARNING: Sound file not found: {path}")
-        
-        self.sounds = loaded_sounds
-        self.sounds_loaded_event.set()
+        self.sound_assets.prepare()
+        # The alert clips are kept in memory so an alert never waits for the disk
+        self.sound_assets.preload(["alert", "check_again"])
         print("All sounds loaded.")
 
-    def _play_sound(self, sound_name, loop=False):
-        self.sounds_loaded_event.wait()
+    def _play_sound(self, sound_name, priority):
         if not pygame.mixer: return
-        
-        if sound_name in self.sounds:
-            loops = -1 if loop else 0
-            try:
-                channel = pygame.mixer.find_channel()
-                if channel:
-                    channel.play(self.sounds[sound_name], loops=loops)
-            except pygame.error as e:
-                print(f"ERROR playing sound {sound_name}: {e}")
-        else:
-            print(f"ERROR: Sound '{sound_name}' not loaded.")
-            
-    def _play_music(self, sound_name, loop=False):
-        self.sounds_loaded_event.wait()
-        if not pygame.mixer: return
-        
-        if sound_name in self.sounds:
-            loops = -1 if loop else 0
-            try:
-                pygame.mixer.music.load(self.sounds[sound_name].get_sound_file_path())
-                pygame.mixer.music.play(loops=loops)
-            except Exception as e:
-                 print(f"ERROR playing music {sound_name}: {e}")
-        else:
-            print(f"ERROR: Sound '{sound_name}' not loaded.")
+        self.audio.play(sound_name, priority)
             
     def get_sound_length(self, sound_name):
-        self.sounds_loaded_event.wait()
-        if sound_name in self.sounds:
-            return self.sounds[sound_name].get_length()
-        return 0
+        return self.sound_assets.length(sound_name)
 
     def stop_all_sounds(self):
         if not pygame.mixer: return
-        pygame.mixer.music.stop()
-        pygame.mixer.stop()
+        self.audio.stop()
         print("All sounds stopped.")
 
     def stop_alert_sounds(self):
         if not pygame.mixer: return
-        pygame.mixer.stop()
+        self.audio.stop([SOS, ALARM])
         print("Alert sounds stopped.")
         
     def is_alert_sound_playing(self):
         if not pygame.mixer: return False
-        return pygame.mixer.get_busy()
+        return self.audio.busy(ALARM) or self.audio.busy(SOS)
 
     def play_speaker(self):
-        self._play_sound("check_again")
+        self._play_sound("check_again", ALARM)
 
     def play_alarm(self):
-        self._play_sound("alert")
+        self._play_sound("alert", ALARM)
+
+    def start_alert_sounds(self, choose):
+        """Repeats choose()'s alert sound ("alert" or "check_again") until stop_alert_sounds()."""
+        if not pygame.mixer: return
+        self.audio.start_loop("alert", ALARM, choose, min_interval=ALERT_REPEAT_INTERVAL)
+
+    def alert_sounds_active(self):
+        return bool(pygame.mixer) and self.audio.loop_active("alert")
         
     def play_startup_sound(self):
-        self._play_sound("start_engine")
+        self._play_sound("start_engine", ENGINE)
 
     def play_idle_sound(self):
-        if pygame.mixer and not pygame.mixer.music.get_busy():
-            self._play_music("car_idle", loop=True)
+        if not pygame.mixer: return
+        self.audio.play_music("car_idle")
 
     def play_engine_off_sound(self):
-        self._play_sound("turnoff_engine")
+        self._play_sound("turnoff_engine", ENGINE)
         
     def play_safety_instructions(self):
-        self.sounds_loaded_event.wait()
         self.log_event("Playing safety instructions.")
-        self.stop_alert_sounds()
-        if 'safety_instructions' in self.sounds and self.safety_channel:
-            self.safety_channel.play(self.sounds['safety_instructions'])
+        self._play_sound("safety_instructions", SOS)
+
+    def start_safety_instructions(self):
+        """Repeats the safety instructions with a 2 s pause until stop_alert_sounds(); pre-empts alarms."""
+        if not pygame.mixer: return
+        self.audio.start_loop("safety_instructions", SOS, self._next_safety_instructions, gap=2.0)
+
+    def _next_safety_instructions(self):
+        self.log_event("Playing safety instructions.")
+        return "safety_instructions"
 
     def is_safety_instruction_playing(self):
-        if self.safety_channel:
-            return self.safety_channel.get_busy()
-        return False
+        if not pygame.mixer: return False
+        return self.audio.busy(SOS)
 
     # --- Other methods unchanged ---
     
@@ -178,60 +174,66 @@ class Notifier:
         else:
             logging.info(message)
 
-    def _send_single_slack_message(self, user_id, message_body):
-        if not SLACK_BOT_TOKEN:
-            self.log_event("ERROR: SLACK_BOT_TOKEN is not configured.")
-            return False
-        url = "https://slack.com/api/chat.postMessage"
-        headers = { "Authorization": f"Bearer {SLACK_BOT_TOKEN}" }
-        payload = { "channel": user_id, "text": message_body }
-        try:
-            response = requests.post(url, headers=headers, json=payload, timeout=10)
-            response.raise_for_status() 
-            response_data = response.json()
-            if not response_data.get("ok"):
-                self.log_event(f"ERROR sending message to {user_id}: {response_data.get('error')}")
-                return False
-            return True
-        except requests.exceptions.RequestException as e:
-            self.log_event(f"Network error sending message to {user_id}: {e}")
+    def _send_outbox_batch(self, messages):
+        # Called by the outbox drainer thread with the next pending messages
+        return self.dispatcher.dispatch_messages([
+            (message.payload.get("channel", "slack"), message.recipient, message.payload["text"])
+            for message in messages
+        ])
+
+    def _enqueue_alert(self, kind, incident_id, recipients, text):
+        return [
+            self.outbox.enqueue(kind, recipient, {"channel": channel, "text": text},
+                                f"{kind}:{incident_id}:{channel}:{recipient}")
+            for channel, recipient in recipients
+        ]
+
+    def send_sos_message(self, incident_id=None):
+        """
+        Queues the SOS for every recipient and waits up to SOS_REPORT_TIMEOUT for delivery.
+        Returns one DeliveryResult per recipient; undelivered messages stay queued and are
+        sent when the network is back.
+        """
+        if not SOS_RECIPIENTS:
+            self.log_event("ERROR: SOS recipient list is empty.")
+            return []
+        incident_id = incident_id or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        queued_at = time.time()
+        keys = self._enqueue_alert("sos", incident_id, SOS_RECIPIENTS, MESSAGE_TEXT_TEMPLATE)
+        self.log_event(f"SOS for incident {incident_id} queued for {len(keys)} recipients.")
+        statuses = self.outbox.wait(keys, SOS_REPORT_TIMEOUT)
+        report = []
+        for (channel, recipient), key in zip(SOS_RECIPIENTS, keys):
+            result = DeliveryResult(recipient, channel)
+            result.delivered = statuses[key] == "delivered"
+            if statuses[key] == "failed":
+                result.error = "failed permanently"
+            elif statuses[key] == "pending":
+                result.error = "queued, will be sent when online"
+            report.append(result)
+        delivered_at = [self.outbox.delivered_at(key) for key in keys if statuses[key] == "delivered"]
+        if delivered_at:
+            self.log_event(f"SOS latency to first successful delivery: {min(delivered_at) - queued_at:.2f}s")
+        delivered = sum(result.delivered for result in report)
+        self.log_event(f"SOS delivery report: {delivered}/{len(report)} delivered: "
+                       f"{[result.as_dict() for result in report]}")
+        return report
+
+    def send_emergency(self, incident_id=None):
+        """Queues the notification to the authorities. Returns immediately."""
+        if not AUTHORITY_RECIPIENTS:
+            self.log_event("WARNING: NOC_AUTHORITY_RECIPIENTS is not set, authorities not notified.")
             return False
-
-    def _send_messages_for_user(self, user_id):
-        personal_message = MESSAGE_TEXT_TEMPLATE.format(user_id)
-        self.log_event(f"[Thread for {user_id}] Start repeated sending...")
-        for i in range(SPAM_COUNT):
-            self.log_event(f"[Thread for {user_id}] Attempt {i+1}/{SPAM_COUNT}: Sending...")
-            success = self._send_single_slack_message(user_id, personal_message)
-            if success:
-                self.log_event(f"[Thread for {user_id}] Attempt {i+1} succeeded.")
-            else:
-                self.log_event(f"[Thread for {user_id}] Attempt {i+1} failed.")
-            if i < SPAM_COUNT - 1:
-                time.sleep(DELAY_SECONDS)
-        self.log_event(f"[Thread for {user_id}] Finished repeated sending.")
-
-    def send_sos_message(self):
-        self.log_event("Starting SOS message threads...")
-        if not SLACK_USER_IDS_LIST or not SLACK_USER_IDS_LIST[0]:
-             self.log_event("ERROR: SOS recipient list is empty.")
-             return False
-        threads = []
-        for user_id in SLACK_USER_IDS_LIST:
-            thread = threading.Thread(target=self._send_messages_for_user, args=(user_id,), daemon=True)
-            threads.append(thread)
-            thread.start()
+        incident_id = incident_id or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        self._enqueue_alert("authority", incident_id, AUTHORITY_RECIPIENTS, AUTHORITY_MESSAGE_TEMPLATE.format(incident_id))
+        self.log_event("Queued SOS message to authorities.")
         return True
 
-    def send_emergency(self):
-        self.log_event("Sent SOS message to authorities.")
-
-class SoundWithGetPath(pygame.mixer.Sound):
-    def __init__(self, file):
-        self.file_path = file
-        super().__init__(file)
-    def get_sound_file_path(self):
-        return self.file_path
-
-if pygame.mixer:
-    pygame.mixer.Sound = SoundWithGetPath
\ No newline at end of file
+    def close(self):
+        # Persist anything still in memory; undelivered alerts are retried on the next start.
+        # The dispatcher is closed before joining the drainer so a send stuck in retries is cancelled.
+        self.outbox.stop()
+        self.dispatcher.close()
+        self.outbox.close()
+        if self.audio is not None:
+            self.audio.close()
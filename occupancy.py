@@ -0,0 +1,96 @@
+import numpy as np
+
+
+class OccupancyEstimator:
+    """
+    Temporal cabin occupancy from the tracked detections of many frames instead of one.
+    A fixed-size ring holds the person count and the best person confidence of the last
+    `window` samples, with running sums so every update is O(1) in the window length
+    (and linear only in the people currently tracked). Track lifetimes come from ByteTrack ids.
+
+    `occupied` is True when the confidence-weighted presence over the window reaches
+    `threshold` after at least `min_samples` samples, or when a person has been tracked
+    continuously for `min_track_samples`.
+    """
+
+    def __init__(self, window=60, threshold=0.35, min_track_samples=15, min_samples=10):
+        self.window = window
+        self.threshold = threshold
+        self.min_track_samples = min_track_samples
+        self.min_samples = min_samples  # Presence over fewer samples (e.g. one frame after reset) is not trusted
+        self._counts = np.zeros(window, dtype=np.int32)
+        self._presence = np.zeros(window, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        self._counts.fill(0)
+        self._presence.fill(0.0)
+        self._index = 0
+        self._filled = 0
+        self._count_sum = 0
+        self._presence_sum = 0.0
+        self._tracks = {}  # (camera, tracker id) -> [first sample, last sample]
+        self.samples = 0
+        self.longest_track = 0  # Samples the longest currently visible track has lived
+        self.score = 0.0
+        self.count = 0
+        self.occupied = False
+
+    def update(self, detections_per_camera):
+        """Adds one sample from the current tracked detections of every camera."""
+        count = 0
+        presence = 0.0
+        sample = self.samples
+        longest = 0
+        for camera, detections in enumerate(detections_per_camera):
+            people = detections[detections.class_id == 0]
+            count += len(people)
+            if len(people) == 0:
+                continue
+            if people.confidence is not None:
+                presence = max(presence, float(people.confidence.max()))
+            else:
+                presence = 1.0
+            if people.tracker_id is None:
+                continue
+            for tracker_id in people.tracker_id:
+                span = self._tracks.get((camera, tracker_id))
+                if span is None or span[1] < sample - 1:
+                    # New track, or one that was lost and came back: its lifetime restarts
+                    span = self._tracks[(camera, tracker_id)] = [sample, sample]
+                span[1] = sample
+                longest = max(longest, sample - span[0] + 1)
+
+        # Replace the oldest sample in the ring and keep the running sums in step
+        i = self._index
+        self._count_sum += count - int(self._counts[i])
+        self._presence_sum += presence - float(self._presence[i])
+        self._counts[i] = count
+        self._presence[i] = presence
+        self._index = (i + 1) % self.window
+        if self._filled < self.window:
+            self._filled += 1
+
+        self.samples += 1
+        if self.samples % self.window == 0:
+            # Forget tracks not seen for a whole window; also bounds float drift of the running sum
+            self._tracks = {key: span for key, span in self._tracks.items() if span[1] > sample - self.window}
+            self._presence_sum = float(self._presence[:self._filled].sum())
+
+        self.longest_track = longest
+        self.score = self._presence_sum / self._filled
+        self.occupied = ((self._filled >= self.min_samples and self.score >= self.threshold)
+                         or longest >= self.min_track_samples)
+        # Estimated head count: the mean count over the window, at least one when occupied
+        mean_count = self._count_sum / self._filled
+        self.count = max(1, int(round(mean_count))) if self.occupied else 0
+        return self.occupied
+
+    def snapshot(self):
+        return {
+            "occupied": self.occupied,
+            "count": self.count,
+            "score": self.score,
+            "longest_track": self.longest_track,
+            "samples": min(self.samples, self.window),
+        }
@@ -0,0 +1,234 @@
+import ast
+import hashlib
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+import supervision as sv
+
+
+def letterbox(frame, size, out=None):
+    """
+    Resizes a BGR frame to fit a size x size square, keeping the aspect ratio,
+    and pads the rest with gray (114) like Ultralytics does.
+    Returns the padded image, the scale ratio and the (left, top) padding.
+    """
+    h, w = frame.shape[:2]
+    ratio = min(size / h, size / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    left, top = (size - new_w) // 2, (size - new_h) // 2
+
+    if out is None:
+        out = np.empty((size, size, 3), dtype=np.uint8)
+    out.fill(114)
+    if (new_w, new_h) != (w, h):
+        out[top:top + new_h, left:left + new_w] = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    else:
+        out[top:top + new_h, left:left + new_w] = frame
+    return out, ratio, (left, top)
+
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy non-maximum suppression on xyxy boxes. Returns the indices to keep, best first."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+class OnnxRuntimeBackend:
+    """
+    Runs a YOLO ONNX export directly with onnxruntime, without the Ultralytics wrapper.
+    Preprocessing (letterbox), decoding and NMS are done with NumPy and the result is
+    returned as sv.Detections so the tracker/smoother/annotator chain is unchanged.
+    """
+
+    def __init__(self, model_path, conf=0.35, iou=0.7, max_det=300, classes=None,
+                 intra_op_threads=None, inter_op_threads=None, providers=None, optimized_cache=True):
+        started = time.perf_counter()
+        import onnxruntime as ort
+        self.import_seconds = time.perf_counter() - started
+
+        self.model_path = model_path
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        # Class ids to decode, e.g. (0,) for person only; the other score rows are never read
+        self.classes = np.asarray(sorted(classes), dtype=np.int64) if classes is not None else None
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+        if providers is None:
+            providers = ["CPUExecutionProvider"]
+        self.session = self._create_session(ort, options, providers, optimized_cache)
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.imgsz = model_input.shape[2] if isinstance(model_input.shape[2], int) else 320
+        # Fixed batch size of the export, or None when the batch axis is dynamic
+        self.batch_size = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        self.names = self._read_class_names()
+
+        # Buffers reused on every frame; the input buffer grows to the largest batch seen
+        self._canvas = np.empty((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        self._input = np.empty((1, 3, self.imgsz, self.imgsz), dtype=np.float32)
+
+    def _optimized_model_path(self, ort, providers):
+        # Optimized graphs can be hardware specific, so the key covers the model file, ORT version and machine
+        stat = os.stat(self.model_path)
+        key = f"{os.path.abspath(self.model_path)}|{stat.st_size}|{stat.st_mtime_ns}|{ort.__version__}|" \
+              f"{platform.machine()}|{','.join(providers)}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+        name = os.path.splitext(os.path.basename(self.model_path))[0]
+        return os.path.join(os.path.dirname(self.model_path) or ".", ".ort_cache", f"{name}.{digest}.onnx")
+
+    def _create_session(self, ort, options, providers, optimized_cache):
+        """
+        Creates the session, reusing the graph ORT optimized on an earlier start. The first
+        start saves the optimized graph; later starts load it with optimizations disabled.
+        """
+        self.session_cache_hit = False
+        if not optimized_cache:
+            return ort.InferenceSession(self.model_path, sess_options=options, providers=providers)
+
+        cached_path = self._optimized_model_path(ort, providers)
+        if os.path.exists(cached_path):
+            level = options.graph_optimization_level
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            try:
+                session = ort.InferenceSession(cached_path, sess_options=options, providers=providers)
+                self.session_cache_hit = True
+                return session
+            except Exception as e:
+                # Corrupt or incompatible cache entry: rebuild it
+                print(f"Warning: discarding optimized model cache {cached_path}: {e}")
+                os.remove(cached_path)
+                options.graph_optimization_level = level
+
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        options.optimized_model_filepath = cached_path
+        return ort.InferenceSession(self.model_path, sess_options=options, providers=providers)
+
+    def _read_class_names(self):
+        # Ultralytics exports store the class names as a dict literal in the model metadata
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        try:
+            return ast.literal_eval(metadata["names"])
+        except (KeyError, ValueError, SyntaxError):
+            num_classes = self.session.get_outputs()[0].shape[1] - 4
+            return {i: str(i) for i in range(num_classes if isinstance(num_classes, int) else 80)}
+
+    def preprocess(self, frame, slot=0):
+        canvas, ratio, pad = letterbox(frame, self.imgsz, out=self._canvas)
+        # HWC BGR uint8 -> NCHW RGB float32 in [0, 1], written into the reused input buffer
+        np.multiply(canvas[..., ::-1].transpose(2, 0, 1), 1.0 / 255.0, out=self._input[slot], casting="unsafe")
+        return ratio, pad
+
+    def decode(self, output, ratio, pad, frame_shape):
+        """Decodes one (4 + num_classes, num_anchors) YOLO output into sv.Detections."""
+        if self.classes is not None and len(self.classes) == 1:
+            # Single class: its score row is the confidence, no argmax over the other classes
+            confidence = output[4 + self.classes[0]]
+            class_id = None
+        else:
+            scores = output[4:] if self.classes is None else output[4 + self.classes]
+            class_id = scores.argmax(axis=0)
+            confidence = scores[class_id, np.arange(scores.shape[1])]
+        mask = confidence >= self.conf
+        if not mask.any():
+            return sv.Detections.empty()
+
+        cx, cy, w, h = output[:4, mask]
+        confidence = confidence[mask]
+        if class_id is None:
+            class_id = np.full(len(confidence), self.classes[0], dtype=np.int64)
+        else:
+            class_id = class_id[mask]
+            if self.classes is not None:
+                class_id = self.classes[class_id]
+        xyxy = np.stack((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2), axis=1)
+
+        # Class-aware NMS in one pass by shifting each class into its own coordinate range
+        offsets = class_id[:, None] * float(self.imgsz * 4)
+        keep = nms(xyxy + offsets, confidence, self.iou)[:self.max_det]
+        xyxy, confidence, class_id = xyxy[keep], confidence[keep], class_id[keep]
+
+        # Undo the letterbox and clip to the original frame
+        xyxy -= np.array([pad[0], pad[1], pad[0], pad[1]], dtype=xyxy.dtype)
+        xyxy /= ratio
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, frame_shape[1])
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, frame_shape[0])
+        return sv.Detections(
+            xyxy=xyxy.astype(np.float32),
+            confidence=confidence.astype(np.float32),
+            class_id=class_id.astype(int),
+        )
+
+    def predict(self, frame):
+        ratio, pad = self.preprocess(frame)
+        output = self.session.run(None, {self.input_name: self._input[:1]})[0]
+        return self.decode(output[0], ratio, pad, frame.shape)
+
+    def predict_batch(self, frames):
+        """Runs several frames in one session call. Falls back to one call per frame for fixed batch-1 exports."""
+        if len(frames) == 1 or self.batch_size == 1:
+            return [self.predict(frame) for frame in frames]
+        if self._input.shape[0] < len(frames):
+            self._input = np.empty((len(frames), 3, self.imgsz, self.imgsz), dtype=np.float32)
+        metas = [self.preprocess(frame, slot) for slot, frame in enumerate(frames)]
+        outputs = self.session.run(None, {self.input_name: self._input[:len(frames)]})[0]
+        return [
+            self.decode(outputs[i], ratio, pad, frame.shape)
+            for i, (frame, (ratio, pad)) in enumerate(zip(frames, metas))
+        ]
+
+
+def check_parity(model_path, recording, conf=0.35, iou_match=0.9):
+    """
+    Runs the ONNX Runtime backend and the Ultralytics path on the same recorded frames
+    and reports how many person detections agree. Returns the agreement ratio.
+    """
+    from capture import iter_recorded_frames
+    from detection import UltralyticsBackend
+
+    reference = UltralyticsBackend(model_path, conf=conf)
+    candidate = OnnxRuntimeBackend(model_path, conf=conf)
+    matched = total = 0
+    for frame in iter_recorded_frames(recording):
+        ref = reference.predict(frame)
+        ref = ref[ref.class_id == 0]
+        out = candidate.predict(frame)
+        out = out[out.class_id == 0]
+        total += max(len(ref), len(out))
+        if len(ref) and len(out):
+            iou = sv.box_iou_batch(ref.xyxy, out.xyxy)
+            matched += int((iou.max(axis=1) >= iou_match).sum())
+    agreement = matched / total if total else 1.0
+    print(f"Parity: {matched}/{total} person detections matched (IoU >= {iou_match}), agreement {agreement:.3f}")
+    return agreement
+
+
+if __name__ == "__main__":
+    # Usage: python onnx_backend.py <model.onnx> <video file or image directory>
+    if len(sys.argv) != 3:
+        print("Usage: python onnx_backend.py <model.onnx> <video file or image directory>")
+        sys.exit(2)
+    sys.exit(0 if check_parity(sys.argv[1], sys.argv[2]) >= 0.95 else 1)
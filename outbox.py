@@ -0,0 +1,242 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dedup_key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS messages_pending ON messages (status, next_attempt_at, id);
+"""
+
+
+class OutboxMessage:
+    def __init__(self, key, kind, recipient, payload, created_at=None):
+        self.key = key
+        self.kind = kind  # e.g. "sos" or "authority"
+        self.recipient = recipient
+        self.payload = payload  # JSON-serialisable dict, e.g. {"text": ...}
+        self.created_at = created_at or time.time()
+
+
+class AlertOutbox:
+    """
+    Durable queue for outbound alerts, stored in SQLite (WAL) so messages survive crashes
+    and offline periods. enqueue() only hands the message to a writer thread; a drainer
+    thread sends pending messages in batches through `sender` and retries with backoff
+    until they are delivered or fail permanently.
+
+    Messages with the same dedup_key are stored once. Per recipient, messages go out in
+    enqueue order: a newer message waits until the older ones are delivered or failed.
+
+    sender(messages) receives a list of OutboxMessage and returns one result per message
+    with .delivered, .retryable and .error attributes (e.g. sos_dispatcher.DeliveryResult).
+    """
+
+    def __init__(self, path, sender, batch_size=20, poll_interval=5.0, base_delay=5.0, max_delay=300.0,
+                 keep_delivered_days=7, log=print):
+        self.path = path
+        self.sender = sender
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.keep_delivered_days = keep_delivered_days
+        self.log = log
+        self._incoming = queue.Queue()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._status = {}  # dedup_key -> "pending" | "delivered" | "failed"
+        self._delivered_at = {}  # dedup_key -> wall clock time of delivery
+        self._status_changed = threading.Condition()
+        self._writer = None
+        self._drainer = None
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10.0)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # Vehicles lose power abruptly: make every commit durable
+        connection.execute("PRAGMA synchronous=FULL")
+        return connection
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        with connection:
+            connection.executescript(SCHEMA)
+            cutoff = time.time() - self.keep_delivered_days * 86400
+            connection.execute("DELETE FROM messages WHERE status != 'pending' AND created_at < ?", (cutoff,))
+            pending = connection.execute("SELECT COUNT(*) FROM messages WHERE status = 'pending'").fetchone()[0]
+        connection.close()
+        if pending:
+            self.log(f"Outbox: {pending} undelivered alerts from an earlier run will be retried.")
+        self._writer = threading.Thread(target=self._writer_loop, name="outbox-writer", daemon=True)
+        self._drainer = threading.Thread(target=self._drainer_loop, name="outbox-drainer", daemon=True)
+        self._writer.start()
+        self._drainer.start()
+        return self
+
+    def enqueue(self, kind, recipient, payload, dedup_key):
+        """Queues a message without touching the disk on the caller's thread. Returns the dedup key."""
+        with self._status_changed:
+            self._status.setdefault(dedup_key, "pending")
+        self._incoming.put(OutboxMessage(dedup_key, kind, recipient, payload))
+        return dedup_key
+
+    def wait(self, keys, timeout):
+        """Waits until every key is delivered or failed, or the timeout expires. Returns {key: status}."""
+        deadline = time.monotonic() + timeout
+        with self._status_changed:
+            while True:
+                statuses = {key: self._status.get(key, "pending") for key in keys}
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or all(status != "pending" for status in statuses.values()):
+                    return statuses
+                self._status_changed.wait(remaining)
+
+    def delivered_at(self, key):
+        return self._delivered_at.get(key)
+
+    def _set_status(self, key, status, delivered_at=None):
+        with self._status_changed:
+            self._status[key] = status
+            if delivered_at is not None:
+                self._delivered_at[key] = delivered_at
+            self._status_changed.notify_all()
+
+    def _writer_loop(self):
+        connection = self._connect()
+        while True:
+            message = self._incoming.get()
+            if message is None:
+                break
+            batch = [message]
+            # Commit everything already waiting in one transaction
+            while True:
+                try:
+                    message = self._incoming.get_nowait()
+                except queue.Empty:
+                    break
+                if message is None:
+                    self._incoming.put(None)
+                    break
+                batch.append(message)
+            with connection:
+                for m in batch:
+                    cursor = connection.execute(
+                        "INSERT OR IGNORE INTO messages (dedup_key, kind, recipient, payload, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (m.key, m.kind, m.recipient, json.dumps(m.payload), m.created_at),
+                    )
+                    if cursor.rowcount == 0:
+                        # Duplicate: report the state of the stored copy
+                        row = connection.execute("SELECT status FROM messages WHERE dedup_key = ?", (m.key,)).fetchone()
+                        self._set_status(m.key, row[0])
+            self._wakeup.set()
+        connection.close()
+
+    def _next_batch(self, connection):
+        # Oldest pending message per recipient only, so one recipient never gets messages out of order
+        rows = connection.execute(
+            "SELECT dedup_key, kind, recipient, payload, created_at, attempts, next_attempt_at FROM messages "
+            "WHERE status = 'pending' ORDER BY id"
+        ).fetchall()
+        now = time.time()
+        batch = []
+        seen = set()
+        for key, kind, recipient, payload, created_at, attempts, next_attempt_at in rows:
+            if recipient in seen:
+                continue
+            seen.add(recipient)
+            if next_attempt_at <= now:
+                message = OutboxMessage(key, kind, recipient, json.loads(payload), created_at)
+                message.attempts = attempts
+                batch.append(message)
+            if len(batch) >= self.batch_size:
+                break
+        return batch
+
+    def _drainer_loop(self):
+        connection = self._connect()
+        while not self._stop.is_set():
+            batch = self._next_batch(connection)
+            if not batch:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            try:
+                results = self.sender(batch)
+            except Exception as e:
+                if self._stop.is_set():
+                    # Sends cancelled by close(): the batch stays pending as it was, for the next start
+                    break
+                self.log(f"Outbox: sending failed: {e}")
+                results = [None] * len(batch)
+            now = time.time()
+            with connection:
+                for message, result in zip(batch, results):
+                    attempts = message.attempts + 1
+                    if result is not None and result.delivered:
+                        connection.execute(
+                            "UPDATE messages SET status = 'delivered', attempts = ?, delivered_at = ?, "
+                            "last_error = NULL WHERE dedup_key = ?", (attempts, now, message.key))
+                        self._set_status(message.key, "delivered", now)
+                    elif result is not None and not result.retryable:
+                        connection.execute(
+                            "UPDATE messages SET status = 'failed', attempts = ?, last_error = ? WHERE dedup_key = ?",
+                            (attempts, result.error, message.key))
+                        self._set_status(message.key, "failed")
+                        self.log(f"Outbox: {message.kind} to {message.recipient} failed permanently: {result.error}")
+                    else:
+                        # Offline or transient error: back off, the message stays first in line for its recipient
+                        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+                        error = result.error if result is not None else "sender error"
+                        connection.execute(
+                            "UPDATE messages SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE dedup_key = ?",
+                            (attempts, now + delay, error, message.key))
+            if all(result is None or not result.delivered for result in results):
+                # Nothing got through (probably offline): wait for the backoff or a new message
+                self._wakeup.wait(min(self.poll_interval, self.base_delay))
+                self._wakeup.clear()
+        connection.close()
+
+    def pending_count(self):
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT COUNT(*) FROM messages WHERE status = 'pending'").fetchone()[0]
+        finally:
+            connection.close()
+
+    def stop(self, timeout=2.0):
+        """
+        Waits for the writer to persist everything already enqueued, then tells the drainer to stop
+        without waiting for it. A send in flight keeps the drainer busy until the sender returns,
+        so cancel it (e.g. SosDispatcher.close) before close().
+        """
+        self._incoming.put(None)
+        if self._writer is not None:
+            self._writer.join(timeout)
+        self._stop.set()
+        self._wakeup.set()
+
+    def close(self, timeout=2.0):
+        """Stops the threads after the writer has persisted everything already enqueued."""
+        if not self._stop.is_set():
+            self.stop(timeout)
+        if self._drainer is not None:
+            self._drainer.join(timeout)
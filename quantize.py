@@ -0,0 +1,124 @@
+"""
+Builds a static INT8 variant of the YOLO ONNX model from calibration images.
+
+Usage:
+    python quantize.py path/to/calibration_frames [--model models/yolo11n_320.onnx] [--max-images 200]
+
+The result is written next to the model as <name>_int8.onnx, which PersonDetector
+loads with model_variant="int8" (NOC_MODEL_VARIANT=int8 in the GUI).
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from capture import iter_recorded_frames
+from detection import variant_model_path
+from onnx_backend import letterbox
+
+# Ultralytics YOLO11 puts its Detect head in module 23; keeping it in float protects box decoding accuracy
+DEFAULT_HEAD_PREFIX = "/model.23/"
+
+
+class FrameCalibrationReader:
+    """Feeds letterboxed calibration frames to the ONNX Runtime calibrator."""
+
+    def __init__(self, source, input_name, imgsz, max_images=200, stride=1):
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.max_images = max_images
+        self.stride = max(1, stride)
+        self._frames = self._frames_iter(source)
+
+    def _frames_iter(self, source):
+        used = 0
+        for index, frame in enumerate(iter_recorded_frames(source)):
+            if index % self.stride:
+                continue
+            if used >= self.max_images:
+                return
+            used += 1
+            canvas, _, _ = letterbox(frame, self.imgsz)
+            blob = canvas[..., ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+            yield {self.input_name: blob}
+
+    def get_next(self):
+        return next(self._frames, None)
+
+
+def quantize_model(model_path, calibration_source, output_path=None, max_images=200, stride=1,
+                   method="minmax", exclude_prefix=DEFAULT_HEAD_PREFIX):
+    """Quantizes weights and activations to INT8 (QDQ format) and returns the output path."""
+    import onnx
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    output_path = output_path or variant_model_path(model_path, "int8")
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    model_input = session.get_inputs()[0]
+    imgsz = model_input.shape[2] if isinstance(model_input.shape[2], int) else 320
+
+    nodes_to_exclude = []
+    if exclude_prefix:
+        graph = onnx.load(model_path).graph
+        nodes_to_exclude = [node.name for node in graph.node if node.name.startswith(exclude_prefix)]
+
+    methods = {
+        "minmax": CalibrationMethod.MinMax,
+        "entropy": CalibrationMethod.Entropy,
+        "percentile": CalibrationMethod.Percentile,
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        # ONNX shape inference and graph cleanup make more nodes quantizable (symbolic inference is only needed for dynamic-shape transformer graphs)
+        prepared_path = os.path.join(tmp, "prepared.onnx")
+        quant_pre_process(model_path, prepared_path, skip_symbolic_shape=True)
+        reader = FrameCalibrationReader(calibration_source, model_input.name, imgsz, max_images, stride)
+        quantize_static(
+            prepared_path,
+            output_path,
+            reader,
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            calibrate_method=methods[method],
+            nodes_to_exclude=nodes_to_exclude,
+        )
+
+    # Keep the class names so the INT8 model labels detections like the FP32 one
+    source_model = onnx.load(model_path)
+    quantized_model = onnx.load(output_path)
+    existing = {prop.key for prop in quantized_model.metadata_props}
+    for prop in source_model.metadata_props:
+        if prop.key not in existing:
+            quantized_model.metadata_props.append(prop)
+    onnx.save(quantized_model, output_path)
+
+    print(f"INT8 model written to {output_path} ({len(nodes_to_exclude)} head nodes kept in float)")
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Static INT8 quantization of the NOC detection model")
+    parser.add_argument("calibration", help="Video file or image directory with representative cabin frames")
+    parser.add_argument("--model", default="models/yolo11n_320.onnx")
+    parser.add_argument("--output", default=None, help="Defaults to <model>_int8.onnx")
+    parser.add_argument("--max-images", type=int, default=200)
+    parser.add_argument("--stride", type=int, default=1, help="Use every n-th frame of the calibration source")
+    parser.add_argument("--method", default="minmax", choices=["minmax", "entropy", "percentile"])
+    parser.add_argument("--exclude-prefix", default=DEFAULT_HEAD_PREFIX,
+                        help="Keep nodes with this name prefix in float ('' quantizes everything)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"Error: model not found: {args.model}")
+        sys.exit(1)
+    quantize_model(args.model, args.calibration, args.output, args.max_images, args.stride,
+                   args.method, args.exclude_prefix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import json
+
+import cv2
+import numpy as np
+import supervision as sv
+
+
+class SeatLayout:
+    """
+    Seat polygons of one camera, in frame pixels. Inference only runs on the crop around
+    the union of all seats (plus a margin), and tracked people are counted per seat with
+    sv.PolygonZone on the bottom center of their box.
+    """
+
+    def __init__(self, seats, margin=0.1):
+        self.names = list(seats)
+        self.polygons = [np.asarray(seats[name], dtype=np.int64).reshape(-1, 2) for name in self.names]
+        self.zones = [sv.PolygonZone(polygon) for polygon in self.polygons]
+        self.margin = margin  # Fraction of the union box added on each side so people at the edge keep their whole body
+        self.counts = {name: 0 for name in self.names}
+
+        points = np.vstack(self.polygons)
+        x1, y1 = points.min(axis=0)
+        x2, y2 = points.max(axis=0)
+        pad_x, pad_y = int((x2 - x1) * margin), int((y2 - y1) * margin)
+        self._union = (int(x1) - pad_x, int(y1) - pad_y, int(x2) + pad_x, int(y2) + pad_y)
+
+    def roi(self, frame_shape):
+        """Union box of the seats clipped to the frame, as (x1, y1, x2, y2)."""
+        h, w = frame_shape[:2]
+        x1, y1, x2, y2 = self._union
+        return max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+
+    def crop(self, frame):
+        """Returns a view of the seat region and its (x, y) offset in the frame."""
+        x1, y1, x2, y2 = self.roi(frame.shape)
+        if x2 <= x1 or y2 <= y1:
+            # Polygons lie outside this frame (wrong resolution): fall back to the full frame
+            return frame, (0, 0)
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def update(self, detections):
+        """Counts people per seat. A person is assigned to every seat their anchor falls in."""
+        people = detections[detections.class_id == 0]
+        self.counts = {name: int(zone.trigger(people).sum()) for name, zone in zip(self.names, self.zones)}
+        return self.counts
+
+    def reset(self):
+        self.counts = {name: 0 for name in self.names}
+
+    def draw(self, frame, color=(0, 200, 255)):
+        for name, polygon in zip(self.names, self.polygons):
+            cv2.polylines(frame, [polygon.astype(np.int32)], True, color, 2)
+            x, y = polygon.min(axis=0)
+            cv2.putText(frame, f"{name}: {self.counts[name]}", (int(x) + 4, int(y) + 18),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+        return frame
+
+
+def load_seat_layouts(path, camera_count):
+    """
+    Reads seat polygons from a JSON file and returns one SeatLayout (or None) per camera.
+    The file maps camera positions in NOC_CAMERAS order to seat polygons:
+
+        {"0": {"rear_left": [[40, 200], [300, 200], [300, 470], [40, 470]],
+               "rear_right": [[340, 200], [600, 200], [600, 470], [340, 470]]},
+         "margin": 0.1}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    margin = config.get("margin", 0.1)
+    layouts = []
+    for index in range(camera_count):
+        seats = config.get(str(index))
+        layouts.append(SeatLayout(seats, margin) if seats else None)
+    return layouts
@@ -0,0 +1,170 @@
+import asyncio
+import random
+import threading
+import time
+
+from transports import SLACK_API_URL, SlackTransport
+
+
+class DeliveryResult:
+    """Outcome of sending one message to one recipient."""
+
+    def __init__(self, recipient, channel="slack"):
+        self.recipient = recipient
+        self.channel = channel
+        self.delivered = False
+        self.attempts = 0
+        self.error = None
+        self.retryable = False  # Whether a later attempt could still succeed
+        self.latency_s = None  # Time from dispatch start to the confirmed delivery
+
+    def as_dict(self):
+        return {
+            "channel": self.channel,
+            "recipient": self.recipient,
+            "delivered": self.delivered,
+            "attempts": self.attempts,
+            "error": self.error,
+            "latency_s": self.latency_s,
+        }
+
+
+class SosDispatcher:
+    """
+    Fans messages out over the configured transports (see transports.py) concurrently.
+    All sends run on one background event loop that keeps a pooled aiohttp session, so
+    HTTP connections are reused across dispatches; SMTP and MQTT transports keep their own
+    connection. Each transport is rate limited. Failed sends are retried with exponential
+    backoff (Retry-After is honored) and a recipient gets no more messages once delivery
+    is confirmed.
+    """
+
+    def __init__(self, transports, max_attempts=5, base_delay=1.0, max_delay=30.0, timeout=10.0, log=print):
+        self.transports = transports  # Channel name -> Transport
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.log = log
+        self.last_first_delivery = None  # (seconds, channel) of the fastest delivery in the last dispatch
+        self._loop = None
+        self._session = None
+        self._loop_lock = threading.Lock()
+        self._pending = set()  # Futures of dispatches still in flight, cancelled by close()
+        self._closed = False
+
+    @classmethod
+    def for_slack(cls, token, api_url=SLACK_API_URL, **options):
+        return cls({"slack": SlackTransport(token, api_url)}, **options)
+
+    def _backoff(self, attempt):
+        # 1, 2, 4, ... seconds with jitter so recipients do not retry in lockstep
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _submit(self, coroutine):
+        # Runs a coroutine on the background loop, started on first use
+        with self._loop_lock:
+            if self._closed:
+                coroutine.close()
+                raise RuntimeError("SosDispatcher is closed")
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="notify-loop", daemon=True).start()
+            future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+            self._pending.add(future)
+            return future
+
+    async def _http_session(self):
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            self._session = aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=16))
+        return self._session
+
+    async def _attempt(self, transport, session, recipient, text):
+        import aiohttp
+
+        if transport.limiter is not None:
+            await transport.limiter.acquire()
+        try:
+            return await transport.send(session, recipient, text)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            return False, True, f"{type(e).__name__}: {e}", None
+
+    async def _deliver(self, session, channel, recipient, text, started):
+        result = DeliveryResult(recipient, channel)
+        transport = self.transports.get(channel)
+        if transport is None:
+            # Known channels may be configured on a later start, so keep those queued
+            result.error = f"{channel} transport is not configured"
+            result.retryable = channel in ("slack", "webhook", "email", "mqtt")
+            self.log(f"Alert to {channel}:{recipient} not sent: {result.error}")
+            return result
+        while result.attempts < self.max_attempts:
+            result.attempts += 1
+            delivered, retryable, error, retry_after = await self._attempt(transport, session, recipient, text)
+            if delivered:
+                result.delivered = True
+                result.error = None
+                result.latency_s = time.perf_counter() - started
+                self.log(f"Alert to {channel}:{recipient} delivered (attempt {result.attempts}).")
+                return result
+            result.error = error
+            result.retryable = retryable
+            if not retryable or result.attempts >= self.max_attempts:
+                break
+            delay = retry_after if retry_after else self._backoff(result.attempts)
+            self.log(f"Alert to {channel}:{recipient} failed ({error}), retrying in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+        self.log(f"Alert to {channel}:{recipient} NOT delivered after {result.attempts} attempts: {result.error}")
+        return result
+
+    async def dispatch_async(self, messages):
+        """Sends (channel, recipient, text) triples concurrently and returns one DeliveryResult per triple."""
+        started = time.perf_counter()
+        session = await self._http_session()
+        results = await asyncio.gather(*(
+            self._deliver(session, channel, recipient, text, started) for channel, recipient, text in messages
+        ))
+        delivered = [r for r in results if r.delivered]
+        if delivered:
+            first = min(delivered, key=lambda r: r.latency_s)
+            self.last_first_delivery = (first.latency_s, first.channel)
+            self.log(f"First successful delivery after {first.latency_s:.2f}s via {first.channel}.")
+        else:
+            self.last_first_delivery = None
+        return list(results)
+
+    def dispatch_messages(self, messages):
+        """
+        Blocking entry point for worker threads. Returns one DeliveryResult per (channel, recipient, text).
+        Raises concurrent.futures.CancelledError if close() is called while the messages are in flight.
+        """
+        future = self._submit(self.dispatch_async(messages))
+        try:
+            return future.result()
+        finally:
+            with self._loop_lock:
+                self._pending.discard(future)
+
+    def dispatch(self, recipients, text):
+        """Sends the same text to (channel, recipient) pairs. Returns one DeliveryResult per recipient."""
+        return self.dispatch_messages([(channel, recipient, text) for channel, recipient in recipients])
+
+    def close(self):
+        """Cancels dispatches still in flight (retries and backoff included) and stops the event loop."""
+        with self._loop_lock:
+            self._closed = True
+            loop, self._loop = self._loop, None
+            pending = list(self._pending)
+        if loop is None:
+            return
+        for future in pending:
+            future.cancel()
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), loop).result(timeout=5.0)
+        for transport in self.transports.values():
+            transport.close()
+        loop.call_soon_threadsafe(loop.stop)
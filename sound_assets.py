@@ -0,0 +1,221 @@
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pygame
+
+
+class _Stream:
+    """Plays PCM from the cache file chunk by chunk on one channel, so a long clip never sits decoded in RAM."""
+
+    def __init__(self, path, channel, chunk_bytes, chunk_seconds, loops=0):
+        self.path = path
+        self.channel = channel
+        self.chunk_bytes = chunk_bytes
+        self.chunk_seconds = chunk_seconds
+        self.loops = loops
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sound-stream", daemon=True)
+
+    def start(self):
+        with open(self.path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offset = 0
+        self._remaining_loops = self.loops
+        self.channel.play(self._next_chunk())
+        chunk = self._next_chunk()
+        if chunk is not None:
+            self.channel.queue(chunk)
+        self._thread.start()
+        return self
+
+    def _next_chunk(self):
+        if self._offset >= len(self._data):
+            if self._remaining_loops == 0:
+                return None
+            self._remaining_loops -= 1 if self._remaining_loops > 0 else 0
+            self._offset = 0
+        chunk = self._data[self._offset:self._offset + self.chunk_bytes]
+        self._offset += len(chunk)
+        return pygame.mixer.Sound(buffer=chunk)
+
+    def _run(self):
+        try:
+            # The channel holds one queued chunk; refill it at least twice per chunk so playback has no gaps
+            while not self._stop.wait(self.chunk_seconds / 2):
+                if not self.channel.get_busy():
+                    break  # Stopped from outside, e.g. pygame.mixer.stop()
+                if self.channel.get_queue() is None:
+                    chunk = self._next_chunk()
+                    if chunk is None:
+                        break
+                    self.channel.queue(chunk)
+            if not self._stop.is_set():
+                # Let the last chunk finish playing before reporting the stream as done
+                self._stop.wait(self.chunk_seconds)
+        finally:
+            self._data.close()
+
+    @property
+    def active(self):
+        return self._thread.is_alive()
+
+    def stop(self):
+        self._stop.set()
+        self.channel.stop()
+
+
+class SoundAssets:
+    """
+    Converts the sound files once into raw PCM in the mixer's format (cache_dir) and plays
+    them from there without decoding MP3/WAV again. Short clips are loaded from the
+    memory-mapped cache file on first use and kept in an LRU with a byte cap; clips longer
+    than stream_threshold seconds are streamed from the cache file in chunks.
+    The latency of the first play of each clip is logged and kept in first_play_latency.
+    """
+
+    def __init__(self, sound_files, cache_dir=".sound_cache", stream_threshold=10.0, max_bytes=8 * 1024 * 1024,
+                 chunk_seconds=1.0, log=print):
+        self.sound_files = sound_files  # Name -> original file
+        self.cache_dir = cache_dir
+        self.stream_threshold = stream_threshold
+        self.max_bytes = max_bytes
+        self.chunk_seconds = chunk_seconds
+        self.log = log
+        self.ready = threading.Event()
+        self.first_play_latency = {}  # Name -> (milliseconds, source)
+        self._pcm_paths = {}  # Name -> cache file
+        self._lengths = {}  # Name -> seconds
+        self._cached = OrderedDict()  # Name -> (Sound, bytes), least recently used first
+        self._cached_bytes = 0
+        self._streams = {}  # Name -> _Stream
+        self._lock = threading.RLock()
+        self._frame_bytes = None
+
+    def _mixer_format(self):
+        frequency, size, channels = pygame.mixer.get_init()
+        return frequency, abs(size) // 8, channels
+
+    def _cache_path(self, name, path, mixer_format):
+        stat = os.stat(path)
+        frequency, sample_bytes, channels = mixer_format
+        return os.path.join(self.cache_dir,
+                            f"{name}-{int(stat.st_mtime)}-{stat.st_size}-{frequency}x{sample_bytes}x{channels}.pcm")
+
+    def prepare(self):
+        """Converts new or changed sound files to the PCM cache. Decodes at most one file at a time."""
+        try:
+            if not pygame.mixer.get_init():
+                return
+            mixer_format = self._mixer_format()
+            frequency, sample_bytes, channels = mixer_format
+            self._frame_bytes = sample_bytes * channels
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for name, path in self.sound_files.items():
+                if not os.path.exists(path):
+                    print(f"WARNING: Sound file not found: {path}")
+                    continue
+                pcm_path = self._cache_path(name, path, mixer_format)
+                if not os.path.exists(pcm_path):
+                    started = time.perf_counter()
+                    try:
+                        raw = pygame.mixer.Sound(path).get_raw()
+                    except pygame.error as e:
+                        print(f"ERROR loading sound {path}: {e}")
+                        continue
+                    for old in os.listdir(self.cache_dir):
+                        if old.startswith(f"{name}-") and old.endswith(".pcm"):
+                            os.remove(os.path.join(self.cache_dir, old))
+                    with open(pcm_path + ".tmp", "wb") as f:
+                        f.write(raw)
+                    os.replace(pcm_path + ".tmp", pcm_path)
+                    self.log(f"Converted {path} to PCM cache in {(time.perf_counter() - started) * 1000:.0f} ms.")
+                    del raw
+                self._pcm_paths[name] = pcm_path
+                self._lengths[name] = os.path.getsize(pcm_path) / (self._frame_bytes * frequency)
+        finally:
+            self.ready.set()
+
+    def path(self, name):
+        """The original file, e.g. for pygame.mixer.music, or None."""
+        return self.sound_files.get(name)
+
+    def length(self, name):
+        self.ready.wait()
+        return self._lengths.get(name, 0)
+
+    def is_streamed(self, name):
+        return self.length(name) > self.stream_threshold
+
+    def _load(self, name):
+        """Returns the Sound for a short clip and whether it came from memory."""
+        with self._lock:
+            if name in self._cached:
+                self._cached.move_to_end(name)
+                return self._cached[name][0], True
+            with open(self._pcm_paths[name], "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    sound = pygame.mixer.Sound(buffer=data)
+                    size = len(data)
+            self._cached[name] = (sound, size)
+            self._cached_bytes += size
+            # Channels keep their own reference, so evicting a clip that is still playing is safe
+            while self._cached_bytes > self.max_bytes and len(self._cached) > 1:
+                _, (_, evicted_size) = self._cached.popitem(last=False)
+                self._cached_bytes -= evicted_size
+            return sound, False
+
+    def preload(self, names):
+        """Loads short clips ahead of time so their first play does not touch the disk."""
+        self.ready.wait()
+        for name in names:
+            if name in self._pcm_paths and not self.is_streamed(name):
+                self._load(name)
+
+    def play(self, name, channel=None, loops=0):
+        """Plays a clip on the given channel (or any free one). Returns the channel, or None."""
+        started = time.perf_counter()
+        self.ready.wait()
+        if name not in self._pcm_paths:
+            print(f"ERROR: Sound '{name}' not loaded.")
+            return None
+        channel = channel or pygame.mixer.find_channel()
+        if channel is None:
+            return None
+        try:
+            if self.is_streamed(name):
+                self.stop_stream(name)
+                frames = int(pygame.mixer.get_init()[0] * self.chunk_seconds)
+                stream = _Stream(self._pcm_paths[name], channel, frames * self._frame_bytes, self.chunk_seconds, loops)
+                self._streams[name] = stream.start()
+                source = "stream"
+            else:
+                sound, in_memory = self._load(name)
+                channel.play(sound, loops=loops)
+                source = "memory" if in_memory else "pcm cache"
+        except pygame.error as e:
+            print(f"ERROR playing sound {name}: {e}")
+            return None
+        if name not in self.first_play_latency:
+            latency_ms = (time.perf_counter() - started) * 1000
+            self.first_play_latency[name] = (latency_ms, source)
+            self.log(f"First play of '{name}' after {latency_ms:.1f} ms ({source}).")
+        return channel
+
+    def is_streaming(self, name):
+        stream = self._streams.get(name)
+        return stream is not None and stream.active
+
+    def stop_stream(self, name):
+        stream = self._streams.pop(name, None)
+        if stream is not None:
+            stream.stop()
+
+    def stop_streams(self):
+        for name in list(self._streams):
+            self.stop_stream(name)
+
+    def cached_bytes(self):
+        return self._cached_bytes
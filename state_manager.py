@@ -1,27 +1,228 @@
+import datetime
+import threading
+import time
+from collections import deque
+
+from metrics import NullRecorder
+
+# Independent parts of the vehicle state and their initial state
+REGIONS = {
+    "vehicle": "off",     # off, starting, parked, moving, stopping, stopped
+    "door": "closed",     # closed, opening, open, closing
+    "lock": "unlocked",   # unlocked, locked
+    "alert": "inactive",  # inactive, checking, alerting, cleared
+}
+
+# (event, region, source states, target state, guards). One event may move several regions;
+# it is rejected when no row for it matches. Guards are checked against the state before the event.
+TRANSITIONS = [
+    ("engine_start", "vehicle", ("off",), "starting", None),
+    ("engine_ready", "vehicle", ("starting",), "parked", None),
+    ("engine_failed", "vehicle", ("starting",), "off", None),
+    ("engine_stop", "vehicle", ("parked", "stopping", "stopped"), "off", None),
+    ("engine_stop", "door", ("opening", "open", "closing"), "closed", None),
+    ("engine_stop", "alert", ("checking", "alerting", "cleared"), "inactive", None),
+    ("move", "vehicle", ("parked", "stopped"), "moving", "door_closed"),
+    # Driving off ends a post-lock check, whatever stage it reached
+    ("move", "alert", ("checking", "alerting", "cleared"), "inactive", "door_closed"),
+    ("stop", "vehicle", ("moving",), "stopping", None),
+    ("stopped", "vehicle", ("stopping",), "stopped", None),
+    ("open_door", "door", ("closed",), "opening", ("stopped", "unlocked")),
+    ("door_opened", "door", ("opening",), "open", None),
+    ("auto_open", "door", ("closed",), "open", ("stopped", "unlocked")),
+    ("close_door", "door", ("opening", "open"), "closing", None),
+    ("door_closed", "door", ("closing",), "closed", None),
+    ("lock", "lock", ("unlocked",), "locked", None),
+    ("unlock", "lock", ("locked",), "unlocked", None),
+    ("start_check", "alert", ("inactive",), "checking", ("stopped", "door_closed")),
+    ("alert", "alert", ("checking",), "alerting", None),
+    ("turn_off_alarm", "alert", ("checking", "alerting"), "cleared", "door_is_open"),
+]
+
+GUARDS = {
+    "door_closed": lambda s: s["door"] == "closed",
+    "door_is_open": lambda s: s["door"] == "open",
+    "stopped": lambda s: s["vehicle"] == "stopped",
+    "unlocked": lambda s: s["lock"] == "unlocked",
+}
+
+
+def _build_table(transitions):
+    # (event, region, state) -> [(guards, target)], looked up once per region on every event
+    table = {}
+    for event, region, sources, target, guards in transitions:
+        if isinstance(guards, str):
+            guards = (guards,)
+        for source in sources:
+            table.setdefault((event, region, source), []).append((tuple(guards or ()), target))
+    return table
+
+
+TRANSITION_TABLE = _build_table(TRANSITIONS)
+
+
+class Transition:
+    def __init__(self, event, changes, at):
+        self.event = event
+        self.changes = changes  # [(region, source, target)]
+        self.at = at  # Wall clock time of the event
+        self.latency_s = None  # From fire() until every hook has returned
+
+    def entered(self, region, state):
+        return any(r == region and target == state for r, _, target in self.changes)
+
+    def __str__(self):
+        changes = ", ".join(f"{region} {source} -> {target}" for region, source, target in self.changes)
+        return f"{event_time(self.at)} {self.event}: {changes}"
+
+
+def event_time(at):
+    return datetime.datetime.fromtimestamp(at).strftime("%H:%M:%S.%f")[:-3]
+
+
 class StateManager:
-    def __init__(self):
-        # Vehicle movement state
-        self.vehicle_moving = False
-        self.vehicle_stopped = False
-        # Door state
-        self.door_open = False
-        # Engine state
-        self.engine_on = False
+    """
+    Table-driven state machine for the vehicle (engine and movement), door, lock and alert.
+    fire(event) looks the event up in TRANSITION_TABLE for the current state of every region,
+    checks the guards against the state before the event and applies all matching rows at
+    once. Subscribed hooks run after every accepted transition. Transitions are logged with
+    a timestamp and their latency (fire() to the last hook) goes to metrics as
+    "state_transition".
+    """
+
+    def __init__(self, log=print, metrics=None, history=200):
+        self.log = log
+        self.metrics = metrics or NullRecorder()
+        self.states = dict(REGIONS)
+        self.history = deque(maxlen=history)  # Recent Transitions
+        self._hooks = []  # (callback, events or None)
+        self._lock = threading.RLock()
+
+    def subscribe(self, callback, events=None):
+        """Calls callback(transition) after every accepted transition, or only for the given events."""
+        hook = (callback, frozenset(events) if events else None)
+        self._hooks.append(hook)
+        return hook
+
+    def unsubscribe(self, hook):
+        if hook in self._hooks:
+            self._hooks.remove(hook)
+
+    def can_fire(self, event):
+        with self._lock:
+            return bool(self._match(event))
+
+    def blocking_guards(self, event):
+        """
+        The guards that keep the event from firing in the current state, e.g. ["unlocked"] for
+        open_door while the car is locked. Empty when it can fire or no row starts here at all.
+        """
+        with self._lock:
+            if self._match(event):
+                return []
+            failed = []
+            for region, state in self.states.items():
+                for guards, _ in TRANSITION_TABLE.get((event, region, state), ()):
+                    failed += [guard for guard in guards if not GUARDS[guard](self.states) and guard not in failed]
+            return failed
+
+    def _match(self, event):
+        changes = []
+        for region, state in self.states.items():
+            for guards, target in TRANSITION_TABLE.get((event, region, state), ()):
+                if all(GUARDS[guard](self.states) for guard in guards):
+                    changes.append((region, state, target))
+                    break
+        return changes
+
+    def fire(self, event):
+        """Applies the event. Returns the Transition, or None if the current state does not accept it."""
+        started = time.perf_counter()
+        with self._lock:
+            changes = self._match(event)
+            if not changes:
+                self.log(f"State: '{event}' ignored in {self.describe()}.")
+                return None
+            for region, _, target in changes:
+                self.states[region] = target
+            transition = Transition(event, changes, time.time())
+            for callback, events in list(self._hooks):
+                if events is None or event in events:
+                    try:
+                        callback(transition)
+                    except Exception as e:
+                        print(f"ERROR in state hook {getattr(callback, '__name__', callback)}: {e}")
+            transition.latency_s = time.perf_counter() - started
+            self.history.append(transition)
+        self.metrics.record("state_transition", transition.latency_s)
+        self.log(f"State: {transition} ({transition.latency_s * 1000:.2f} ms)")
+        return transition
+
+    def describe(self):
+        return ", ".join(f"{region} {state}" for region, state in self.states.items())
+
+    # --- Region states ---
+
+    @property
+    def vehicle(self):
+        return self.states["vehicle"]
+
+    @property
+    def door(self):
+        return self.states["door"]
+
+    @property
+    def alert(self):
+        return self.states["alert"]
+
+    @property
+    def locked(self):
+        return self.states["lock"] == "locked"
+
+    @property
+    def detection_active(self):
+        return self.alert in ("checking", "alerting")
+
+    def detector_mode(self):
+        """
+        How the detector should run: "off" outside a post-lock check, "full" (every frame)
+        while the car is locked with the door closed, "throttled" (motion-gated) otherwise.
+        """
+        if not self.detection_active:
+            return "off"
+        if self.locked and self.door == "closed":
+            return "full"
+        return "throttled"
+
+    # --- The original flags and setters, kept for existing callers ---
+
+    @property
+    def vehicle_moving(self):
+        return self.vehicle == "moving"
+
+    @property
+    def vehicle_stopped(self):
+        return self.vehicle in ("stopping", "stopped")
+
+    @property
+    def door_open(self):
+        return self.door in ("opening", "open")
+
+    @property
+    def engine_on(self):
+        return self.vehicle not in ("off", "starting")
 
     def start_vehicle(self):
-        self.vehicle_moving = True
-        self.vehicle_stopped = False
-        self.engine_on = True
+        return self.fire("move")
 
     def stop_vehicle(self):
-        self.vehicle_moving = False
-        self.vehicle_stopped = True
+        return self.fire("stop")
 
     def open_door(self):
-        self.door_open = True
+        return self.fire("open_door")
 
     def close_door(self):
-        self.door_open = False
+        return self.fire("close_door")
 
     def turn_off_engine(self):
-        self.engine_on = False
+        return self.fire("engine_stop")
@@ -1,69 +1,80 @@
-import requests
+"""
+Sends a test alert through the same transports and fan-out engine as the Notifier.
+
+Usage:
+    python test_api.py                                   # recipients from NOC_SOS_RECIPIENTS
+    python test_api.py --recipients "slack:U123,email:owner@example.com"
+    python test_api.py --mock                            # every transport against local stand-ins
+"""
+import argparse
+import json
 import os
+import sys
 import time
-import threading
 
-# --- SLACK configuration ---
-SLACK_BOT_TOKEN = os.environ.get("SLACK_BOT_TOKEN", "") 
-if SLACK_BOT_TOKEN == "":
-    raise ValueError("Please replace SLACK_BOT_TOKEN with your real value from Slack App.")
+from sos_dispatcher import SosDispatcher
+from transports import MqttTransport, SlackTransport, SmtpTransport, WebhookTransport, build_transports, \
+    parse_recipients
 
-SLACK_USER_IDS_LIST = ["YOUR_USER_ID_HERE"]  # Replace with actual user IDs
-MESSAGE_TEXT_TEMPLATE = "Hello <@{}>! You have an IMPORTANT message from your NOC bot."
- 
-SPAM_COUNT = 3     # Number of repeated sends per user
-DELAY_SECONDS = 3   # Delay between repeated sends (for the same user)
+MESSAGE_TEXT = "Test message from your NOC bot. No action needed."
 
-# --- Function to send a Slack message ---
-def send_slack_direct_message(token, user_id, message_body):
-    url = "https://slack.com/api/chat.postMessage"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "channel": user_id,
-        "text": message_body
+
+def run_against_mocks():
+    """Sends one alert per transport to local stand-ins, with rate limiting and a failing recipient."""
+    from mock_services import FakeMqttClient, serve_mock_http, serve_mock_smtp
+
+    http = serve_mock_http(rate_limited=1, server_errors=1, failing=("U_GONE",))
+    smtp = serve_mock_smtp()
+    transports = {
+        "slack": SlackTransport("xoxb-mock", api_url=http.slack_url),
+        "webhook": WebhookTransport(),
+        "email": SmtpTransport("127.0.0.1", smtp.port, starttls=False),
+        "mqtt": MqttTransport("127.0.0.1", client_factory=FakeMqttClient),
     }
-    response = requests.post(url, headers=headers, json=payload)
-    response.raise_for_status() 
-    response_data = response.json()
-    return response_data.get("ok")
+    recipients = [
+        ("slack", "U_ONE"), ("slack", "U_TWO"), ("slack", "U_GONE"),
+        ("webhook", http.webhook_url("fleet")),
+        ("email", "owner@example.com"), ("email", "driver@example.com"),
+        ("mqtt", "noc/vehicle/alerts"),
+    ]
+    dispatcher = SosDispatcher(transports, base_delay=0.2)
+    started = time.perf_counter()
+    report = dispatcher.dispatch(recipients, MESSAGE_TEXT)
+    elapsed = time.perf_counter() - started
+    dispatcher.close()
+    http.shutdown()
+    smtp.shutdown()
+
+    print(json.dumps([result.as_dict() for result in report], indent=2))
+    print(f"HTTP calls: {http.calls}")
+    print(f"SMTP: {len(smtp.messages)} messages over {smtp.counters['connections']} connection(s); "
+          f"MQTT: {len(FakeMqttClient.published)} publishes; total {elapsed:.2f}s")
+    expected = {(channel, recipient) for channel, recipient in recipients if recipient != "U_GONE"}
+    delivered = {(r.channel, r.recipient) for r in report if r.delivered}
+    ok = delivered == expected and http.calls["U_GONE"] == 1 and smtp.counters["connections"] == 1
+    print("Mock check passed." if ok else "Mock check FAILED.")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a test alert through the NOC notification transports")
+    parser.add_argument("--mock", action="store_true", help="Use local stand-ins instead of real services")
+    parser.add_argument("--recipients", default=None, help="Defaults to NOC_SOS_RECIPIENTS")
+    args = parser.parse_args()
+
+    if args.mock:
+        sys.exit(0 if run_against_mocks() else 1)
+
+    recipients = parse_recipients(args.recipients or os.environ.get("NOC_SOS_RECIPIENTS", ""))
+    if not recipients:
+        print("Error: no recipients. Set NOC_SOS_RECIPIENTS or pass --recipients.")
+        sys.exit(2)
+    dispatcher = SosDispatcher(build_transports())
+    report = dispatcher.dispatch(recipients, MESSAGE_TEXT)
+    dispatcher.close()
+    print(json.dumps([result.as_dict() for result in report], indent=2))
+    sys.exit(0 if all(result.delivered for result in report) else 1)
 
-# --- Function to be run in each thread for each user ---
-def send_messages_for_user(user_id, token, message_template, spam_count, delay):
-    personal_message = message_template.format(user_id)
-    print(f"--- [Thread for {user_id}] Start repeated sending ---")
-    for i in range(spam_count):
-        print(f"[Thread for {user_id}] Attempt {i+1}/{spam_count}: Sending message...")
-        success = send_slack_direct_message(token, user_id, personal_message)
-        if success:
-            print(f"[Thread for {user_id}] Message sent successfully.")
-        else:
-            print(f"[Thread for {user_id}] Message sending FAILED (Slack returned ok=False).")
-        if i < spam_count - 1:
-            print(f"[Thread for {user_id}] Waiting {delay} seconds before next send...")
-            time.sleep(delay)
-    print(f"--- [Thread for {user_id}] Finished repeated sending ---\n")
 
-# --- Main execution ---
 if __name__ == "__main__":
-    if SLACK_BOT_TOKEN == "xoxb-YOUR_TOKEN_HERE":
-        print("Error: Please replace SLACK_BOT_TOKEN with your real value from Slack App.")
-    elif not SLACK_USER_IDS_LIST:
-        print("Error: SLACK_USER_IDS_LIST is empty. Please add User IDs.")
-    else:
-        threads = []
-        print("Starting threads to send messages concurrently...\n")
-        for user_id in SLACK_USER_IDS_LIST:
-            # Create a new thread for each user
-            thread = threading.Thread(
-                target=send_messages_for_user, 
-                args=(user_id, SLACK_BOT_TOKEN, MESSAGE_TEXT_TEMPLATE, SPAM_COUNT, DELAY_SECONDS)
-            )
-            threads.append(thread)
-            thread.start() # Start thread
-        # Wait for all threads to finish
-        for thread in threads:
-            thread.join() 
-        print("\n--- All messages have been processed ---")
\ No newline at end of file
+    main()
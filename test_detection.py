@@ -0,0 +1,34 @@
+import sys
+import types
+
+import numpy as np
+
+from detection import UltralyticsBackend
+
+
+class StaticBatchYOLO:
+    """Stands in for ultralytics.YOLO on a static batch-1 ONNX export."""
+
+    def __init__(self, model_path, task=None):
+        self.names = {0: "person"}
+        self.calls = []
+
+    def predict(self, source, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        self.calls.append(len(frames))
+        if len(frames) != 1:
+            raise RuntimeError(f"Got invalid dimensions for input: images index: 0 Got: {len(frames)} Expected: 1")
+        return [types.SimpleNamespace()]
+
+
+def test_ultralytics_backend_falls_back_to_one_frame_per_call(monkeypatch):
+    monkeypatch.setitem(sys.modules, "ultralytics", types.SimpleNamespace(YOLO=StaticBatchYOLO))
+    backend = UltralyticsBackend("models/yolo11n_320.onnx")
+    frames = [np.zeros((48, 64, 3), dtype=np.uint8)] * 3
+
+    assert len(backend.predict_batch(frames)) == 3
+    assert backend.model.calls == [3, 1, 1, 1]
+
+    # The failed batch is remembered: later batches go straight to one call per frame
+    assert len(backend.predict_batch(frames)) == 3
+    assert backend.model.calls == [3, 1, 1, 1, 1, 1, 1]
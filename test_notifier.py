@@ -0,0 +1,44 @@
+import threading
+import time
+import types
+
+from notifier import Notifier
+from outbox import AlertOutbox
+from sos_dispatcher import SosDispatcher
+from transports import Transport
+
+
+class OfflineTransport(Transport):
+    """Every attempt fails with a retryable error, like a network that is down."""
+
+    name = "offline"
+
+    def __init__(self):
+        super().__init__()
+        self.attempted = threading.Event()
+
+    async def send(self, session, recipient, text):
+        self.attempted.set()
+        return False, True, "network unreachable", None
+
+
+def test_close_while_a_send_is_retrying(tmp_path):
+    transport = OfflineTransport()
+    # Backoff long enough that waiting for the retries would hang close()
+    dispatcher = SosDispatcher({"slack": transport}, max_attempts=5, base_delay=30.0, log=lambda message: None)
+    outbox = AlertOutbox(
+        str(tmp_path / "outbox.sqlite3"),
+        lambda messages: dispatcher.dispatch_messages([("slack", m.recipient, m.payload["text"]) for m in messages]),
+        log=lambda message: None,
+    ).start()
+    key = outbox.enqueue("sos", "U_ONE", {"channel": "slack", "text": "SOS"}, "sos:1:slack:U_ONE")
+    assert transport.attempted.wait(5.0)
+
+    started = time.monotonic()
+    Notifier.close(types.SimpleNamespace(outbox=outbox, dispatcher=dispatcher, audio=None))
+    assert time.monotonic() - started < 3.0
+    assert not outbox._drainer.is_alive()
+
+    # The cancelled send is not counted as an attempt; the alert is retried on the next start
+    assert outbox.pending_count() == 1
+    assert outbox.wait([key], 0.0) == {key: "pending"}
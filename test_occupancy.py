@@ -0,0 +1,29 @@
+import numpy as np
+import supervision as sv
+
+from occupancy import OccupancyEstimator
+
+
+def person(confidence):
+    return sv.Detections(
+        xyxy=np.array([[10.0, 10.0, 50.0, 90.0]], dtype=np.float32),
+        confidence=np.array([confidence], dtype=np.float32),
+        class_id=np.array([0]),
+    )
+
+
+def test_single_false_positive_after_reset_is_not_occupancy():
+    estimator = OccupancyEstimator()
+    estimator.reset()
+    assert not estimator.update([person(0.9)])
+    assert estimator.count == 0
+    for _ in range(estimator.window):
+        assert not estimator.update([sv.Detections.empty()])
+    assert estimator.snapshot()["count"] == 0
+
+
+def test_steady_person_is_occupancy_after_min_samples():
+    estimator = OccupancyEstimator(min_samples=10)
+    states = [estimator.update([person(0.8)]) for _ in range(10)]
+    assert states == [False] * 9 + [True]
+    assert estimator.count == 1
@@ -0,0 +1,112 @@
+import math
+import threading
+
+
+class Timer:
+    """Handle returned by TimerWheel.call_at / call_later; pass it to cancel()."""
+
+    __slots__ = ("tick", "callback", "args", "cancelled")
+
+    def __init__(self, tick, callback, args):
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel. Timers are bucketed by tick (deadline // tick, modulo the number of
+    slots), so scheduling and cancel() are O(1) and advance() only looks at the slots of
+    the ticks that passed. The wheel has no clock or thread of its own: whoever owns it
+    calls advance(now) (e.g. from Tk's root.after) and all callbacks run on that thread.
+    call_soon_threadsafe() hands work from other threads to the next advance().
+    """
+
+    def __init__(self, tick=0.1, slots=512):
+        self.tick = tick
+        self.now = 0.0
+        self._slots = [dict() for _ in range(slots)]
+        self._current_tick = None
+        self._count = 0
+        self._incoming = []
+        self._incoming_lock = threading.Lock()
+
+    def call_at(self, when, callback, *args):
+        tick = math.ceil(self._ticks(when))
+        if self._current_tick is not None:
+            tick = max(tick, self._current_tick + 1)
+        timer = Timer(tick, callback, args)
+        self._slots[tick % len(self._slots)][id(timer)] = timer
+        self._count += 1
+        return timer
+
+    def _ticks(self, when):
+        # Rounded so that e.g. 100.1 s is tick 1001 and not 1000.999...
+        return round(when / self.tick, 6)
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(self.now + delay, callback, *args)
+
+    def call_soon_threadsafe(self, callback, *args):
+        with self._incoming_lock:
+            self._incoming.append((callback, args))
+
+    def cancel(self, timer):
+        if timer is None or timer.cancelled:
+            return
+        timer.cancelled = True
+        if self._slots[timer.tick % len(self._slots)].pop(id(timer), None) is not None:
+            self._count -= 1
+
+    def pending(self):
+        return self._count
+
+    def advance(self, now):
+        """Runs every timer due at `now` in deadline order, then the thread-safe calls. Returns how many ran."""
+        self.now = now
+        target = math.floor(self._ticks(now))
+        if self._current_tick is None:
+            self._current_tick = target - 1
+        ran = 0
+        if target - self._current_tick > len(self._slots):
+            # Long gap (e.g. a stalled main loop): every slot may hold due timers
+            ticks = range(self._current_tick + 1, self._current_tick + 1 + len(self._slots))
+        else:
+            ticks = range(self._current_tick + 1, target + 1)
+        due = []
+        for tick in ticks:
+            slot = self._slots[tick % len(self._slots)]
+            for key, timer in list(slot.items()):
+                if timer.tick <= target:
+                    del slot[key]
+                    due.append(timer)
+        self._current_tick = target
+        self._count -= len(due)
+        due.sort(key=lambda timer: timer.tick)
+        for timer in due:
+            # A callback earlier in this batch may have cancelled it
+            if timer.cancelled:
+                continue
+            timer.cancelled = True
+            ran += self._run(timer.callback, timer.args)
+        with self._incoming_lock:
+            incoming, self._incoming = self._incoming, []
+        for callback, args in incoming:
+            ran += self._run(callback, args)
+        return ran
+
+    def _run(self, callback, args):
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"ERROR in timer callback {getattr(callback, '__name__', callback)}: {e}")
+        return 1
+
+    def clear(self):
+        """Cancels every pending timer."""
+        for slot in self._slots:
+            for timer in slot.values():
+                timer.cancelled = True
+            slot.clear()
+        self._count = 0
@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+SLACK_API_URL = "https://slack.com/api/chat.postMessage"
+
+# Slack errors (ok=false) worth another attempt; anything else (invalid_auth, channel_not_found, ...) is final
+RETRYABLE_SLACK_ERRORS = {"ratelimited", "internal_error", "fatal_error", "service_unavailable", "request_timeout"}
+
+# Default messages per second for each transport (Slack allows about one per second per channel)
+DEFAULT_RATES = {"slack": 5.0, "webhook": 10.0, "email": 2.0, "mqtt": 20.0}
+
+
+class RateLimiter:
+    """Token bucket shared by all sends of one transport. Use from the dispatcher's event loop only."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+
+class Transport:
+    """
+    One notification channel. send() makes a single attempt and returns
+    (delivered, retryable, error, retry_after); retries are left to the dispatcher.
+    """
+
+    name = None
+
+    def __init__(self, rate=None):
+        rate = rate if rate is not None else DEFAULT_RATES.get(self.name)
+        self.limiter = RateLimiter(rate) if rate else None
+
+    async def send(self, session, recipient, text):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+async def _post_json(session, url, payload, headers=None):
+    """POST helper shared by the HTTP transports. Returns (status, retry_after, json or None)."""
+    async with session.post(url, json=payload, headers=headers) as response:
+        retry_after = float(response.headers.get("Retry-After", 0) or 0)
+        data = None
+        if 200 <= response.status < 300:
+            try:
+                data = await response.json(content_type=None)
+            except ValueError:
+                data = None
+        return response.status, retry_after, data
+
+
+def _http_failure(status, retry_after):
+    if status == 429:
+        return False, True, "HTTP 429", retry_after
+    return False, status >= 500, f"HTTP {status}", None
+
+
+class SlackTransport(Transport):
+    """Slack chat.postMessage; the recipient is a user or channel id."""
+
+    name = "slack"
+
+    def __init__(self, token, api_url=SLACK_API_URL, rate=None):
+        super().__init__(rate)
+        self.token = token
+        self.api_url = api_url
+
+    async def send(self, session, recipient, text):
+        headers = {"Authorization": f"Bearer {self.token}"}
+        status, retry_after, data = await _post_json(session, self.api_url, {"channel": recipient, "text": text},
+                                                     headers)
+        if status >= 300:
+            return _http_failure(status, retry_after)
+        if data and data.get("ok"):
+            return True, False, None, None
+        error = (data or {}).get("error", "unknown_error")
+        return False, error in RETRYABLE_SLACK_ERRORS, error, None
+
+
+class WebhookTransport(Transport):
+    """Generic JSON webhook; the recipient is the URL. Any 2xx answer counts as delivered."""
+
+    name = "webhook"
+
+    def __init__(self, headers=None, rate=None):
+        super().__init__(rate)
+        self.headers = headers or {}
+
+    async def send(self, session, recipient, text):
+        payload = {"source": "noc", "text": text, "sent_at": time.time()}
+        status, retry_after, _ = await _post_json(session, recipient, payload, self.headers)
+        if status >= 300:
+            return _http_failure(status, retry_after)
+        return True, False, None, None
+
+
+class SmtpTransport(Transport):
+    """E-mail over one reused SMTP connection; the recipient is an address."""
+
+    name = "email"
+
+    def __init__(self, host, port=587, sender="noc@localhost", username=None, password=None, starttls=True,
+                 rate=None, timeout=10.0):
+        super().__init__(rate)
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._smtp = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            self._smtp = smtp
+        return self._smtp
+
+    def _drop_connection(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.close()
+            except OSError:
+                pass
+            self._smtp = None
+
+    def _send_blocking(self, recipient, text):
+        message = EmailMessage()
+        message["Subject"] = "NOC emergency alert"
+        message["From"] = self.sender
+        message["To"] = recipient
+        message.set_content(text)
+        with self._lock:
+            try:
+                self._connection().send_message(message)
+                return True, False, None, None
+            except smtplib.SMTPRecipientsRefused as e:
+                return False, False, f"recipient refused: {e.recipients}", None
+            except smtplib.SMTPAuthenticationError as e:
+                self._drop_connection()
+                return False, False, f"authentication failed: {e.smtp_code}", None
+            except (smtplib.SMTPException, OSError) as e:
+                # Connection lost or server busy: reconnect on the next attempt
+                self._drop_connection()
+                return False, True, f"{type(e).__name__}: {e}", None
+
+    async def send(self, session, recipient, text):
+        return await asyncio.to_thread(self._send_blocking, recipient, text)
+
+    def close(self):
+        with self._lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self._smtp = None
+
+
+class MqttTransport(Transport):
+    """
+    MQTT publish (QoS 1) over one persistent connection; the recipient is the topic.
+    Needs the optional paho-mqtt package unless a client_factory is given.
+    """
+
+    name = "mqtt"
+
+    def __init__(self, host, port=1883, username=None, password=None, rate=None, timeout=10.0,
+                 client_factory=None):
+        super().__init__(rate)
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.client_factory = client_factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._client is None:
+            if self.client_factory is not None:
+                client = self.client_factory()
+            else:
+                import paho.mqtt.client as mqtt
+                client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id="noc-alerts")
+            if self.username:
+                client.username_pw_set(self.username, self.password)
+            client.connect(self.host, self.port)
+            client.loop_start()
+            self._client = client
+        return self._client
+
+    def _send_blocking(self, recipient, text):
+        payload = json.dumps({"source": "noc", "text": text, "sent_at": time.time()})
+        with self._lock:
+            try:
+                info = self._connection().publish(recipient, payload, qos=1)
+                info.wait_for_publish(self.timeout)
+                if info.is_published():
+                    return True, False, None, None
+                return False, True, "publish not acknowledged", None
+            except ImportError:
+                return False, False, "paho-mqtt is not installed", None
+            except (OSError, RuntimeError, ValueError) as e:
+                self.close_client()
+                return False, True, f"{type(e).__name__}: {e}", None
+
+    async def send(self, session, recipient, text):
+        return await asyncio.to_thread(self._send_blocking, recipient, text)
+
+    def close_client(self):
+        if self._client is not None:
+            try:
+                self._client.loop_stop()
+                self._client.disconnect()
+            except (OSError, RuntimeError):
+                pass
+            self._client = None
+
+    def close(self):
+        with self._lock:
+            self.close_client()
+
+
+def _rate(environ, name):
+    value = environ.get(f"NOC_{name.upper()}_RATE")
+    return float(value) if value else None
+
+
+def build_transports(environ=None):
+    """Creates the transports configured in the environment, keyed by channel name."""
+    environ = os.environ if environ is None else environ
+    transports = {"webhook": WebhookTransport(rate=_rate(environ, "webhook"))}
+    if environ.get("SLACK_BOT_TOKEN"):
+        transports["slack"] = SlackTransport(environ["SLACK_BOT_TOKEN"],
+                                             environ.get("SLACK_API_URL") or SLACK_API_URL,
+                                             rate=_rate(environ, "slack"))
+    if environ.get("NOC_SMTP_HOST"):
+        transports["email"] = SmtpTransport(
+            environ["NOC_SMTP_HOST"],
+            int(environ.get("NOC_SMTP_PORT", "587")),
+            sender=environ.get("NOC_SMTP_FROM", "noc@localhost"),
+            username=environ.get("NOC_SMTP_USER") or None,
+            password=environ.get("NOC_SMTP_PASSWORD") or None,
+            starttls=environ.get("NOC_SMTP_STARTTLS", "1") == "1",
+            rate=_rate(environ, "email"),
+        )
+    if environ.get("NOC_MQTT_HOST"):
+        transports["mqtt"] = MqttTransport(
+            environ["NOC_MQTT_HOST"],
+            int(environ.get("NOC_MQTT_PORT", "1883")),
+            username=environ.get("NOC_MQTT_USER") or None,
+            password=environ.get("NOC_MQTT_PASSWORD") or None,
+            rate=_rate(environ, "mqtt"),
+        )
+    return transports
+
+
+def parse_recipients(text):
+    """
+    Parses "slack:U123,email:owner@example.com,webhook:https://...,mqtt:noc/alerts" into
+    (channel, recipient) pairs. Entries without a channel prefix are Slack ids.
+    """
+    recipients = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        channel, sep, recipient = item.partition(":")
+        if not sep or channel not in DEFAULT_RATES:
+            channel, recipient = "slack", item
+        recipients.append((channel, recipient.strip()))
+    return recipients